@@ -0,0 +1,144 @@
+import glob
+import hashlib
+import json
+import os
+import tempfile
+
+from loktar.constants import DEPENDENCY_CACHE
+from loktar.constants import PLUGINS_INFO
+from loktar.log import Log
+from loktar.plugin import find_plugin
+
+logger = Log()
+
+
+class RequirementsCache(object):
+    """On-disk cache of the artifacts requirements
+
+    Each entry is keyed by a digest of the files read by the dependency plugins of the artifact,
+    so only the artifacts whose dependency files changed have to be scanned again.
+    Dependency plugins advertise the files they read through a module level ``FILES`` list of glob patterns,
+    relative to the artifact path. Artifacts using a plugin without ``FILES`` are never cached.
+
+    Args:
+        path (str): Location of the cache file, default value is LOKTAR_DEPENDENCY_CACHE_PATH
+    """
+
+    def __init__(self, path=None):
+        self.path = path if path is not None else DEPENDENCY_CACHE["path"]
+        self.hits = 0
+        self.misses = 0
+        self._entries = self._load()
+
+    def _load(self):
+        if self.path is None or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r") as fd:
+                return json.load(fd)
+        except (IOError, ValueError) as e:
+            logger.warning("The requirements cache {} is unreadable, starting from scratch: {}"
+                           .format(self.path, str(e)))
+            return {}
+
+    def digest(self, package, basepath, files=None):
+        """Compute the digest of the dependency inputs of an artifact
+
+        Args:
+            package (dict): package configuration
+            basepath (str): Path to the package
+            files (dict of str: str): dependency files already collected by ``loktar.scanner.scan_repository``,
+                they are read from ``basepath`` if None
+
+        Returns:
+            str: the digest or None if a plugin of the artifact does not declare the files it reads
+        """
+        sha = hashlib.sha1()
+        sha.update(json.dumps({"depends_on": sorted(package.get("depends_on", [])),
+                               "dependencies_type": package["dependencies_type"]}, sort_keys=True))
+
+        patterns = []
+        for plugin_type in package["dependencies_type"]:
+            plugin = find_plugin(plugin_type, "dependency", PLUGINS_INFO["locations"], PLUGINS_INFO["workspace"])
+            if getattr(plugin, "FILES", None) is None:
+                return None
+            patterns.extend(plugin.FILES)
+
+        if files is None:
+            files = {}
+            for pattern in patterns:
+                for file_path in glob.glob(os.path.join(basepath, pattern)):
+                    if os.path.isfile(file_path):
+                        with open(file_path, "r") as fd:
+                            files[os.path.relpath(file_path, basepath)] = fd.read()
+
+        for file_path, content in sorted(files.iteritems()):
+            sha.update("{}\0{}\0".format(file_path, len(content)))
+            sha.update(content)
+
+        return sha.hexdigest()
+
+    def get(self, artifact_name, digest):
+        """Get the cached requirements of an artifact
+
+        Args:
+            artifact_name (str): Name of the artifact
+            digest (str): Digest of the current dependency inputs of the artifact
+
+        Returns:
+            set of str: the requirements or None if they are not cached for this digest
+        """
+        entry = self._entries.get(artifact_name)
+        if entry is None or entry["digest"] != digest:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return set(entry["requirements"])
+
+    def set(self, artifact_name, digest, requirements):
+        """Store the requirements of an artifact
+
+        Args:
+            artifact_name (str): Name of the artifact
+            digest (str): Digest of the dependency inputs the requirements were computed from
+            requirements (set of str): Requirements returned by the dependency plugins
+        """
+        self._entries[artifact_name] = {"digest": digest, "requirements": sorted(requirements)}
+
+    def entries(self):
+        """Inspect the cache
+
+        Returns:
+            dict: keys are artifacts names, values are dicts with the ``digest`` and the ``requirements``
+        """
+        return {artifact_name: {"digest": entry["digest"], "requirements": list(entry["requirements"])}
+                for artifact_name, entry in self._entries.iteritems()}
+
+    def invalidate(self, artifact_names=None):
+        """Drop cache entries
+
+        Args:
+            artifact_names (iterable of str): artifacts to forget, all of them if None
+        """
+        if artifact_names is None:
+            self._entries = {}
+        else:
+            for artifact_name in artifact_names:
+                self._entries.pop(artifact_name, None)
+
+    def save(self):
+        """Write the cache on disk
+
+        The file is replaced atomically, so concurrent workers never read a partial cache.
+        """
+        logger.info("Requirements cache: {} hits, {} misses".format(self.hits, self.misses))
+        if self.path is None:
+            return
+
+        cache_dir = os.path.dirname(os.path.abspath(self.path))
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, prefix=".requirements_cache")
+        with os.fdopen(fd, "w") as tmp_file:
+            json.dump(self._entries, tmp_file)
+        os.rename(tmp_path, self.path)
@@ -1,27 +1,28 @@
-import time
-
-from boto.exception import S3ResponseError
-from boto.dynamodb2 import connect_to_region as ddb_connect_to_region
-from boto.rds import connect_to_region as rds_connect_to_region
-from boto.s3 import connect_to_region as s3_connect_to_region
-from boto.sqs import connect_to_region as sqs_connect_to_region
-from boto.sqs.regioninfo import SQSRegionInfo
-import docker
-from etcd import Client as EtcdClient
-from etcd import EtcdException
-from etcd import EtcdConnectionFailed
-from etcd import EtcdWatchTimedOut
-import paramiko
-from pymongo import MongoClient
-import redis
-import requests
 import socket
+import time
 
+from loktar.lazy import lazy_attribute
+from loktar.lazy import LazyModule
 from loktar.log import Log
 
 
 logger = Log()
 
+# The clients are imported by the checks using them only
+boto_exception = LazyModule("boto.exception")
+ddb_connect_to_region = lazy_attribute("boto.dynamodb2", "connect_to_region")
+rds_connect_to_region = lazy_attribute("boto.rds", "connect_to_region")
+s3_connect_to_region = lazy_attribute("boto.s3", "connect_to_region")
+sqs_connect_to_region = lazy_attribute("boto.sqs", "connect_to_region")
+SQSRegionInfo = lazy_attribute("boto.sqs.regioninfo", "SQSRegionInfo")
+docker = LazyModule("docker")
+etcd = LazyModule("etcd")
+EtcdClient = lazy_attribute(etcd, "Client")
+paramiko = LazyModule("paramiko")
+MongoClient = lazy_attribute("pymongo", "MongoClient")
+redis = LazyModule("redis")
+requests = LazyModule("requests")
+
 
 def wait_ssh(host="localhost", port=22, retries=30, sleep=10, **kwargs):
     """Wait for SSH service
@@ -186,7 +187,7 @@ def wait_etcd(host="localhost", port=4001, retries=30, sleep=10, **kwargs):
                 return True
             else:
                 not_yet_up()
-        except (EtcdException, EtcdConnectionFailed, EtcdWatchTimedOut, ValueError):
+        except (etcd.EtcdException, etcd.EtcdConnectionFailed, etcd.EtcdWatchTimedOut, ValueError):
             not_yet_up()
 
     logger.error("Cannot connect to Etcd.")
@@ -321,7 +322,7 @@ def wait_s3(host="localhost", port=4567, **kwargs):
         logger.error("Cannot connect to S3.")
         logger.error("Aborting")
         return False
-    except S3ResponseError as e:
+    except boto_exception.S3ResponseError as e:
         if e.message == "The resource you requested does not exist"\
            and e.reason == "Not Found"\
            and e.status == 404:
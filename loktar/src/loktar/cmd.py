@@ -1,16 +1,28 @@
-from fabric.api import cd
-from fabric.api import local
-from fabric.api import lcd
-from fabric.api import get
-from fabric.api import put
-from fabric.api import run
-from fabric.api import settings
-
+from loktar.lazy import lazy_attribute
+from loktar.lazy import LazyModule
 from loktar.log import Log
 
 logger = Log()
 
 
+def _fabric_defaults(api):
+    api.env.disable_known_hosts = True
+    api.env.warn_only = True
+
+
+# fabric (and paramiko behind it) is only imported when a command is run,
+# loktar modules take the fabric functions from here so the defaults are always applied
+fabric_api = LazyModule("fabric.api", setup=_fabric_defaults)
+cd = lazy_attribute(fabric_api, "cd")
+local = lazy_attribute(fabric_api, "local")
+lcd = lazy_attribute(fabric_api, "lcd")
+get = lazy_attribute(fabric_api, "get")
+hide = lazy_attribute(fabric_api, "hide")
+put = lazy_attribute(fabric_api, "put")
+run = lazy_attribute(fabric_api, "run")
+settings = lazy_attribute(fabric_api, "settings")
+
+
 def exec_command_with_retry(cmd, remote, max_retry, force_return_code=None):
     """Execute and retry a command
     Args:
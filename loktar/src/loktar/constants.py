@@ -1,12 +1,10 @@
 from smart_getenv import getenv
-from fabric.api import env
-
-env.disable_known_hosts = True
-env.warn_only = True
 
 RUN_DB = {
     "db": getenv("LOKTAR_RUN_DB_DB", type=str, default="loktar_ci"),
     "table": getenv("LOKTAR_RUN_DB_TABLE", type=str, default="run"),
+    "durations_table": getenv("LOKTAR_RUN_DB_DURATIONS_TABLE", type=str, default="build_duration"),
+    "active_runs_table": getenv("LOKTAR_RUN_DB_ACTIVE_RUNS_TABLE", type=str, default="active_run"),
     "host": getenv("LOKTAR_RUN_DB_HOST", type=str, default="elasticsearch"),
     "port": getenv("LOKTAR_RUN_DB_PORT", type=int, default=9200)
 }
@@ -75,7 +73,14 @@ ROOT_PATH = {
 JENKINS = {
     "host": getenv("LOKTAR_JENKINS_HOST", type=str, default=None),
     "user": getenv("LOKTAR_JENKINS_USER", type=str, default=None),
-    "password": getenv("LOKTAR_JENKINS_PASSWORD", type=str, default=None)
+    "password": getenv("LOKTAR_JENKINS_PASSWORD", type=str, default=None),
+    # Number of HTTP connections kept open to the Jenkins master
+    "pool_size": getenv("LOKTAR_JENKINS_POOL_SIZE", type=int, default=16),
+    # Number of recent builds per job read by the batched polls
+    "builds_window": getenv("LOKTAR_JENKINS_BUILDS_WINDOW", type=int, default=50),
+    # "root": the builds of all the followed jobs are read with one request to the root api per poll, "job": with a
+    # request per followed job, for the masters whose whole list of jobs is too large to read at each poll
+    "builds_request": getenv("LOKTAR_JENKINS_BUILDS_REQUEST", type=str, default="root")
 }
 
 SLAVE_ENVIRONMENT = {
@@ -123,11 +128,101 @@ CI = {
 
 
 DEPENDENDY_GRAPH = {
-    "repo": getenv("LOKTAR_CI_DEPENDENCY_GRAPH_REPO", type=str, default="/tmp")
+    "repo": getenv("LOKTAR_CI_DEPENDENCY_GRAPH_REPO", type=str, default="/tmp"),
+    "output_type": getenv("LOKTAR_CI_DEPENDENCY_GRAPH_OUTPUT_TYPE", type=str, default="png")
+}
+
+DEPENDENCY_CACHE = {
+    "path": getenv("LOKTAR_DEPENDENCY_CACHE_PATH", type=str, default=None)
+}
+
+DEPENDENCY_SNAPSHOT = {
+    "path": getenv("LOKTAR_DEPENDENCY_SNAPSHOT_PATH", type=str, default=None),
+    "keep": getenv("LOKTAR_DEPENDENCY_SNAPSHOT_KEEP", type=int, default=20)
+}
+
+DEPENDENCY_EXTRACTION = {
+    "workers": getenv("LOKTAR_DEPENDENCY_EXTRACTION_WORKERS", type=int, default=1),
+    "backend": getenv("LOKTAR_DEPENDENCY_EXTRACTION_BACKEND", type=str, default="threading")
+}
+
+SCHEDULER = {
+    # Maximum number of builds queued or running at the same time, no limit if None
+    "slots": getenv("LOKTAR_SCHEDULER_SLOTS", type=int, default=None),
+    # Number of recorded builds the duration of a build is estimated from
+    "durations_history": getenv("LOKTAR_SCHEDULER_DURATIONS_HISTORY", type=int, default=10),
+    # Duration of a build without history, in seconds
+    "default_duration": getenv("LOKTAR_SCHEDULER_DEFAULT_DURATION", type=float, default=300),
+    # Launch the tests while the builds they wait for are running, see loktar.job.Speculation
+    "speculative": getenv("LOKTAR_SCHEDULER_SPECULATIVE", type=bool, default=False)
+}
+
+BUILD_MONITOR = {
+    # Number of queued items and builds polled at the same time
+    "workers": getenv("LOKTAR_BUILD_MONITOR_WORKERS", type=int, default=16),
+    # Intervals between two polls, in seconds. The interval grows while nothing changes.
+    "min_interval": getenv("LOKTAR_BUILD_MONITOR_MIN_INTERVAL", type=float, default=0.5),
+    "max_interval": getenv("LOKTAR_BUILD_MONITOR_MAX_INTERVAL", type=float, default=10),
+    # Interval between two checks of the head of the pull request, in seconds
+    "commit_interval": getenv("LOKTAR_BUILD_MONITOR_COMMIT_INTERVAL", type=float, default=2)
+}
+
+EXECUTOR = {
+    # "jenkins", "local" or "distributed", see loktar.executor
+    "backend": getenv("LOKTAR_EXECUTOR_BACKEND", type=str, default="jenkins"),
+    # Number of builds run at the same time by the local backend, the number of CPUs if None
+    "workers": getenv("LOKTAR_EXECUTOR_WORKERS", type=int, default=None)
+}
+
+DISTRIBUTED = {
+    # "redis" or "local", see loktar.distributed
+    "broker": getenv("LOKTAR_DISTRIBUTED_BROKER", type=str, default="redis"),
+    "host": getenv("LOKTAR_DISTRIBUTED_HOST", type=str, default="localhost"),
+    "port": getenv("LOKTAR_DISTRIBUTED_PORT", type=int, default=6379),
+    "namespace": getenv("LOKTAR_DISTRIBUTED_NAMESPACE", type=str, default="loktar"),
+    # A build whose worker did not send a heartbeat for this long, in seconds, is given to another worker
+    "lease_timeout": getenv("LOKTAR_DISTRIBUTED_LEASE_TIMEOUT", type=float, default=60),
+    "heartbeat_interval": getenv("LOKTAR_DISTRIBUTED_HEARTBEAT_INTERVAL", type=float, default=10),
+    # Stop the builds of a lower priority class, and run them again later, when higher priority builds wait
+    "preempt": getenv("LOKTAR_DISTRIBUTED_PREEMPT", type=bool, default=False),
+    # "age": the builds of the oldest pull request run are taken first, "size": the builds of the smallest run
+    "pull_request_order": getenv("LOKTAR_DISTRIBUTED_PULL_REQUEST_ORDER", type=str, default="age"),
+    # A cancelled run is remembered this long, in seconds, for the workers running its builds to stop them
+    "cancelled_ttl": getenv("LOKTAR_DISTRIBUTED_CANCELLED_TTL", type=float, default=3600),
+    # Longest wait for a build or a result, in seconds
+    "poll_timeout": getenv("LOKTAR_DISTRIBUTED_POLL_TIMEOUT", type=float, default=1)
+}
+
+RESOURCES = {
+    # Capacity the builds are packed onto, no limit if None. The local backend defaults to the machine's capacity.
+    "cpu": getenv("LOKTAR_RESOURCES_CPU", type=float, default=None),
+    "memory": getenv("LOKTAR_RESOURCES_MEMORY", type=int, default=None),
+    # Requests of the packages without "resources" in config.json, memory in MB
+    "default_cpu": getenv("LOKTAR_RESOURCES_DEFAULT_CPU", type=float, default=1),
+    "default_memory": getenv("LOKTAR_RESOURCES_DEFAULT_MEMORY", type=int, default=512),
+    # Number of times the first ready build may be passed by smaller ones before the packing waits for it
+    "max_skips": getenv("LOKTAR_RESOURCES_MAX_SKIPS", type=int, default=10)
+}
+
+MERGE_QUEUE = {
+    # Maximum number of pull requests built together
+    "max_batch": getenv("LOKTAR_MERGE_QUEUE_MAX_BATCH", type=int, default=8),
+    # Branch the pull requests of a batch are merged in
+    "branch": getenv("LOKTAR_MERGE_QUEUE_BRANCH", type=str, default="loktar-merge-queue")
+}
+
+WORKSPACE_POOL = {
+    # The init workers check out the repository from the pool instead of cloning it for each job
+    "enabled": getenv("LOKTAR_WORKSPACE_POOL_ENABLED", type=bool, default=False),
+    # Where the mirrors of the repositories, and the leased checkouts, are kept between the jobs
+    "root": getenv("LOKTAR_WORKSPACE_POOL_ROOT", type=str, default="/mnt/ci/pool")
 }
 
 DETECT_PR_COLLISION = getenv("LOKTAR_DETECT_PR_COLLISION", type=bool, default=False)
 
+# The builds only receive the paths of their artifact and of its requirements, see loktar.dependency.required_paths
+SPARSE_CHECKOUT = getenv("LOKTAR_SPARSE_CHECKOUT", type=bool, default=False)
+
 GUAY = {
     "host": getenv("LOKTAR_GUAY_HOST", type=str, default=None),
     "timeout": getenv("LOKTAR_GUAY_TIMEOUT", type=int, default=1800)
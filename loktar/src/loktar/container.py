@@ -1,7 +1,8 @@
-from docker import DockerClient
-
 from loktar.check import wait_docker_container
 from loktar.exceptions import CIJobFail
+from loktar.lazy import lazy_attribute
+
+DockerClient = lazy_attribute("docker", "DockerClient")
 
 
 def start_container(image, environment, ports_settings, docker_endpoint="127.0.0.1:2375", network_mode="bridge"):
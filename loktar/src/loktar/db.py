@@ -1,9 +1,13 @@
+import time
+from uuid import uuid4
+
 from loktar.constants import RUN_DB
+from loktar.constants import SCHEDULER
+from loktar.lazy import lazy_attribute
 from loktar.log import Log
 
-from elasticsearch import Elasticsearch
-
 logger = Log()
+Elasticsearch = lazy_attribute("elasticsearch", "Elasticsearch")
 
 
 class Run(object):
@@ -58,3 +62,169 @@ class Run(object):
 
         return [hit["_source"] for hit in result["hits"]["hits"]]
 
+
+class BuildDurations(object):
+    """Durations of the builds, per artifact and per type of build, stored next to the runs"""
+
+    def __init__(self):
+        self.host = RUN_DB["host"]
+        self.port = RUN_DB["port"]
+        self.db = RUN_DB["db"]
+        self.table = RUN_DB["durations_table"]
+        self._db_connection = Elasticsearch(host=self.host, port=self.port)
+
+    def record(self, artifact_name, type_build, duration, commit_id=None):
+        """Save the duration of a succeeded build
+
+        Args:
+            artifact_name (str): the artifact built
+            type_build (str): the type of build
+            duration (float): the duration of the build, in seconds
+            commit_id (Optional[str]): the commit built. Defaults to None.
+
+        Return:
+             the id of the duration document
+        """
+        result = self._db_connection.index(index=self.db, doc_type=self.table, body={
+            "artifact_name": artifact_name,
+            "type_build": type_build,
+            "duration": duration,
+            "commit_id": commit_id,
+            "end_time": time.time()
+        })
+        logger.info("Build duration of {} - {} recorded: {:.0f}s".format(artifact_name, type_build, duration))
+        return result["_id"]
+
+    def estimates(self, artifact_names, history=None):
+        """Estimate the duration of the builds of some artifacts
+
+        Args:
+            artifact_names (iterable of str): the artifacts
+            history (Optional[int]): number of recorded builds averaged per artifact and type of build.
+                Defaults to LOKTAR_SCHEDULER_DURATIONS_HISTORY.
+
+        Return:
+             dict of tuple: float, the mean duration in seconds keyed by (artifact_name, type_build),
+             builds without history are left out
+        """
+        history = history if history is not None else SCHEDULER["durations_history"]
+        artifact_names = sorted(set(artifact_names))
+        if not artifact_names:
+            return {}
+
+        result = self._db_connection.search(index=self.db,
+                                            doc_type=self.table,
+                                            body={"query": {"terms": {"artifact_name": artifact_names}}},
+                                            size=history * len(artifact_names) * 3,
+                                            sort="end_time:desc")
+        logger.info("The build durations requests took {}ms for {} artifacts".format(result["took"],
+                                                                                     len(artifact_names)))
+
+        durations = {}
+        wanted = set(artifact_names)
+        for hit in result["hits"]["hits"]:
+            source = hit["_source"]
+            if source.get("artifact_name") not in wanted or "duration" not in source:
+                continue
+            unit_durations = durations.setdefault((source["artifact_name"], source["type_build"]), [])
+            if len(unit_durations) < history:
+                unit_durations.append(source["duration"])
+
+        return {unit: sum(unit_durations) / float(len(unit_durations))
+                for unit, unit_durations in durations.iteritems()}
+
+
+class ActiveRuns(object):
+    """Run in progress of each branch, stored next to the runs
+
+    A run starting on a branch replaces the record of the run of an older commit, which watches it and stops its
+    builds as soon as a newer commit is built, whatever the worker running it. The components of a commit are run
+    separately, they share the record of the last one started.
+    """
+
+    def __init__(self):
+        self.host = RUN_DB["host"]
+        self.port = RUN_DB["port"]
+        self.db = RUN_DB["db"]
+        self.table = RUN_DB["active_runs_table"]
+        self._db_connection = Elasticsearch(host=self.host, port=self.port)
+
+    def start(self, branch, commit_id, commit_time=None):
+        """Record a run as the active one of its branch, the run of an older commit is superseded
+
+        The run of a commit older than the active one, like a build restarted on it, is not recorded and is
+        superseded as soon as it starts.
+
+        Args:
+            branch (str): the branch built
+            commit_id (str): the commit built
+            commit_time (Optional[float]): the timestamp of the commit, which orders the commits of the branch.
+                Defaults to the start time of the first run of the commit.
+
+        Return:
+             str, the id of the run
+        """
+        run_id = uuid4().hex
+        active = self.active(branch)
+        if active is not None and active["commit_id"] == commit_id:
+            commit_time = commit_time if commit_time is not None else active["commit_time"]
+        elif active is not None and commit_time is not None and commit_time < active["commit_time"]:
+            logger.info("Run {} of {} is not the active one, its commit {} is older than {}"
+                        .format(run_id, branch, commit_id, active["commit_id"]))
+            return run_id
+        start_time = time.time()
+        self._db_connection.index(index=self.db, doc_type=self.table, id=branch, body={
+            "branch": branch,
+            "run_id": run_id,
+            "commit_id": commit_id,
+            "commit_time": commit_time if commit_time is not None else start_time,
+            "start_time": start_time
+        })
+        logger.info("Run {} of {} is the active one, for the commit {}".format(run_id, branch, commit_id))
+        return run_id
+
+    def active(self, branch):
+        """Get the active run of a branch
+
+        Args:
+            branch (str): the branch
+
+        Return:
+             dict, the record of the run, None without active run
+        """
+        result = self._db_connection.get(index=self.db, doc_type=self.table, id=branch, ignore=404)
+        return result["_source"] if result.get("found") else None
+
+    def superseding(self, branch, commit_id, commit_time=None):
+        """Tell if a run of a newer commit of a branch started
+
+        The runs of the same commit, like the ones of its other components, do not supersede each other. The active
+        run is the one of the newest commit started, see ``start``: a run of an older commit never replaces it.
+
+        Args:
+            branch (str): the branch
+            commit_id (str): the commit built by the run
+            commit_time (Optional[float]): the timestamp of the commit, see ``start``. Defaults to None.
+
+        Return:
+             str, the commit of the newer run, None if there is none
+        """
+        active = self.active(branch)
+        if active is None or active["commit_id"] == commit_id:
+            return None
+        if commit_time is not None and active.get("commit_time", commit_time) <= commit_time:
+            return None
+        return active["commit_id"]
+
+    def finish(self, branch, run_id):
+        """Remove the record of a run, if it is still the active one of its branch
+
+        Args:
+            branch (str): the branch
+            run_id (str): the run, see ``start``
+        """
+        result = self._db_connection.get(index=self.db, doc_type=self.table, id=branch, ignore=404)
+        if result.get("found") and result["_source"]["run_id"] == run_id:
+            # The version check keeps a run starting in the meantime
+            self._db_connection.delete(index=self.db, doc_type=self.table, id=branch, version=result["_version"],
+                                       ignore=[404, 409])
@@ -1,24 +1,35 @@
 import copy
-from fabric.api import lcd
-from fabric.api import local
-from itertools import product
-import matplotlib
-import matplotlib.pyplot as plt
-import networkx as nx
-import numpy as np
 import os
-import time
-import re
 
-from loktar.constants import DEPENDENDY_GRAPH
+from loktar.cache import RequirementsCache
+from loktar.constants import CONFIG_CI_FILE
+from loktar.constants import DEPENDENCY_CACHE
+from loktar.constants import DEPENDENCY_EXTRACTION
 from loktar.exceptions import CIJobFail
 from loktar.exceptions import FailDrawDepGraph
+from loktar.exceptions import GraphCycle
+from loktar.graph import CompactGraph
+from loktar.lazy import lazy_attribute
+from loktar.lazy import LazyModule
 from loktar.log import Log
 from loktar.parser import parse_statuses
+from loktar.render import default_renderer
+from loktar.render import dot_source
+from loktar.render import new_graph_name
+from loktar.render import svg_source
+from loktar.scanner import scan_repository
 from loktar.strategy_run import strategy_runner
 
 logger = Log()
 
+# Plotting and graph libraries are only imported when they are used
+delayed = lazy_attribute("joblib", "delayed")
+Parallel = lazy_attribute("joblib", "Parallel")
+matplotlib = LazyModule("matplotlib")
+plt = LazyModule("matplotlib.pyplot")
+nx = LazyModule("networkx")
+np = LazyModule("numpy")
+
 
 def get_excluded_deps(artifacts, dict_message_files, modified_artifacts):
     """Compute which artifact"s dependencies should be ignored based on commit messages.
@@ -54,13 +65,11 @@ def get_excluded_deps(artifacts, dict_message_files, modified_artifacts):
     # artifacts whose dependencies should be ignored
     # Initialize to all of them and delete them one by one if some keywords are not exclusion keywords.
     exclude_dep = set(copy.deepcopy(modified_artifacts))
+    path_index = ArtifactPathIndex(artifacts)
     for commit_message, modified_files in dict_message_files.items():
-        for path in modified_files:
-            artifact_name = artifact_from_path(path, artifacts)
-            if artifact_name is None:
-                continue
+        for artifact_name in path_index.artifacts_from_paths(modified_files):
             # If we have set an exclude condition and this condition is matched
-            elif "exclude_dependencies_only_on_keywords" in artifacts[artifact_name]:
+            if "exclude_dependencies_only_on_keywords" in artifacts[artifact_name]:
                 keywords = {key.strip() for key in commit_message.split(":")[0].split("/")}
                 keywords_exclude = set(artifacts[artifact_name]["exclude_dependencies_only_on_keywords"])
                 # If there is a keyword that is not excluded
@@ -71,26 +80,86 @@ def get_excluded_deps(artifacts, dict_message_files, modified_artifacts):
     return exclude_dep
 
 
+class ArtifactPathIndex(object):
+    """Prefix tree over the artifact paths, used to classify modified files
+
+    The tree is built once from the artifacts configuration, then each path lookup only walks
+    as many nodes as the path has components.
+
+    Args:
+        artifacts (dict): all artifacts. Keys are artifacts names, values are directly taken from config.json
+    """
+    _ARTIFACT_KEY = None
+
+    def __init__(self, artifacts):
+        self._root = {}
+        for artifact_name, config in artifacts.iteritems():
+            node = self._root
+            for component in self._split(config.get("artifact_dir", "")) + [artifact_name]:
+                node = node.setdefault(component, {})
+            node[self._ARTIFACT_KEY] = artifact_name
+
+    @staticmethod
+    def _split(path):
+        return [component for component in path.split("/") if component]
+
+    def lookup(self, path):
+        """Get the name of the artifact containing a path
+
+        When artifacts are nested, the deepest one wins.
+
+        Args:
+            path (str): relative path starting with the potential artifact name (Example: serializers/http/)
+
+        Returns:
+            str: the artifact name or None if the path is not inside an artifact
+        """
+        artifact_name = None
+        node = self._root
+        for component in self._split(path):
+            node = node.get(component)
+            if node is None:
+                break
+            artifact_name = node.get(self._ARTIFACT_KEY, artifact_name)
+        return artifact_name
+
+    def classify(self, paths):
+        """Map a batch of paths to the artifacts containing them
+
+        Args:
+            paths (iterable of str): relative paths, typically a git diff
+
+        Returns:
+            dict of str: str: keys are the paths, values are artifact names or None
+        """
+        return {path: self.lookup(path) for path in set(paths)}
+
+    def artifacts_from_paths(self, paths):
+        """Get the artifacts touched by a batch of paths
+
+        Args:
+            paths (iterable of str): relative paths, typically a git diff
+
+        Returns:
+            set of str: names of the artifacts containing at least one of the paths
+        """
+        return set(self.classify(paths).values()) - {None}
+
+
 def artifact_from_path(path, artifacts):
     """Get the name of an artifact from a path.
 
     Args:
         path: relative path starting with the potential artifact name (Example: serializers/http/)
-        artifacts (dict): all artifacts. Keys are artifacts names, values are directly taken from config.json
+        artifacts (dict or ArtifactPathIndex): all artifacts. Keys are artifacts names, values are directly taken
+            from config.json. When several paths have to be classified, pass an ``ArtifactPathIndex`` built once
+            from them instead.
 
     Returns:
         the artifact name or None if the path is not inside an artifact
     """
-    paths = path.split('/')
-
-    for artifact_name, config in artifacts.iteritems():
-        pattern0 = "^{}/?{}$".format(config.get("artifact_dir", ""), artifact_name)
-        pattern1 = "^{}/?{}/.*$".format(config.get("artifact_dir", ""), artifact_name)
-        regexp0 = re.compile(pattern0)
-        regexp1 = re.compile(pattern1)
-
-        if any([p == artifact_name and (regexp0.match(path) or regexp1.match(path)) for p in paths]):
-            return artifact_name
+    path_index = artifacts if isinstance(artifacts, ArtifactPathIndex) else ArtifactPathIndex(artifacts)
+    return path_index.lookup(path)
 
 
 def artifact_path(artifact):
@@ -108,49 +177,143 @@ def artifact_path(artifact):
         return artifact["artifact_name"]
 
 
-def graph_edges(artifacts_requirements, modified_artifacts, exclude_dep_from_artifacts):
-        """Recursively find graph edges
+def requirement_edges(artifacts_requirements):
+    """Edges of the full dependency graph, as taken by ``required_paths``
 
-        Args:
-            artifacts_requirements (dict of list): Dictionary of artifact_name: requirements
-            modified_artifacts (set): artifact names that are considered modified
-            exclude_dep_from_artifacts (set): Do not analyze the dependencies for the artifacts in this list
+    Args:
+        artifacts_requirements (dict of set): Dictionary of artifact_name: requirements, like the result of
+            ``get_artifacts_requirements`` for all the artifacts
 
-        Returns:
-            list of tuple: Graph edges between artifacts.
-        """
-        if not modified_artifacts:
-            return []
+    Returns:
+        list of tuple: (requirement, artifact requiring it), sorted
+    """
+    return sorted((requirement, artifact_name)
+                  for artifact_name, requirements in artifacts_requirements.iteritems()
+                  for requirement in requirements)
 
-        edges_list = []
-        next_modified_artifacts = set()
-        artifacts_done = set()
 
-        for artifact_name in artifacts_requirements:
-            requirements = artifacts_requirements[artifact_name]
-            # but whose dependencies are not excluded (iff this was not a modified artifact)
-            modified_requirements = (requirements & modified_artifacts - exclude_dep_from_artifacts
-                                     if artifact_name not in modified_artifacts
-                                     else requirements & modified_artifacts)
+def required_paths(artifact_name, artifacts, dependencies):
+    """Paths of the repository a build of an artifact needs
+
+    The dependencies must hold every requirement of the artifact, the unmodified ones too: the edges of the graph of
+    the impacted artifacts, like the ``dep_edges`` of the init worker, leave out the requirements that are not
+    rebuilt, and their directories would be missing from the checkout. Use ``requirement_edges`` on the requirements
+    of all the artifacts, as given by ``get_artifacts_requirements``.
 
-            if modified_requirements:
-                # Add the edges from the modified requirements towards this artifact
-                edges = map(lambda x: (x, artifact_name), modified_requirements)
-                edges_list.extend(edges)
-                artifacts_done |= modified_requirements
-                next_modified_artifacts |= {artifact_name}
+    Args:
+        artifact_name (str): the artifact built
+        artifacts (dict): all artifacts. Keys are artifacts names, values are directly taken from config.json
+        dependencies (list of tuple): edges of the full dependency graph, from a requirement to the artifact
+            requiring it, see ``requirement_edges``
+
+    Returns:
+        list of str: the config file, the directory of the artifact and the directories of the artifacts it
+        requires, directly or not, relative to the repository root
+    """
+    requirements = {}
+    for requirement, artifact in dependencies:
+        requirements.setdefault(artifact, set()).add(requirement)
+
+    required = {artifact_name}
+    to_visit = [artifact_name]
+    while to_visit:
+        for requirement in requirements.get(to_visit.pop(), ()):
+            if requirement not in required:
+                required.add(requirement)
+                to_visit.append(requirement)
+
+    return sorted({CONFIG_CI_FILE} | {artifact_path(artifacts[name]) for name in required if name in artifacts})
 
-        for artifact_name in artifacts_done:
-            artifacts_requirements.pop(artifact_name, None)
 
-        edges_list.extend(graph_edges(artifacts_requirements, next_modified_artifacts, exclude_dep_from_artifacts))
-        return edges_list
+def artifacts_required_paths(artifact_names, artifacts, artifacts_requirements):
+    """Paths of the repository the builds of several artifacts need, see ``required_paths``
+
+    Args:
+        artifact_names (iterable of str): the artifacts built
+        artifacts (dict): all artifacts. Keys are artifacts names, values are directly taken from config.json
+        artifacts_requirements (dict of set): the requirements of all the artifacts, see ``requirement_edges``
+
+    Returns:
+        dict of str: list: the paths of each artifact, as taken by ``loktar.environment.prepare_test_env`` and
+        ``loktar.job.job_manager``
+    """
+    dependencies = requirement_edges(artifacts_requirements)
+    return {artifact_name: required_paths(artifact_name, artifacts, dependencies) for artifact_name in artifact_names}
+
+
+def dependents_index(artifacts_requirements):
+    """Reverse the requirements of the artifacts
+
+    Args:
+        artifacts_requirements (dict of set): Dictionary of artifact_name: requirements
+
+    Returns:
+        dict of str: set: keys are requirements, values are the artifacts requiring them
+    """
+    dependents = {}
+    for artifact_name, requirements in artifacts_requirements.iteritems():
+        for requirement in requirements:
+            dependents.setdefault(requirement, set()).add(artifact_name)
+    return dependents
+
+
+def graph_edges(artifacts_requirements, modified_artifacts, exclude_dep_from_artifacts, dependents=None):
+    """Find the graph edges impacted by the modified artifacts
+
+    The dependents of the modified artifacts are walked breadth first, level by level. An artifact becomes modified
+    at the next level when one of its requirements is modified at the current level. Once a requirement produced
+    edges it is never looked at as a dependent again. Each level only looks at the dependents of its modified
+    artifacts, so the cost follows the size of the impacted subgraph instead of the number of artifacts.
+
+    Args:
+        artifacts_requirements (dict of set): Dictionary of artifact_name: requirements, it is not modified
+        modified_artifacts (set): artifact names that are considered modified
+        exclude_dep_from_artifacts (set): Do not analyze the dependencies for the artifacts in this list
+        dependents (Optional[dict of set]): ``dependents_index(artifacts_requirements)`` when it is already built.
+            Defaults to None.
+
+    Returns:
+        list of tuple: Graph edges between artifacts.
+    """
+    if dependents is None:
+        dependents = dependents_index(artifacts_requirements)
+
+    edges_list = []
+    # Artifacts which can no longer be dependents
+    artifacts_done = set()
+    modified_artifacts = set(modified_artifacts)
+
+    while modified_artifacts:
+        next_modified_artifacts = set()
+        level_done = set()
+
+        for requirement in modified_artifacts:
+            excluded = requirement in exclude_dep_from_artifacts
+            for artifact_name in dependents.get(requirement, ()):
+                if artifact_name in artifacts_done:
+                    continue
+                # The dependencies of excluded artifacts are only followed between modified artifacts
+                if excluded and artifact_name not in modified_artifacts:
+                    continue
+                edges_list.append((requirement, artifact_name))
+                level_done.add(requirement)
+                next_modified_artifacts.add(artifact_name)
+
+        artifacts_done |= level_done
+        modified_artifacts = next_modified_artifacts
+
+    return edges_list
 
 
 def dependency_graph_from_modified_artifacts(repo_path,
                                              artifacts,
                                              modified_artifacts,
-                                             exclude_dep_from_artifacts=None):
+                                             exclude_dep_from_artifacts=None,
+                                             cache=None,
+                                             workers=None,
+                                             backend=None,
+                                             snapshot=None,
+                                             compact=False):
     """Parse requirement with a pattern for generating a dependencies graph
 
     Args:
@@ -159,6 +322,14 @@ def dependency_graph_from_modified_artifacts(repo_path,
         modified_artifacts (set): This is a set a modified artifact
         exclude_dep_from_artifacts (Optional[set]): Do not analyze the dependencies for the artifacts in this list.
             Defaults to None.
+        cache (Optional[loktar.cache.RequirementsCache]): Cache of the artifacts requirements. Defaults to None,
+            in which case a cache is used only if LOKTAR_DEPENDENCY_CACHE_PATH is set.
+        workers (Optional[int]): Number of parallel workers running the dependency plugins.
+            Defaults to LOKTAR_DEPENDENCY_EXTRACTION_WORKERS.
+        backend (Optional[str]): "threading" or "multiprocessing". Defaults to LOKTAR_DEPENDENCY_EXTRACTION_BACKEND.
+        snapshot (Optional[loktar.snapshot.DependencySnapshot]): Requirements of the artifacts at the commit checked
+            out in repo_path. The repository is not scanned when it is given. Defaults to None.
+        compact (Optional[bool]): Return a loktar.graph.CompactGraph instead of a networkx graph. Defaults to False.
 
     Returns:
         networkx.classes.digraph.DiGraph: The dependency graph.
@@ -167,69 +338,135 @@ def dependency_graph_from_modified_artifacts(repo_path,
         exclude_dep_from_artifacts = set()
 
     modified_artifacts = set(modified_artifacts)
-    artifacts_requirements = {}
 
-    # Go through all the artifacts
-    for artifact_name in artifacts:
-        requirements = get_artifact_requirements(artifact_name, artifacts, repo_path)
-        if requirements:
-            artifacts_requirements[artifact_name] = requirements
+    if snapshot is not None:
+        artifacts_requirements = snapshot.artifacts_requirements(artifacts)
+    else:
+        if cache is None and DEPENDENCY_CACHE["path"] is not None:
+            cache = RequirementsCache()
+
+        # Go through all the artifacts
+        artifacts_requirements = get_artifacts_requirements(artifacts.keys(), artifacts, repo_path,
+                                                            cache=cache,
+                                                            artifacts_files=scan_repository(repo_path, artifacts),
+                                                            workers=workers,
+                                                            backend=backend)
+        artifacts_requirements = {artifact_name: requirements
+                                  for artifact_name, requirements in artifacts_requirements.iteritems()
+                                  if requirements}
+
+        if cache is not None:
+            cache.save()
 
     edges_list = graph_edges(artifacts_requirements, modified_artifacts, exclude_dep_from_artifacts)
 
+    if compact:
+        return CompactGraph(modified_artifacts, edges_list)
+
     directed_graph = nx.DiGraph(edges_list)
     directed_graph.add_nodes_from(modified_artifacts)
 
     return directed_graph
 
 
-def get_artifact_requirements(artifact_name, artifacts, repo_path):
+def get_artifact_requirements(artifact_name, artifacts, repo_path, cache=None, files=None):
     """Get the requirements of a artifact
 
     Args:
         artifact_name (str): Name of the artifact to consider
         artifacts (dict): All artifacts. Keys are artifacts names, values are directly taken from config.json
         repo_path (str): This is the path where the repo to parse is
+        cache (Optional[loktar.cache.RequirementsCache]): Cache of the artifacts requirements. Defaults to None.
+        files (Optional[dict of str: str]): Dependency files of the artifact collected by
+            ``loktar.scanner.scan_repository``. Defaults to None, in which case the plugins read them.
 
     Returns:
         set of str: List of requirements for this artifact
     """
-    build_deps_path = os.path.join(repo_path, artifact_path(artifacts[artifact_name]))
-    requirements = strategy_runner(artifacts[artifact_name], "dependency", basepath=build_deps_path)
+    return get_artifacts_requirements([artifact_name], artifacts, repo_path,
+                                      cache=cache,
+                                      artifacts_files={artifact_name: files},
+                                      workers=1)[artifact_name]
 
-    requirements &= set(artifacts.keys())
 
-    if not requirements:
-        logger.info("No internal requirements found for artifact {0} in {1}".format(artifact_name, build_deps_path))
+def get_artifacts_requirements(artifact_names,
+                               artifacts,
+                               repo_path,
+                               cache=None,
+                               artifacts_files=None,
+                               workers=None,
+                               backend=None,
+                               internal_only=True):
+    """Get the requirements of several artifacts
 
-    return requirements
-
-
-def output_levels(graph):
-    """Generate relationship level dependencies with a directed graph
+    The dependency plugins of the artifacts that are not cached can run in a pool of threads or processes.
+    The cache is only read and updated by the calling process, and the result does not depend on the pool.
 
     Args:
-        graph (networkx.classes.digraph.DiGraph): Represent a directed graph
+        artifact_names (iterable of str): Names of the artifacts to consider
+        artifacts (dict): All artifacts. Keys are artifacts names, values are directly taken from config.json
+        repo_path (str): This is the path where the repo to parse is
+        cache (Optional[loktar.cache.RequirementsCache]): Cache of the artifacts requirements. Defaults to None.
+        artifacts_files (Optional[dict of str: dict]): Dependency files of the artifacts collected by
+            ``loktar.scanner.scan_repository``. Defaults to None, in which case the plugins read them.
+        workers (Optional[int]): Number of parallel workers running the dependency plugins.
+            Defaults to LOKTAR_DEPENDENCY_EXTRACTION_WORKERS.
+        backend (Optional[str]): "threading" or "multiprocessing". Defaults to LOKTAR_DEPENDENCY_EXTRACTION_BACKEND.
+        internal_only (Optional[bool]): Only keep the requirements that are artifacts. Defaults to True.
 
-    Return:
-        Return a list of dependencies level, top level to the lower level
+    Returns:
+        dict of str: set: keys are the artifacts names, values are their requirements among the artifacts
     """
-    top_sort = list(nx.topological_sort_recursive(graph))
-
-    levels = [[] for _ in xrange(len(top_sort))]
-
-    for level, node in enumerate(top_sort):
-        potential_level = level
-        # While we are not connected to this level we push the artifact down a level
-        while all((level_node, node) not in graph.edges() for level_node in levels[potential_level]) \
-                and potential_level >= 0:
-            potential_level -= 1
+    workers = workers if workers is not None else DEPENDENCY_EXTRACTION["workers"]
+    backend = backend if backend is not None else DEPENDENCY_EXTRACTION["backend"]
+    artifacts_files = artifacts_files if artifacts_files is not None else {}
+
+    artifact_names = sorted(artifact_names)
+    build_deps_paths = {artifact_name: os.path.join(repo_path, artifact_path(artifacts[artifact_name]))
+                        for artifact_name in artifact_names}
+
+    requirements = {}
+    digests = {}
+    for artifact_name in artifact_names:
+        digest = (cache.digest(artifacts[artifact_name],
+                               build_deps_paths[artifact_name],
+                               files=artifacts_files.get(artifact_name))
+                  if cache is not None else None)
+        cached_requirements = cache.get(artifact_name, digest) if digest is not None else None
+        if cached_requirements is None:
+            digests[artifact_name] = digest
+        else:
+            requirements[artifact_name] = cached_requirements
+
+    to_scan = sorted(digests)
+    if workers > 1 and len(to_scan) > 1:
+        logger.info("Running the dependency plugins of {} artifacts on {} {} workers".format(len(to_scan),
+                                                                                             workers,
+                                                                                             backend))
+    run_plugins = delayed(strategy_runner, check_pickle=backend != "threading")
+    scanned_requirements = Parallel(n_jobs=workers, backend=backend)(
+        run_plugins(artifacts[artifact_name],
+                    "dependency",
+                    basepath=build_deps_paths[artifact_name],
+                    files=artifacts_files.get(artifact_name))
+        for artifact_name in to_scan)
+
+    for artifact_name, artifact_requirements in zip(to_scan, scanned_requirements):
+        if digests[artifact_name] is not None:
+            cache.set(artifact_name, digests[artifact_name], artifact_requirements)
+        requirements[artifact_name] = artifact_requirements
+
+    if not internal_only:
+        return requirements
+
+    internal_artifacts = set(artifacts.keys())
+    for artifact_name in artifact_names:
+        requirements[artifact_name] = requirements[artifact_name] & internal_artifacts
+        if not requirements[artifact_name]:
+            logger.info("No internal requirements found for artifact {0} in {1}"
+                        .format(artifact_name, build_deps_paths[artifact_name]))
 
-        # Potential_level is now below the one where the node should go (where we are not connected)
-        potential_level += 1
-        levels[potential_level].append(node)
-    levels = filter(None, levels)
-    return levels
+    return requirements
 
 
 def get_directed_components(graph):
@@ -287,16 +524,18 @@ def dependencies_layout(dependencies_levels, scale=1):
     return pos
 
 
-def gplot(graph, dependencies_levels, save_path=None, output_type=None):
+def gplot(graph, dependencies_levels, save_path=None, output_type=None, name_file=None):
     """Draw a the dependency graph
 
     Args:
         graph (networkx.classes.digraph.DiGraph): Represent a directed graph
         dependencies_levels: A list of list with dependencies levels
         save_path (str): The path where the file is saved
-        output_type (str): The output file can be a dot file or a png
+        output_type (str): The output file can be a dot file, a svg file or a png
+        name_file (str): The name of the file, without extension. Defaults to a timestamp.
     """
-    name_file = str(time.time()).replace(".", "_")
+    if name_file is None:
+        name_file = new_graph_name()
 
     final_path = "{0}/{1}.{2}".format(save_path, name_file, output_type)
 
@@ -310,10 +549,12 @@ def gplot(graph, dependencies_levels, save_path=None, output_type=None):
         nx.draw_networkx(graph, pos=dependencies_layout(dependencies_levels), edge_color="g", node_size=3000)
         plt.savefig(final_path)
         logger.info("The graph is drawn")
-    elif output_type == "dot":
-        logger.info("Generating dot file")
-        nx.write_dot(graph, final_path)
-        logger.info("The dot file is generated")
+    elif output_type in ("dot", "svg"):
+        logger.info("Generating {0} file".format(output_type))
+        source = dot_source if output_type == "dot" else svg_source
+        with open(final_path, "w") as fd:
+            fd.write(source(graph.nodes(), graph.edges(), dependencies_levels))
+        logger.info("The {0} file is generated".format(output_type))
     elif output_type is None:
         logger.info("output type is {0}".format(output_type))
     else:
@@ -328,8 +569,11 @@ def gen_dependencies_level(directed_graph, draw=False):
     """Generate dependencies levels
 
     Args:
-        directed_graph (networkx.classes.digraph.DiGraph): Graph that represents relationship dependencies
-        draw (Boolean): of the function generate an image of dependencies level
+        directed_graph (networkx.classes.digraph.DiGraph or loktar.graph.CompactGraph): Graph that represents
+            relationship dependencies
+        draw (Boolean): of the function generate an image of dependencies level. The image is rendered and
+            published in the background by ``loktar.render.default_renderer``, so it may not be available yet
+            when this function returns.
 
     Returns:
         a tuple of
@@ -338,29 +582,49 @@ def gen_dependencies_level(directed_graph, draw=False):
           - a string or None who represent the name of the image of the dep graph
     """
     name_file = None
+    if isinstance(directed_graph, CompactGraph):
+        compact_graph = directed_graph
+    else:
+        compact_graph = CompactGraph.from_networkx(directed_graph)
+
+    logger.info("Generating the dependency levels")
+
     try:
-        assert nx.is_directed_acyclic_graph(directed_graph)
-    except AssertionError:
+        dependencies_levels = [component.levels() for component in compact_graph.components()]
+    except GraphCycle:
         logger.error("A cycle has been detected in the graph.")
         return False, None, None
 
-    logger.info("Generating the dependency levels")
-
-    dependencies_levels = [output_levels(comp) for comp in get_directed_components(directed_graph)]
     logger.info("The dependency levels have been generated")
     if draw:
-        name_file = gplot(directed_graph, dependencies_levels, save_path=DEPENDENDY_GRAPH["repo"], output_type="png")
-        with lcd(DEPENDENDY_GRAPH["repo"]):
-            local("git checkout master")
-            local("git fetch origin")
-            local("git merge origin/master")
-            local("git add .")
-            local("git commit -m 'Add {0}'".format(name_file))
-            local("git push origin")
+        name_file = default_renderer().submit(directed_graph, dependencies_levels)
 
     return True, dependencies_levels, name_file
 
 
+def reachable_nodes(graph, sources):
+    """Find the nodes reachable from a set of nodes
+
+    Args:
+        graph (networkx.classes.digraph.DiGraph or loktar.graph.CompactGraph): Represent a directed graph
+        sources (set): nodes the traversal starts from
+
+    Returns:
+        set: nodes that can be reached through a path of at least one edge from one of the sources
+    """
+    if isinstance(graph, CompactGraph):
+        return graph.reachable(sources)
+
+    reached = set()
+    to_visit = [node for node in sources if node in graph]
+    while to_visit:
+        for successor in graph.successors_iter(to_visit.pop()):
+            if successor not in reached:
+                reached.add(successor)
+                to_visit.append(successor)
+    return reached
+
+
 def get_do_not_touch_artifacts(id_pr, artifacts, scm, dep_graph, rebuild=False):
     """Get artifacts that should not be touched (except if one of their dependencies was modified)
 
@@ -371,7 +635,8 @@ def get_do_not_touch_artifacts(id_pr, artifacts, scm, dep_graph, rebuild=False):
         id_pr: ID of the pull request
         artifacts (dict): all artifacts. Keys are artifacts names, values are directly taken from config.json
         scm (loktar_api.scm.Github): Internal Github instance
-        dep_graph (networkx.classes.digraph.DiGraph): Graph that represents relationships between dependencies
+        dep_graph (networkx.classes.digraph.DiGraph or loktar.graph.CompactGraph): Graph that represents
+            relationships between dependencies
         rebuild (bool): If True (default), skip the head commit
 
     Returns:
@@ -392,8 +657,7 @@ def get_do_not_touch_artifacts(id_pr, artifacts, scm, dep_graph, rebuild=False):
         # Get the modified artifact in the last commit
         all_commit_files = [commit_file for commit in last_commits for commit_file in commit.files]
         modified_files = map(lambda file_: file_.filename, all_commit_files)
-        modified_artifacts_last_commits = {artifact_from_path(path, artifacts) for path in modified_files}
-        modified_artifacts_last_commits -= {None}
+        modified_artifacts_last_commits = ArtifactPathIndex(artifacts).artifacts_from_paths(modified_files)
 
     green_builds, red_builds = parse_statuses(statuses)
 
@@ -406,34 +670,16 @@ def get_do_not_touch_artifacts(id_pr, artifacts, scm, dep_graph, rebuild=False):
     do_not_touch_artifacts = green_builds - red_builds - modified_artifacts_last_commits
 
     if do_not_touch_artifacts:
-        # In the following algorithm we use an augmented dep graph where we add a node which points to every other
-        # node, and this node is added temporarily to do_not_touch_artifacts
-        # This is used to avoid the case where the root(s) of the graph (set of nodes that are topologically less
-        # than every other node) are not modified, then creating a path where there is an artifact not in
-        # do_not_touch_artifacts and solving the corner case of the path algorithm.
-        null_node = "__null__"
-        augmented_dep_graph = copy.deepcopy(dep_graph)
-        augmented_dep_graph.add_edges_from([(null_node, node) for node in augmented_dep_graph.nodes()])
         # Remove fake artifacts, to avoid error in the dependency graph manipulation
         do_not_touch_artifacts &= set(artifacts.keys())
-        do_not_touch_artifacts |= {null_node}
-
-        # TODO(Simplify the path check. Some artifacts are checked several times)
-
-        # Now we check that for every path between artifacts in this list a path between them only contains artifacts
-        # that should not be touched. If this is not the case we add the target artifact to have_path
-        have_incomplete_path = set()
-        for artifact_from, artifact_to in product(do_not_touch_artifacts, do_not_touch_artifacts):
-            paths = nx.all_simple_paths(augmented_dep_graph, artifact_from, artifact_to)
-            # We remove every 2-path containing the null node
-            paths = filter(lambda path: not (len(path) == 2 and null_node in path), paths)
-            for path in paths:
-                # If there are artifacts in the path that are not in do_not_touch, add the target artifact to the set
-                if set(path) - do_not_touch_artifacts:
-                    have_incomplete_path |= {artifact_to}
+
+        # An artifact keeps being untouched only if every path leading to it is made of untouched artifacts.
+        # In other words, every artifact reachable from an artifact that must be touched must be touched too,
+        # so a single traversal starting from all the touched artifacts gives the incomplete paths.
+        have_incomplete_path = reachable_nodes(dep_graph, set(dep_graph.nodes()) - do_not_touch_artifacts)
+        have_incomplete_path &= do_not_touch_artifacts
 
         do_not_touch_artifacts -= have_incomplete_path
-        do_not_touch_artifacts -= {null_node}
 
         logger.info("artifacts that have an incomplete path directed to them: {0}".format(have_incomplete_path))
     logger.info("artifacts that should not be touched: {0}".format(do_not_touch_artifacts))
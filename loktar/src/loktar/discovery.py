@@ -1,7 +1,7 @@
 from loktar.constants import GITHUB_INFO
 from loktar.cmd import cwd
 from loktar.cmd import exe
-from loktar.dependency import artifact_from_path
+from loktar.dependency import ArtifactPathIndex
 from loktar.exceptions import PrepareEnvFail
 from loktar.exceptions import SCMError
 from loktar.log import Log
@@ -59,4 +59,4 @@ def find_artifact_modified(git_branch, scm_type, ci_config, **kwargs):
 
     packages_map = {pkg["artifact_name"]: pkg for pkg in ci_config['packages']}
     # generate modified packages
-    return {artifact_from_path(path, packages_map) for path in git_diff} - {None}
+    return ArtifactPathIndex(packages_map).artifacts_from_paths(git_diff)
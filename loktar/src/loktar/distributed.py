@@ -0,0 +1,718 @@
+import heapq
+from itertools import count
+import json
+import multiprocessing
+import socket
+import threading
+import time
+from uuid import uuid4
+
+from loktar.constants import DISTRIBUTED
+from loktar.exceptions import CIJobFail
+from loktar.exceptions import PrepareEnvFail
+from loktar.executor import Executor
+from loktar.executor import lease_paths
+from loktar.executor import run_unit
+from loktar.executor import SupersededWatcher
+from loktar.job import dependent_units
+from loktar.job import PRIORITY_CLASSES
+from loktar.job import ready_units
+from loktar.job import record_duration
+from loktar.job import unit_priority_class
+from loktar.lazy import LazyModule
+from loktar.log import Log
+
+log = Log()
+
+redis = LazyModule("redis")
+
+# Bound of the list waking the Redis workers up, the extra wakeups only cost a look at the available builds
+MAX_WAKEUPS = 1000
+
+
+def priority_class(task):
+    """
+    Returns:
+        str: the priority class of a build, "pull_request" if it has none
+    """
+    return task.get("priority_class") or PRIORITY_CLASSES[-1]
+
+
+def with_run_start(task):
+    """
+    Returns:
+        dict: the build, with the start time of its run, its publication time if it has none
+    """
+    if task.get("run_start") is not None:
+        return task
+    return dict(task, run_start=time.time())
+
+
+def task_score(task):
+    """
+    Returns:
+        float: the available builds of a class with the lowest score are taken first. It is the start time of their
+        run, or the number of builds of their run for the pull requests when LOKTAR_DISTRIBUTED_PULL_REQUEST_ORDER
+        is "size".
+    """
+    size_order = DISTRIBUTED["pull_request_order"] == "size"
+    if priority_class(task) == "pull_request" and size_order and task.get("run_size") is not None:
+        return task["run_size"]
+    return task["run_start"]
+
+
+def higher_classes(task_class):
+    """
+    Returns:
+        list of str: the priority classes before a class, all the classes for an unknown one
+    """
+    if task_class not in PRIORITY_CLASSES:
+        return list(PRIORITY_CLASSES)
+    return PRIORITY_CLASSES[:PRIORITY_CLASSES.index(task_class)]
+
+
+class LocalBroker(object):
+    """Broker keeping the builds in memory, for workers running as threads of the coordinator process
+
+    It has the same semantics as ``RedisBroker``, so the whole distributed executor runs on a single machine, like in
+    the tests. The available builds are kept by priority class (see ``loktar.job.PRIORITY_CLASSES``), in a heap per
+    class, the builds of the oldest run first (see ``task_score``) and the builds of a run in the order they were
+    published.
+
+    Args:
+        lease_timeout (Optional[float]): time after which a build without heartbeat is given to another worker,
+            in seconds, default value is LOKTAR_DISTRIBUTED_LEASE_TIMEOUT
+        cancelled_ttl (Optional[float]): how long a cancelled run is remembered, in seconds,
+            default value is LOKTAR_DISTRIBUTED_CANCELLED_TTL
+    """
+
+    def __init__(self, lease_timeout=None, cancelled_ttl=None):
+        self.lease_timeout = lease_timeout if lease_timeout is not None else DISTRIBUTED["lease_timeout"]
+        self.cancelled_ttl = cancelled_ttl if cancelled_ttl is not None else DISTRIBUTED["cancelled_ttl"]
+        self._condition = threading.Condition()
+        # heaps of (score, sequence, task id)
+        self._ready = {task_class: [] for task_class in PRIORITY_CLASSES}
+        self._sequence = count()
+        self._tasks = {}
+        # task id: its entry in the heap of its class
+        self._entries = {}
+        # task id: (worker id, expiry)
+        self._leases = {}
+        self._results = {}
+        # run id: expiry
+        self._cancelled = {}
+        self._workers = {}
+
+    def publish(self, task):
+        """Make a build available to the workers
+
+        Args:
+            task (dict): the build, with its "id", its "run_id", its "priority_class", the "run_start" time of its
+                run and optionally the "run_size" of its run, which order the builds of a class
+        """
+        task = with_run_start(task)
+        with self._condition:
+            self._tasks[task["id"]] = task
+            self._entries[task["id"]] = (task_score(task), next(self._sequence), task["id"])
+            heapq.heappush(self._ready[priority_class(task)], self._entries[task["id"]])
+            self._condition.notify_all()
+
+    def pull(self, worker_id, timeout=None):
+        """Take the first available build, of the oldest run, the worker holds a lease on it
+
+        Args:
+            worker_id (str): the worker
+            timeout (Optional[float]): how long to wait for a build, in seconds. Defaults to None, no wait.
+
+        Returns:
+            dict: the build, None if there is none
+        """
+        deadline = time.time() + (timeout or 0)
+        with self._condition:
+            self._workers[worker_id] = time.time()
+            while True:
+                task = self._take(worker_id, PRIORITY_CLASSES)
+                remaining = deadline - time.time()
+                if task is not None or remaining <= 0:
+                    return task
+                self._condition.wait(remaining)
+
+    def pull_above(self, worker_id, task_class):
+        """Take the first available build of a priority class higher than a class, without waiting
+
+        Args:
+            worker_id (str): the worker
+            task_class (str): the priority class
+
+        Returns:
+            dict: the build, None if there is none
+        """
+        with self._condition:
+            return self._take(worker_id, higher_classes(task_class))
+
+    def requeue(self, task_id):
+        """Make a build taken by a worker available again, at its place among the other ones of its class
+
+        Args:
+            task_id (str): the build
+        """
+        with self._condition:
+            self._requeue(task_id)
+
+    def heartbeat(self, worker_id, task_id=None):
+        """Tell the worker is alive, and extend its lease on a build
+
+        Args:
+            worker_id (str): the worker
+            task_id (Optional[str]): the build it runs. Defaults to None.
+        """
+        with self._condition:
+            self._workers[worker_id] = time.time()
+            if task_id in self._leases:
+                self._leases[task_id] = (worker_id, time.time() + self.lease_timeout)
+
+    def report(self, result):
+        """Give the result of a build to the coordinator
+
+        Args:
+            result (dict): the result, with the "run_id" and the "task_id" of the build
+        """
+        with self._condition:
+            self._leases.pop(result["task_id"], None)
+            self._tasks.pop(result["task_id"], None)
+            self._entries.pop(result["task_id"], None)
+            self._results.setdefault(result["run_id"], []).append(result)
+            self._condition.notify_all()
+
+    def results(self, run_id, timeout=None):
+        """Take the results of the builds of a run
+
+        Args:
+            run_id (str): the run
+            timeout (Optional[float]): how long to wait for a result, in seconds. Defaults to None, no wait.
+
+        Returns:
+            list of dict: the results
+        """
+        deadline = time.time() + (timeout or 0)
+        with self._condition:
+            while not self._results.get(run_id) and deadline > time.time():
+                self._condition.wait(deadline - time.time())
+            return self._results.pop(run_id, [])
+
+    def requeue_expired(self):
+        """Make the builds whose lease expired available again, at their place among the other ones
+
+        Returns:
+            list of str: ids of the requeued builds
+        """
+        now = time.time()
+        with self._condition:
+            expired = [task_id for task_id, (_, expiry) in self._leases.iteritems() if expiry <= now]
+            for task_id in expired:
+                self._requeue(task_id)
+        return expired
+
+    def cancel(self, run_id):
+        """Cancel a run, its builds are not given to the workers anymore and the workers running them stop them
+
+        Args:
+            run_id (str): the run, forgotten after ``cancelled_ttl``
+        """
+        now = time.time()
+        with self._condition:
+            for expired_run_id in [expired_run_id for expired_run_id, expiry in self._cancelled.iteritems()
+                                   if expiry <= now]:
+                del self._cancelled[expired_run_id]
+            self._cancelled[run_id] = now + self.cancelled_ttl
+
+    def cancelled(self, run_id):
+        with self._condition:
+            return self._is_cancelled(run_id)
+
+    def workers(self):
+        """
+        Returns:
+            list of str: the workers seen during the last lease timeout
+        """
+        now = time.time()
+        with self._condition:
+            return sorted(worker_id for worker_id, seen in self._workers.iteritems()
+                          if seen + self.lease_timeout > now)
+
+    def forget(self, run_id):
+        """Drop what is left of a run"""
+        with self._condition:
+            self._results.pop(run_id, None)
+            for task_id in [task_id for task_id, task in self._tasks.iteritems() if task["run_id"] == run_id]:
+                self._tasks.pop(task_id)
+                self._entries.pop(task_id, None)
+                self._leases.pop(task_id, None)
+
+    def _take(self, worker_id, task_classes):
+        for task_class in task_classes:
+            ready = self._ready[task_class]
+            while ready:
+                task = self._tasks.get(heapq.heappop(ready)[-1])
+                if task is not None and not self._is_cancelled(task["run_id"]):
+                    self._leases[task["id"]] = (worker_id, time.time() + self.lease_timeout)
+                    return dict(task)
+        return None
+
+    def _is_cancelled(self, run_id):
+        return self._cancelled.get(run_id, 0) > time.time()
+
+    def _requeue(self, task_id):
+        self._leases.pop(task_id, None)
+        task = self._tasks.get(task_id)
+        if task is not None:
+            heapq.heappush(self._ready[priority_class(task)], self._entries[task_id])
+            self._condition.notify_all()
+
+
+class RedisBroker(object):
+    """Broker shared by the build nodes through Redis
+
+    The ids of the available builds are in a sorted set per priority class, scored by the start time of their run, so
+    the builds of the oldest run come first. The builds of a run, with the same score, come in the order of their ids,
+    see ``DistributedExecutor``. A worker moves an id to the list of the builds in progress and holds a lease on it,
+    in a sorted set scored by expiry, which its heartbeats extend. The coordinator moves the expired builds back to
+    the available ones. A cancelled run is a key of its own, which expires.
+
+    Args:
+        client (Optional[redis.StrictRedis]): Redis client. Defaults to a client to LOKTAR_DISTRIBUTED_HOST and
+            LOKTAR_DISTRIBUTED_PORT.
+        namespace (Optional[str]): prefix of the keys, default value is LOKTAR_DISTRIBUTED_NAMESPACE
+        lease_timeout (Optional[float]): time after which a build without heartbeat is given to another worker,
+            in seconds, default value is LOKTAR_DISTRIBUTED_LEASE_TIMEOUT
+        cancelled_ttl (Optional[float]): how long a cancelled run is remembered, in seconds,
+            default value is LOKTAR_DISTRIBUTED_CANCELLED_TTL
+    """
+
+    def __init__(self, client=None, namespace=None, lease_timeout=None, cancelled_ttl=None):
+        self.client = client if client is not None else redis.StrictRedis(host=DISTRIBUTED["host"],
+                                                                          port=DISTRIBUTED["port"])
+        self.namespace = namespace if namespace is not None else DISTRIBUTED["namespace"]
+        self.lease_timeout = lease_timeout if lease_timeout is not None else DISTRIBUTED["lease_timeout"]
+        self.cancelled_ttl = cancelled_ttl if cancelled_ttl is not None else DISTRIBUTED["cancelled_ttl"]
+
+    def _key(self, *names):
+        return ":".join((self.namespace,) + names)
+
+    def publish(self, task):
+        task = with_run_start(task)
+        pipeline = self.client.pipeline()
+        pipeline.hset(self._key("tasks"), task["id"], json.dumps(task))
+        pipeline.zadd(self._key("ready", priority_class(task)), task_score(task), task["id"])
+        pipeline.lpush(self._key("wakeups"), task["id"])
+        pipeline.ltrim(self._key("wakeups"), 0, MAX_WAKEUPS - 1)
+        pipeline.execute()
+
+    def pull(self, worker_id, timeout=None):
+        self.client.zadd(self._key("workers"), time.time(), worker_id)
+        deadline = time.time() + (timeout or 0)
+        while True:
+            task = self._take(PRIORITY_CLASSES)
+            if task is not None or deadline <= time.time():
+                return task
+            # Woken up by the next publication, or after a second
+            self.client.blpop(self._key("wakeups"), 1)
+
+    def pull_above(self, worker_id, task_class):
+        return self._take(higher_classes(task_class))
+
+    def requeue(self, task_id):
+        self._release(task_id)
+        self._push_back(task_id)
+
+    def heartbeat(self, worker_id, task_id=None):
+        self.client.zadd(self._key("workers"), time.time(), worker_id)
+        if task_id is not None and self.client.zscore(self._key("leases"), task_id) is not None:
+            self.client.zadd(self._key("leases"), time.time() + self.lease_timeout, task_id)
+
+    def report(self, result):
+        pipeline = self.client.pipeline()
+        pipeline.rpush(self._key("results", result["run_id"]), json.dumps(result))
+        pipeline.hdel(self._key("tasks"), result["task_id"])
+        pipeline.execute()
+        self._release(result["task_id"])
+
+    def results(self, run_id, timeout=None):
+        key = self._key("results", run_id)
+        results = []
+        if timeout:
+            first = self.client.blpop(key, int(max(timeout, 1)))
+            if first is None:
+                return results
+            results.append(json.loads(first[1]))
+        result = self.client.lpop(key)
+        while result is not None:
+            results.append(json.loads(result))
+            result = self.client.lpop(key)
+        return results
+
+    def requeue_expired(self):
+        now = time.time()
+        # A worker may have stopped between taking a build and holding its lease
+        for task_id in self.client.lrange(self._key("processing"), 0, -1):
+            if self.client.zscore(self._key("leases"), task_id) is None:
+                self.client.zadd(self._key("leases"), now + self.lease_timeout, task_id)
+
+        requeued = []
+        for task_id in self.client.zrangebyscore(self._key("leases"), 0, now):
+            # Only one coordinator requeues a build
+            if self.client.zrem(self._key("leases"), task_id):
+                self.client.lrem(self._key("processing"), count=1, value=task_id)
+                self._push_back(task_id)
+                requeued.append(task_id)
+        return requeued
+
+    def cancel(self, run_id):
+        self.client.setex(self._key("cancelled", run_id), int(max(self.cancelled_ttl, 1)), 1)
+
+    def cancelled(self, run_id):
+        return bool(self.client.exists(self._key("cancelled", run_id)))
+
+    def workers(self):
+        return sorted(self.client.zrangebyscore(self._key("workers"), time.time() - self.lease_timeout, "+inf"))
+
+    def forget(self, run_id):
+        # The builds of a cancelled run not taken yet would run once it is not remembered anymore
+        task_ids = [task_id for task_id, task in self.client.hgetall(self._key("tasks")).iteritems()
+                    if json.loads(task)["run_id"] == run_id]
+        pipeline = self.client.pipeline()
+        pipeline.delete(self._key("results", run_id))
+        for task_id in task_ids:
+            pipeline.hdel(self._key("tasks"), task_id)
+            for task_class in PRIORITY_CLASSES:
+                pipeline.zrem(self._key("ready", task_class), task_id)
+        pipeline.execute()
+
+    def _take(self, task_classes):
+        for task_class in task_classes:
+            ready = self._key("ready", task_class)
+            task_ids = self.client.zrange(ready, 0, 0)
+            while task_ids:
+                task = self._pop(ready, task_ids[0])
+                if task is not None:
+                    return task
+                task_ids = self.client.zrange(ready, 0, 0)
+        return None
+
+    def _pop(self, ready, task_id):
+        pipeline = self.client.pipeline()
+        pipeline.zrem(ready, task_id)
+        pipeline.lpush(self._key("processing"), task_id)
+        removed, _ = pipeline.execute()
+        if not removed:
+            # Taken by another worker in the meantime
+            self.client.lrem(self._key("processing"), count=1, value=task_id)
+            return None
+        return self._lease(task_id)
+
+    def _lease(self, task_id):
+        self.client.zadd(self._key("leases"), time.time() + self.lease_timeout, task_id)
+        task = self.client.hget(self._key("tasks"), task_id)
+        if task is not None:
+            task = json.loads(task)
+            if not self.cancelled(task["run_id"]):
+                return task
+            self.client.hdel(self._key("tasks"), task_id)
+        self._release(task_id)
+        return None
+
+    def _push_back(self, task_id):
+        task = self.client.hget(self._key("tasks"), task_id)
+        if task is not None:
+            task = json.loads(task)
+            self.client.zadd(self._key("ready", priority_class(task)), task_score(task), task_id)
+
+    def _release(self, task_id):
+        pipeline = self.client.pipeline()
+        pipeline.lrem(self._key("processing"), count=1, value=task_id)
+        pipeline.zrem(self._key("leases"), task_id)
+        pipeline.execute()
+
+
+BROKERS = {
+    "local": LocalBroker,
+    "redis": RedisBroker
+}
+
+
+def get_broker(name=None, **kwargs):
+    """Create a broker
+
+    Args:
+        name (Optional[str]): "redis" or "local", default value is LOKTAR_DISTRIBUTED_BROKER
+        **kwargs: arguments of the broker
+
+    Raises:
+        ValueError: the broker is unknown
+
+    Returns:
+        LocalBroker or RedisBroker: the broker
+    """
+    name = name if name is not None else DISTRIBUTED["broker"]
+    if name not in BROKERS:
+        raise ValueError("broker must be one of {}, actual value: {}".format(", ".join(sorted(BROKERS)), name))
+    return BROKERS[name](**kwargs)
+
+
+class DistributedExecutor(Executor):
+    """Coordinator publishing the ready builds to the workers of several build nodes
+
+    Each worker takes the next available build as soon as it is idle, so the busy nodes never hold back the idle
+    ones. The builds of the workers which stop sending heartbeats are given to other workers. The builds carry the
+    start time of their run, so the brokers give the builds of the older runs first, and their ids follow the order
+    they are published in.
+
+    Args:
+        broker (LocalBroker or RedisBroker): where the builds and their results go through
+        packages (dict of str: dict): configuration of the packages, keyed by name
+        repo_path (Optional[str]): where the repository is checked out on the build nodes. It is the root location of
+            the packages without ``artifact_root_location``. Defaults to None.
+        poll_timeout (Optional[float]): longest wait for a result, in seconds,
+            default value is LOKTAR_DISTRIBUTED_POLL_TIMEOUT
+        priority_class (Optional[str]): priority class of the builds, see ``loktar.job.PRIORITY_CLASSES``.
+            Defaults to None, "master" for the artifactmaster builds and "pull_request" for the other ones.
+    """
+
+    def __init__(self, broker, packages, repo_path=None, poll_timeout=None, priority_class=None):
+        if priority_class is not None and priority_class not in PRIORITY_CLASSES:
+            raise ValueError("priority_class must be one of {}, actual value: {}".format(", ".join(PRIORITY_CLASSES),
+                                                                                         priority_class))
+        self.broker = broker
+        self.packages = packages
+        self.repo_path = repo_path
+        self.poll_timeout = poll_timeout if poll_timeout is not None else DISTRIBUTED["poll_timeout"]
+        self.priority_class = priority_class
+        # Durations of the succeeded units, in seconds, and the workers which ran them
+        self.durations = {}
+        self.workers = {}
+        self._cancelled = None
+
+    def task(self, unit, run_id, run_start, index, run_size=None, commit_id=None, paths=None):
+        """
+        Args:
+            unit (tuple): the build unit
+            run_id (str): the run
+            run_start (float): when the run started, as a timestamp
+            index (int): the number of builds of the run published before this one
+            run_size (Optional[int]): the number of builds of the run. Defaults to None.
+            commit_id (Optional[str]): the commit built. Defaults to None.
+            paths (Optional[list of str]): the paths the build needs, the workers with a pool of workspaces check
+                only them out, see ``loktar.executor.lease_paths``. Defaults to None.
+
+        Returns:
+            dict: the build to publish
+        """
+        return {"id": "{0}-{1:06d}".format(run_id, index), "run_id": run_id, "run_start": run_start,
+                "run_size": run_size, "unit": list(unit), "package": self.package(unit[0]),
+                "priority_class": self.priority_class or unit_priority_class(unit), "commit_id": commit_id,
+                "paths": paths}
+
+    def cancel(self, reason="cancelled"):
+        """Stop the builds, ``run`` then raises CIJobFail. It can be called from any thread.
+
+        Args:
+            reason (str): why the builds are cancelled, given in the exception
+        """
+        self._cancelled = reason
+
+    def _record_result(self, unit, result, waiting, next_units, durations_db=None, commit_id=None):
+        """Record the result of a build, and release the units waiting for it
+
+        Raises:
+            CIJobFail: the build failed
+        """
+        if result["error"] is not None:
+            log.error('{0} failed for {1} on {2}: {3}'.format(unit[1], unit[0], result["worker"], result["error"]))
+            raise CIJobFail('Some builds failed: {0}'.format([unit]))
+        log.info('{0} succeeded for {1} on {2} in {3:.1f}s'.format(unit[1], unit[0], result["worker"],
+                                                                   result["duration"]))
+        self.durations[unit] = result["duration"]
+        self.workers[unit] = result["worker"]
+        record_duration(durations_db, unit, result["duration"], commit_id)
+        for next_unit in next_units.get(unit, []):
+            waiting[next_unit].discard(unit)
+
+    def run(self, units, priorities=None, superseded=None, durations_db=None, commit_id=None, sparse=None):
+        """Run build units, see ``loktar.executor.Executor.run``
+
+        Returns:
+            dict of tuple: float: the duration of each unit, in seconds
+        """
+        priorities = priorities if priorities is not None else {}
+        sparse = sparse if sparse is not None else {}
+        waiting = {unit: set(previous_units) for unit, previous_units in units.iteritems()}
+        next_units = dependent_units(units)
+
+        run_id = uuid4().hex
+        run_start = time.time()
+        sequence = count()
+        # task id: unit
+        published = {}
+        self._cancelled = None
+        try:
+            with SupersededWatcher(self.cancel, superseded):
+                while waiting or published:
+                    for unit in ready_units(waiting, priorities):
+                        del waiting[unit]
+                        task = self.task(unit, run_id, run_start, next(sequence), run_size=len(units),
+                                         commit_id=commit_id, paths=sparse.get(unit[0]))
+                        published[task["id"]] = unit
+                        self.broker.publish(task)
+                        log.info('Published {0} for {1}'.format(unit[1], unit[0]))
+
+                    if not published:
+                        raise CIJobFail('Some builds wait for each other: {0}'.format(sorted(waiting)))
+
+                    for result in self.broker.results(run_id, timeout=self.poll_timeout):
+                        unit = published.pop(result["task_id"], None)
+                        # Without unit, a late result of a requeued build
+                        if unit is not None:
+                            self._record_result(unit, result, waiting, next_units, durations_db=durations_db,
+                                                commit_id=commit_id)
+
+                    if self._cancelled is not None:
+                        raise CIJobFail('The builds are cancelled: {0}'.format(self._cancelled))
+
+                    for task_id in self.broker.requeue_expired():
+                        log.warning('The worker of {0} stopped sending heartbeats, it is requeued'
+                                    .format(published.get(task_id, task_id)))
+        except Exception:
+            # The workers stop the builds of the run
+            self.broker.cancel(run_id)
+            raise
+        finally:
+            self.broker.forget(run_id)
+
+        return self.durations
+
+
+def _run_in_process(runner, package, type_build, connection):
+    connection.send(runner(package, type_build))
+    connection.close()
+
+
+class Worker(object):
+    """Daemon of a build node, running the builds published by the coordinators
+
+    Each build runs in its own process, so it can be stopped when its run is cancelled. With preemption, a build is
+    stopped and given back to the broker as soon as a build of a higher priority class is waiting.
+
+    Args:
+        broker (LocalBroker or RedisBroker): where the builds and their results go through
+        worker_id (Optional[str]): name of the worker. Defaults to the host name and a random suffix.
+        runner (Optional[function]): runs a unit, it must be a module level function.
+            Defaults to ``loktar.executor.run_unit``.
+        heartbeat_interval (Optional[float]): interval between two heartbeats, in seconds,
+            default value is LOKTAR_DISTRIBUTED_HEARTBEAT_INTERVAL
+        poll_timeout (Optional[float]): longest wait for a build, in seconds,
+            default value is LOKTAR_DISTRIBUTED_POLL_TIMEOUT
+        preempt (Optional[bool]): default value is LOKTAR_DISTRIBUTED_PREEMPT
+        workspaces (Optional[loktar.workspace.WorkspacePool]): the builds with paths run in a checkout of these paths
+            only, see ``loktar.executor.lease_paths``. Defaults to None, where the coordinator checked them out.
+    """
+
+    def __init__(self, broker, worker_id=None, runner=run_unit, heartbeat_interval=None, poll_timeout=None,
+                 preempt=None, workspaces=None):
+        self.broker = broker
+        self.worker_id = worker_id if worker_id is not None else "{0}-{1}".format(socket.gethostname(),
+                                                                                  uuid4().hex[:8])
+        self.runner = runner
+        self.heartbeat_interval = (heartbeat_interval if heartbeat_interval is not None
+                                   else DISTRIBUTED["heartbeat_interval"])
+        self.poll_timeout = poll_timeout if poll_timeout is not None else DISTRIBUTED["poll_timeout"]
+        self.preempt = preempt if preempt is not None else DISTRIBUTED["preempt"]
+        self.workspaces = workspaces
+
+    def serve(self, stop=None):
+        """Run builds until ``stop`` is set
+
+        Args:
+            stop (Optional[threading.Event]): Defaults to None, forever.
+        """
+        log.info('Worker {0} started'.format(self.worker_id))
+        while stop is None or not stop.is_set():
+            self.run_once()
+
+    def run_once(self):
+        """Run the next available build, if one comes before the poll timeout
+
+        Returns:
+            bool: True if a build was run
+        """
+        task = self.broker.pull(self.worker_id, timeout=self.poll_timeout)
+        if task is None:
+            return False
+        self.run_task(task)
+        return True
+
+    def run_task(self, task):
+        """Run a build and report its result, or stop it if its run is cancelled or it is preempted
+
+        Args:
+            task (dict): the build
+        """
+        try:
+            workspace = lease_paths(self.workspaces, task.get("commit_id"), task.get("paths"))
+        except PrepareEnvFail as e:
+            self._report(task, "PrepareEnvFail: {0}".format(e), 0)
+            return
+        try:
+            package = (task["package"] if workspace is None
+                       else dict(task["package"], artifact_root_location=workspace.path))
+            higher_task = self._run(task, package)
+        finally:
+            if workspace is not None:
+                workspace.release()
+        # The checkout of the preempted build is released first
+        if higher_task is not None:
+            self.run_task(higher_task)
+
+    def _run(self, task, package):
+        """
+        Returns:
+            dict: the build of a higher priority class which preempted this one, None otherwise
+        """
+        package_name, type_build = task["unit"]
+        log.info('Worker {0} runs {1} for {2}'.format(self.worker_id, type_build, package_name))
+        receiver, sender = multiprocessing.Pipe(duplex=False)
+        process = multiprocessing.Process(target=_run_in_process,
+                                          args=(self.runner, package, type_build, sender))
+        start = time.time()
+        process.start()
+        sender.close()
+
+        # The pipe is readable once the build is over, or when its process died
+        while not receiver.poll(self.heartbeat_interval):
+            if self.broker.cancelled(task["run_id"]):
+                log.info('The run of {0} for {1} is cancelled'.format(type_build, package_name))
+                process.terminate()
+                process.join()
+                return None
+            higher_task = self.broker.pull_above(self.worker_id, priority_class(task)) if self.preempt else None
+            if higher_task is not None:
+                log.info('Worker {0} preempts {1} for {2}, for {3} for {4}'.format(self.worker_id, type_build,
+                                                                                   package_name,
+                                                                                   *reversed(higher_task["unit"])))
+                process.terminate()
+                process.join()
+                self.broker.requeue(task["id"])
+                return higher_task
+            self.broker.heartbeat(self.worker_id, task["id"])
+        try:
+            error, duration = receiver.recv()
+        except EOFError:
+            process.join()
+            error, duration = "The build process exited with {0}".format(process.exitcode), time.time() - start
+        process.join()
+
+        self._report(task, error, duration)
+        return None
+
+    def _report(self, task, error, duration):
+        self.broker.report({"run_id": task["run_id"], "task_id": task["id"], "unit": task["unit"], "error": error,
+                            "duration": duration, "worker": self.worker_id})
@@ -1,17 +1,18 @@
-# from fabric.api import env
-from fabric.api import lcd
-from fabric.api import local
-from fabric.exceptions import NetworkError
 import json
 import os
 from uuid import uuid4
 
 from loktar.cmd import exec_command_with_retry
+from loktar.cmd import lcd
+from loktar.cmd import local
 from loktar.constants import GITHUB_INFO
 from loktar.constants import MAX_RETRY_GITHUB
 from loktar.exceptions import PrepareEnvFail
+from loktar.lazy import LazyModule
 from loktar.log import Log
 
+fabric_exceptions = LazyModule("fabric.exceptions")
+
 
 def prepare_test_env(branch, **kwargs):
     """Prepare the test environment
@@ -26,6 +27,11 @@ def prepare_test_env(branch, **kwargs):
                                  Also can be set by environment variable LOKTAR_GITHUB_INFO_REPOSITORY
         skip_git_clone (bool): Skip the git clone if is another process who cloned the repository, default to false
         unique_name_dir (str): If the unique name dir for the location where the repository is cloned is generated by another process
+        workspaces (loktar.workspace.WorkspacePool): the branch is checked out from this pool instead of cloned,
+                                                     and the checkout is released once archived, default value None
+        sparse (dict of str: list): the paths each artifact needs, see ``loktar.dependency.required_paths``. An
+                                    archive with only these paths is also created for each artifact, see
+                                    ``artifact_archive``, default value None
 
     Raises:
         PrepareEnvFail: Failed to prepare the environment.
@@ -39,11 +45,15 @@ def prepare_test_env(branch, **kwargs):
 
     github_organization = kwargs.get("github_organization", GITHUB_INFO["organization"])
     github_repository = kwargs.get("github_repository", GITHUB_INFO["repository"])
+    workspaces = kwargs.get("workspaces")
+    workspace = None
 
     if not os.path.exists(unique_path_dir):
         os.mkdir(unique_path_dir)
     try:
-        if not kwargs.get("skip_git_clone", False):
+        if workspaces is not None:
+            workspace = workspaces.lease(branch, path=unique_path_dir)
+        elif not kwargs.get("skip_git_clone", False):
             if not exec_command_with_retry("git clone -b {0} --single-branch git@github.com:{1}/{2}.git {3}"
                                            .format(branch, github_organization, github_repository, unique_path_dir),
                                            0,
@@ -53,8 +63,10 @@ def prepare_test_env(branch, **kwargs):
                     .format(github_organization, github_repository))
 
         with lcd(unique_path_dir):
-            if not exec_command_with_retry("git fetch origin master", 0, MAX_RETRY_GITHUB):
+            # The mirror of the pool was fetched by the lease
+            if workspace is None and not exec_command_with_retry("git fetch origin master", 0, MAX_RETRY_GITHUB):
                 raise PrepareEnvFail("Can't fetch the master branch from origin")
+            merge_head = "FETCH_HEAD" if workspace is None else "master"
 
             if branch != "master":
                 if not exec_command_with_retry("git config --global user.email 'you@example.com'", 0, MAX_RETRY_GITHUB):
@@ -63,27 +75,78 @@ def prepare_test_env(branch, **kwargs):
                 if not exec_command_with_retry("git config --global user.name 'Your Name'", 0, MAX_RETRY_GITHUB):
                     raise PrepareEnvFail("Git config error on user.name")
 
-                if not exec_command_with_retry("git merge --no-ff --no-edit FETCH_HEAD", 0, MAX_RETRY_GITHUB):
-                    raise PrepareEnvFail("Can't merge the FETCH_HEAD (master branch)")
+                if not exec_command_with_retry("git merge --no-ff --no-edit {0}".format(merge_head), 0,
+                                               MAX_RETRY_GITHUB):
+                    raise PrepareEnvFail("Can't merge the {0} (master branch)".format(merge_head))
 
                 local("rm -rf {0}/.git".format(unique_path_dir))
 
-        with lcd(temporary_root):
-            if not exec_command_with_retry("tar -czf {0} {1}".format(archive, unique_name_dir), 0, MAX_RETRY_GITHUB):
-                raise PrepareEnvFail("Can't create the archive")
+        create_archives(temporary_root, unique_name_dir, archive, kwargs.get("sparse") or {},
+                        exclude_git=workspace is not None)
 
         logger.info("The test env is ready!")
 
-    except NetworkError as exc:
+    except fabric_exceptions.NetworkError as exc:
         logger.error(exc)
         raise
     except PrepareEnvFail:
         local("rm -rf {0}*".format(unique_path_dir))
         raise
+    finally:
+        if workspace is not None:
+            workspace.release()
 
     return "{0}/{1}".format(temporary_root, archive)
 
 
+def create_archives(temporary_root, unique_name_dir, archive, sparse, exclude_git=False):
+    """Archive the test environment, and the paths each artifact needs
+
+    Args:
+        temporary_root (str): the directory holding the test environment
+        unique_name_dir (str): the directory of the test environment, relative to ``temporary_root``
+        archive (str): the archive of the whole test environment, relative to ``temporary_root``
+        sparse (dict of str: list): the paths each artifact needs, see ``loktar.dependency.required_paths``
+        exclude_git (Optional[bool]): leave the .git of the test environment out. Defaults to False.
+
+    Raises:
+        PrepareEnvFail: an archive cannot be created
+    """
+    unique_path_dir = os.path.join(temporary_root, unique_name_dir)
+    with lcd(temporary_root):
+        # The .git of a checkout from the pool only points to the mirror
+        exclude = "--exclude={0}/.git ".format(unique_name_dir) if exclude_git else ""
+        if not exec_command_with_retry("tar -czf {0} {1}{2}".format(archive, exclude, unique_name_dir), 0,
+                                       MAX_RETRY_GITHUB):
+            raise PrepareEnvFail("Can't create the archive")
+
+        for artifact_name, paths in sparse.iteritems():
+            # A path may be missing on the branch, like the directory of a new artifact in another branch
+            paths = [os.path.join(unique_name_dir, path) for path in paths
+                     if os.path.exists(os.path.join(unique_path_dir, path))]
+            command = "tar -czf {0} {1}".format(artifact_archive(archive, artifact_name), " ".join(paths))
+            if not exec_command_with_retry(command, 0, MAX_RETRY_GITHUB):
+                raise PrepareEnvFail("Can't create the archive of {0}".format(artifact_name))
+
+
+def artifact_archive(archive, artifact_name):
+    """Archive of the test environment holding only what the build of an artifact needs
+
+    Args:
+        archive (str): the archive of the whole test environment, as returned by ``prepare_test_env``
+        artifact_name (str): the artifact built
+
+    Raises:
+        ValueError: ``archive`` is not a .tar.gz archive, like the directory of a checkout
+
+    Returns:
+        str: the archive of the artifact, next to the whole one
+    """
+    if not archive.endswith(".tar.gz"):
+        raise ValueError("archive must be a .tar.gz archive, actual value: {0}".format(archive))
+    return "{0}.{1}.tar.gz".format(archive[:-len(".tar.gz")], artifact_name)
+
+
 def get_config(package_name, test_env_path, full=False):
     """Retrieve the test configuration
 
@@ -81,3 +81,7 @@ class GuayError(LoktarException):
 
 class StorageProxyError(LoktarException):
     """Exception raised when an error is encountered with storage proxy system"""
+
+
+class GraphCycle(LoktarException):
+    """Exception raised when a dependency graph contains a cycle"""
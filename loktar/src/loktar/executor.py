@@ -0,0 +1,379 @@
+import abc
+import multiprocessing
+import Queue
+import threading
+import time
+
+from loktar.constants import BUILD_MONITOR
+from loktar.constants import EXECUTOR
+from loktar.constants import RESOURCES
+from loktar.constants import SCHEDULER
+from loktar.exceptions import CIJobFail
+from loktar.job import dependent_units
+from loktar.job import ready_units
+from loktar.job import record_duration
+from loktar.job import schedule_jobs
+from loktar.lazy import lazy_attribute
+from loktar.log import Log
+from loktar.resources import Capacity
+from loktar.resources import machine_capacity
+from loktar.resources import package_request
+from loktar.resources import resource_request
+from loktar.strategy_run import strategy_runner
+
+log = Log()
+
+CANCELLED = "cancelled"
+# Seconds between two checks of the workers of the local executor
+WORKERS_CHECK_INTERVAL = 1
+
+
+def run_unit(package, type_build):
+    """Run a build unit with the plugins of its package, this is what the local workers do
+
+    Args:
+        package (dict): package configuration
+        type_build (str): "test", "artifact" or "artifactmaster"
+
+    Returns:
+        tuple: the error of the build, None if it succeeded, and its duration in seconds
+    """
+    start = time.time()
+    try:
+        strategy_runner(package, "artifact" if type_build == "artifactmaster" else type_build)
+    except (Exception, SystemExit) as e:
+        # fabric aborts with SystemExit, and the exceptions of the plugins may not be picklable
+        return "{0}: {1}".format(type(e).__name__, str(e)), time.time() - start
+    return None, time.time() - start
+
+
+def lease_paths(workspaces, commit_id, paths):
+    """Check out only the paths a build needs, see ``loktar.workspace.WorkspacePool.lease``
+
+    Args:
+        workspaces (Optional[loktar.workspace.WorkspacePool]): where the paths are checked out from
+        commit_id (Optional[str]): the commit built
+        paths (Optional[list of str]): the paths the build needs, see ``loktar.dependency.required_paths``
+
+    Returns:
+        loktar.workspace.Workspace: the checkout to release once the build is over, None without pool, commit or
+        paths: the build then runs in the repository of the executor
+    """
+    if workspaces is None or commit_id is None or paths is None:
+        return None
+    return workspaces.lease(commit_id, paths=paths)
+
+
+def workers_died(pool, pids):
+    """Whether a worker of a pool died, killed by the OOM killer for instance
+
+    The pool replaces the dead workers, but the tasks they were running never complete.
+
+    Args:
+        pool (multiprocessing.Pool): the pool
+        pids (set of int): the pids of its workers when it was created
+
+    Returns:
+        bool: True if a worker died
+    """
+    return any(process.exitcode is not None or process.pid not in pids for process in pool._pool)
+
+
+class SupersededWatcher(object):
+    """Cancel the builds of an executor once a newer run of the branch started, while in the ``with`` block
+
+    Args:
+        cancel (function): cancels the builds, it receives the reason
+        superseded (Optional[function]): returns the commit of the run which superseded this one, None while there
+            is none, see ``loktar.db.ActiveRuns.superseding``. Nothing is watched if None.
+        interval (Optional[float]): interval between two checks, in seconds,
+            default value is LOKTAR_BUILD_MONITOR_COMMIT_INTERVAL
+    """
+
+    def __init__(self, cancel, superseded=None, interval=None):
+        self.cancel = cancel
+        self.superseded = superseded
+        self.interval = interval if interval is not None else BUILD_MONITOR["commit_interval"]
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _watch(self):
+        while not self._stop.wait(self.interval):
+            commit_sha = self.superseded()
+            if commit_sha is not None:
+                log.info('A newer run superseded this one, for the commit {0}'.format(commit_sha))
+                self.cancel('New commit arrived: {0}'.format(commit_sha))
+                return
+
+    def __enter__(self):
+        if self.superseded is not None:
+            self._thread = threading.Thread(target=self._watch)
+            self._thread.daemon = True
+            self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+class Executor(object):
+    """Backend running the build units of a component
+
+    A backend runs each unit once the units it waits for succeeded, the ready units with the highest priority first,
+    and raises CIJobFail as soon as one of them fails, after stopping the other ones. The backends running the
+    plugins themselves hold the configuration of the packages in ``packages`` and ``repo_path``.
+    """
+
+    __metaclass__ = abc.ABCMeta
+
+    packages = None
+    repo_path = None
+
+    def package(self, package_name, root=None):
+        """
+        Args:
+            package_name (str): the package
+            root (Optional[str]): where the repository is checked out for this build, like a checkout of its paths
+                only (see ``lease_paths``). Defaults to None, ``repo_path``.
+
+        Returns:
+            dict: the configuration of a package, as given to its plugins
+        """
+        package = dict(self.packages[package_name])
+        if root is not None:
+            package["artifact_root_location"] = root
+        elif self.repo_path is not None:
+            package.setdefault("artifact_root_location", self.repo_path)
+        return package
+
+    @abc.abstractmethod
+    def run(self, units, priorities=None, superseded=None, durations_db=None, commit_id=None, sparse=None):
+        """Run build units
+
+        Args:
+            units (dict of tuple: set): build units and the units they wait for, see ``loktar.job.build_units``
+                and ``loktar.job.level_units``
+            priorities (Optional[dict of tuple: float]): the ready units with the highest priority are run first.
+                Defaults to None.
+            superseded (Optional[function]): returns the commit of a newer run of the branch, the builds are
+                cancelled once there is one, see ``loktar.db.ActiveRuns.superseding``. Defaults to None.
+            durations_db (Optional[loktar.db.BuildDurations]): where the durations of the succeeded builds are
+                recorded. Defaults to None.
+            commit_id (Optional[str]): the commit built, recorded with the durations. Defaults to None.
+            sparse (Optional[dict of str: list]): the paths each artifact needs, see
+                ``loktar.dependency.artifacts_required_paths``. The backends with a pool of workspaces check only
+                these paths of the commit out for the builds of the artifact. Defaults to None.
+
+        Raises:
+            CIJobFail: a build failed, or the builds were cancelled
+        """
+
+
+class JenkinsExecutor(Executor):
+    """Run the builds as Jenkins jobs, see ``loktar.job.schedule_jobs``
+
+    The builds are cancelled when the pull request of the branch receives a new commit.
+
+    Args:
+        jenkins_instance: instance of the jenkins class, like ``loktar.gateway.JenkinsGateway``
+        commit_id: commit_id
+        committer: name of the person which committed
+        git_branch: git branch name to test / build
+        test_env_path: the location of the cloned test environment.
+        slots (Optional[int]): maximum number of builds queued or running at the same time,
+            default value is LOKTAR_SCHEDULER_SLOTS
+        durations_db (Optional[loktar.db.BuildDurations]): where the durations of the builds are recorded.
+            Defaults to None.
+        resources (Optional[dict of str: dict]): resource requests of the packages, see
+            ``loktar.resources.resource_request``. Defaults to None.
+        capacity (Optional[loktar.resources.Capacity]): what the Jenkins slaves offer, the builds are packed onto it.
+            Defaults to LOKTAR_RESOURCES_CPU and LOKTAR_RESOURCES_MEMORY when resources are given.
+    """
+
+    def __init__(self, jenkins_instance, commit_id, committer, git_branch, test_env_path, slots=None,
+                 durations_db=None, resources=None, capacity=None):
+        self.jenkins_instance = jenkins_instance
+        self.commit_id = commit_id
+        self.committer = committer
+        self.git_branch = git_branch
+        self.test_env_path = test_env_path
+        self.slots = slots if slots is not None else SCHEDULER["slots"]
+        self.durations_db = durations_db
+        self.resources = resources
+        self.capacity = capacity if capacity is not None or resources is None else Capacity()
+
+    def run(self, units, priorities=None, superseded=None, durations_db=None, commit_id=None, sparse=None):
+        schedule_jobs(self.jenkins_instance,
+                      self.commit_id,
+                      self.committer,
+                      self.git_branch,
+                      units,
+                      self.test_env_path,
+                      priorities=priorities,
+                      slots=self.slots,
+                      durations_db=durations_db if durations_db is not None else self.durations_db,
+                      resources=self.resources,
+                      # The resources taken by the builds of a failed run are never released
+                      capacity=(Capacity(self.capacity.cpu, self.capacity.memory, self.capacity.max_skips)
+                                if self.capacity is not None else None),
+                      superseded=superseded,
+                      sparse=sparse)
+
+
+class LocalExecutor(Executor):
+    """Run the builds on this machine, in a pool of processes
+
+    There is no queue to wait for, which makes it fit small repositories and offline runs. A failure or ``cancel``
+    terminates the pool, which stops the running builds, as does the death of a worker: its build would never
+    complete. The builds are packed onto the CPUs and the memory of the
+    machine, from the "resources" of the packages (see ``loktar.resources.resource_request``).
+
+    Args:
+        packages (dict of str: dict): configuration of the packages, keyed by name
+        repo_path (Optional[str]): where the repository is checked out. It is the root location of the packages
+            without ``artifact_root_location``. Defaults to None.
+        workers (Optional[int]): number of builds run at the same time, default value is LOKTAR_EXECUTOR_WORKERS
+            or the number of CPUs
+        runner (Optional[function]): runs a unit in a worker process, it must be a module level function.
+            Defaults to ``run_unit``.
+        capacity (Optional[loktar.resources.Capacity]): Defaults to LOKTAR_RESOURCES_CPU and
+            LOKTAR_RESOURCES_MEMORY, or the capacity of the machine.
+        workspaces (Optional[loktar.workspace.WorkspacePool]): the builds of the artifacts with paths in ``sparse``
+            run in a checkout of these paths only, see ``lease_paths``. Defaults to None, in ``repo_path``.
+    """
+
+    def __init__(self, packages, repo_path=None, workers=None, runner=run_unit, capacity=None, workspaces=None):
+        self.packages = packages
+        self.repo_path = repo_path
+        self.workspaces = workspaces
+        self.workers = workers or EXECUTOR["workers"] or multiprocessing.cpu_count()
+        self.runner = runner
+        if capacity is None:
+            cpu, memory = machine_capacity()
+            capacity = Capacity(RESOURCES["cpu"] or cpu, RESOURCES["memory"] or memory)
+        self.capacity = capacity
+        # Durations of the succeeded units, in seconds
+        self.durations = {}
+        self._done = None
+
+    def cancel(self, reason="cancelled"):
+        """Stop the running builds, ``run`` then raises CIJobFail. It can be called from any thread.
+
+        Args:
+            reason (str): why the builds are cancelled, given in the exception
+        """
+        done = self._done
+        if done is not None:
+            done.put((CANCELLED, reason, 0))
+
+    def _wait(self, done, pool, pids, running):
+        """Wait for a running unit to complete
+
+        Raises:
+            CIJobFail: the builds are cancelled, or a worker died
+
+        Returns:
+            tuple: the unit, the error of its build and its duration, see ``run_unit``
+        """
+        while True:
+            try:
+                unit, error, duration = done.get(timeout=WORKERS_CHECK_INTERVAL)
+            except Queue.Empty:
+                if workers_died(pool, pids):
+                    raise CIJobFail('A worker died while running one of {0}'.format(sorted(running)))
+                continue
+            if unit == CANCELLED:
+                raise CIJobFail('The builds are cancelled: {0}'.format(error))
+            return unit, error, duration
+
+    def run(self, units, priorities=None, superseded=None, durations_db=None, commit_id=None, sparse=None):
+        """Run build units, see ``Executor.run``
+
+        Returns:
+            dict of tuple: float: the duration of each unit, in seconds
+        """
+        priorities = priorities if priorities is not None else {}
+        sparse = sparse if sparse is not None else {}
+        waiting = {unit: set(previous_units) for unit, previous_units in units.iteritems()}
+        next_units = dependent_units(units)
+
+        requests = {package_name: resource_request(package) for package_name, package in self.packages.iteritems()}
+
+        done = self._done = Queue.Queue()
+        pool = multiprocessing.Pool(self.workers)
+        pids = {process.pid for process in pool._pool}
+        running = set()
+        # unit: the checkout of its paths
+        leases = {}
+        try:
+            with SupersededWatcher(self.cancel, superseded):
+                while waiting or running:
+                    ready = ready_units(waiting, priorities)
+                    for unit in self.capacity.pack(ready[:self.workers - len(running)], requests):
+                        del waiting[unit]
+                        running.add(unit)
+                        workspace = lease_paths(self.workspaces, commit_id, sparse.get(unit[0]))
+                        if workspace is not None:
+                            leases[unit] = workspace
+                        log.info('Running {0} for {1}'.format(unit[1], unit[0]))
+                        pool.apply_async(self.runner,
+                                         (self.package(unit[0], workspace.path if workspace is not None else None),
+                                          unit[1]),
+                                         callback=lambda result, unit=unit: done.put((unit,) + tuple(result)))
+
+                    if not running:
+                        raise CIJobFail('Some builds wait for each other: {0}'.format(sorted(waiting)))
+
+                    unit, error, duration = self._wait(done, pool, pids, running)
+                    running.discard(unit)
+                    self.capacity.release(package_request(requests, unit[0]))
+                    if unit in leases:
+                        leases.pop(unit).release()
+                    if error is not None:
+                        log.error('{0} failed for {1}: {2}'.format(unit[1], unit[0], error))
+                        raise CIJobFail('Some builds failed: {0}'.format([unit]))
+
+                    log.info('{0} succeeded for {1} in {2:.1f}s'.format(unit[1], unit[0], duration))
+                    self.durations[unit] = duration
+                    record_duration(durations_db, unit, duration, commit_id)
+                    for next_unit in next_units.get(unit, []):
+                        waiting[next_unit].discard(unit)
+        finally:
+            # Stops the builds still running after a failure or a cancellation
+            pool.terminate()
+            pool.join()
+            self._done = None
+            for unit in running:
+                self.capacity.release(package_request(requests, unit[0]))
+            for workspace in leases.itervalues():
+                workspace.release()
+
+        return self.durations
+
+
+EXECUTORS = {
+    "distributed": lazy_attribute("loktar.distributed", "DistributedExecutor"),
+    "jenkins": JenkinsExecutor,
+    "local": LocalExecutor
+}
+
+
+def get_executor(backend=None, **kwargs):
+    """Create an executor
+
+    Args:
+        backend (Optional[str]): name of the backend, see ``EXECUTORS``. Default value is LOKTAR_EXECUTOR_BACKEND.
+        **kwargs: arguments of the backend
+
+    Raises:
+        ValueError: the backend is unknown
+
+    Returns:
+        Executor: the executor
+    """
+    backend = backend if backend is not None else EXECUTOR["backend"]
+    if backend not in EXECUTORS:
+        raise ValueError("backend must be one of {}, actual value: {}".format(", ".join(sorted(EXECUTORS)), backend))
+    return EXECUTORS[backend](**kwargs)
@@ -1,8 +1,7 @@
 import os
 import sys
 
-from fabric.api import local
-
+from loktar.cmd import local
 from loktar.constants import GITHUB_INFO
 from loktar.constants import SLACK
 from loktar.notifications import define_job_status_on_github_commit
@@ -0,0 +1,282 @@
+from datetime import timedelta
+from functools import partial
+import threading
+import urllib
+
+from loktar.constants import JENKINS
+from loktar.lazy import lazy_attribute
+from loktar.lazy import LazyModule
+from loktar.log import Log
+
+log = Log()
+
+jenkinsapi_jenkins = LazyModule("jenkinsapi.jenkins")
+jenkinsapi_job = LazyModule("jenkinsapi.job")
+jenkinsapi_requester = LazyModule("jenkinsapi.utils.requester")
+python_jenkins = LazyModule("jenkins")
+requests = LazyModule("requests")
+HTTPAdapter = lazy_attribute("requests.adapters", "HTTPAdapter")
+
+BUILD_TREE = "number,queueId,building,result,duration,url"
+
+
+def session_requester(session, username=None, password=None, baseurl=None):
+    """jenkinsapi requester sending its requests through a session, so the connections are reused
+
+    Args:
+        session (requests.Session): the session
+        username (Optional[str]): Jenkins user. Defaults to None.
+        password (Optional[str]): Jenkins password. Defaults to None.
+        baseurl (Optional[str]): Jenkins url. Defaults to None.
+
+    Returns:
+        jenkinsapi.utils.requester.Requester: the requester
+    """
+    class SessionRequester(jenkinsapi_requester.Requester):
+        def get_url(self, url, params=None, headers=None, allow_redirects=True):
+            return session.get(self._update_url_scheme(url),
+                               **self.get_request_dict(params=params, headers=headers,
+                                                       allow_redirects=allow_redirects))
+
+        def post_url(self, url, params=None, data=None, files=None, headers=None, allow_redirects=True):
+            return session.post(self._update_url_scheme(url),
+                                **self.get_request_dict(params=params, data=data, files=files, headers=headers,
+                                                        allow_redirects=allow_redirects))
+
+    return SessionRequester(username, password, baseurl=baseurl)
+
+
+class GatewayBuild(object):
+    """A build whose state is refreshed by the batched polls of the gateway
+
+    It stands for a ``jenkinsapi.build.Build`` where loktar uses one: ``is_running``, ``get_duration``, ``stop`` and
+    ``poll`` with the ``_data['result']`` read by ``loktar.job.is_good``.
+
+    Args:
+        gateway (JenkinsGateway): the gateway of the Jenkins master
+        job_name (str): name of the job
+        data (dict): the build, as given by ``JenkinsGateway.builds``
+    """
+
+    def __init__(self, gateway, job_name, data):
+        self.gateway = gateway
+        self.job_name = job_name
+        self._data = data
+
+    def __repr__(self):
+        return "<GatewayBuild {0}>".format(str(self))
+
+    def __str__(self):
+        return "{0} #{1}".format(self.job_name, self._data["number"])
+
+    @property
+    def queue_id(self):
+        return self._data["queueId"]
+
+    def get_number(self):
+        return self._data["number"]
+
+    def is_running(self):
+        return self._data["building"]
+
+    def get_duration(self):
+        return timedelta(milliseconds=self._data["duration"])
+
+    def update(self, data):
+        self._data = data
+
+    def poll(self):
+        self._data = self.gateway.get_json(self._data["url"], tree=BUILD_TREE)
+
+    def stop(self):
+        self.gateway.post(self._data["url"] + "stop")
+
+
+class JenkinsGateway(object):
+    """Single entry point to a Jenkins master
+
+    All the requests go through one ``requests.Session``, which keeps its connections open. The job handles are
+    fetched once and cached, and ``builds`` reads the recent builds of all the followed jobs with a single request.
+    It can be used wherever a ``jenkinsapi.jenkins.Jenkins`` instance is expected by ``loktar.job``.
+
+    Args:
+        host (str): url of the Jenkins master
+        user (Optional[str]): Jenkins user. Defaults to None.
+        password (Optional[str]): Jenkins password. Defaults to None.
+        pool_size (Optional[int]): number of connections kept open, default value is LOKTAR_JENKINS_POOL_SIZE
+        builds_window (Optional[int]): number of recent builds read per job by ``builds``,
+            default value is LOKTAR_JENKINS_BUILDS_WINDOW
+        builds_request (Optional[str]): how ``builds`` reads them, "root" or "job",
+            default value is LOKTAR_JENKINS_BUILDS_REQUEST
+    """
+
+    def __init__(self, host, user=None, password=None, pool_size=None, builds_window=None, builds_request=None):
+        builds_request = builds_request if builds_request is not None else JENKINS["builds_request"]
+        if builds_request not in ("root", "job"):
+            raise ValueError("builds_request must be one of root, job, actual value: {}".format(builds_request))
+        self.host = host.rstrip("/")
+        self.user = user
+        self.password = password
+        self.builds_window = builds_window if builds_window is not None else JENKINS["builds_window"]
+        self.builds_request = builds_request
+        pool_size = pool_size if pool_size is not None else JENKINS["pool_size"]
+
+        self.session = requests.Session()
+        if user:
+            self.session.auth = (user, password)
+        for prefix in ("http://", "https://"):
+            self.session.mount(prefix, HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+
+        self._jenkins = None
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    @property
+    def jenkins(self):
+        """
+        Returns:
+            jenkinsapi.jenkins.Jenkins: the jenkinsapi client, sharing the session of the gateway
+        """
+        with self._lock:
+            if self._jenkins is None:
+                requester = session_requester(self.session, self.user, self.password, baseurl=self.host)
+                # lazy, the whole list of jobs is not needed
+                self._jenkins = jenkinsapi_jenkins.Jenkins(self.host, username=self.user, password=self.password,
+                                                           requester=requester, lazy=True)
+            return self._jenkins
+
+    def __getitem__(self, job_name):
+        """Get a job handle, fetched once
+
+        Args:
+            job_name (str): name of the job
+
+        Returns:
+            jenkinsapi.job.Job: the job
+        """
+        job = self._jobs.get(job_name)
+        if job is None:
+            url = "{0}/job/{1}".format(self.host, urllib.quote(job_name))
+            job = jenkinsapi_job.Job(url, job_name, jenkins_obj=self.jenkins)
+            self._jobs[job_name] = job
+        return job
+
+    def get_queue(self):
+        return self.jenkins.get_queue()
+
+    def get_json(self, url, **params):
+        """Read the JSON api of a Jenkins object
+
+        Args:
+            url (str): url of the object
+            **params: parameters of the request, like ``tree``
+
+        Returns:
+            dict: the object
+        """
+        response = self.session.get(url.rstrip("/") + "/api/json", params=params)
+        response.raise_for_status()
+        return response.json()
+
+    def post(self, url, data=""):
+        response = self.session.post(url, data=data)
+        response.raise_for_status()
+        return response
+
+    def job_builds(self, job_name):
+        """Read the recent builds of a job, with a request limited to them
+
+        Args:
+            job_name (str): name of the job
+
+        Returns:
+            dict of int: dict: the builds keyed by queue id
+        """
+        job = self.get_json("{0}/job/{1}".format(self.host, urllib.quote(job_name)),
+                            tree="builds[{0}]{{0,{1}}}".format(BUILD_TREE, self.builds_window))
+        return {build["queueId"]: build for build in job.get("builds") or []}
+
+    def root_builds(self, job_names):
+        """Read the recent builds of some jobs, with a single request to the root api
+
+        The tree of the request cannot select the jobs: the recent builds of all the jobs of the master are read, and
+        the other jobs are dropped here.
+
+        Args:
+            job_names (iterable of str): names of the jobs
+
+        Returns:
+            dict of str: dict: the builds of each job keyed by queue id, the jobs the master does not have are left out
+        """
+        job_names = set(job_names)
+        jobs = self.get_json(self.host, tree="jobs[name,builds[{0}]{{0,{1}}}]".format(BUILD_TREE,
+                                                                                      self.builds_window))
+        return {job["name"]: {build["queueId"]: build for build in job.get("builds") or []}
+                for job in jobs.get("jobs") or [] if job["name"] in job_names}
+
+    def builds(self, job_names, workers=None):
+        """Read the recent builds of some jobs
+
+        With ``builds_request`` "root", the builds of all the jobs come from one request, see ``root_builds``.
+        With "job", only the followed jobs are read, for the masters whose whole list of jobs is huge: there is one
+        request per job, see ``job_builds``, and the requests are sent at the same time through ``workers``.
+
+        Args:
+            job_names (iterable of str): names of the jobs
+            workers (Optional[loktar.monitor.Workers]): the pool of threads sending the requests. Defaults to None,
+                one request after the other.
+
+        Returns:
+            dict of str: dict: the builds of each job keyed by queue id, the jobs which cannot be read are left out
+        """
+        job_names = sorted(set(job_names))
+        if not job_names:
+            return {}
+        if self.builds_request == "root":
+            builds, error = _settle(partial(self.root_builds, job_names))
+            if error is not None:
+                log.warning('Cannot read the builds of {0}: {1}'.format(", ".join(job_names), str(error)))
+            return builds or {}
+
+        reads = [partial(self.job_builds, job_name) for job_name in job_names]
+        outcomes = workers.settle(reads) if workers is not None else [_settle(read) for read in reads]
+        builds = {}
+        for job_name, (job_builds, error) in zip(job_names, outcomes):
+            if error is not None:
+                log.warning('Cannot read the builds of {0}: {1}'.format(job_name, str(error)))
+                continue
+            builds[job_name] = job_builds
+        return builds
+
+
+def _settle(function):
+    try:
+        return function(), None
+    except Exception as e:
+        return None, e
+
+
+_gateways = {}
+_downstream_clients = {}
+
+
+def jenkins_gateway(host, user=None, password=None):
+    """
+    Returns:
+        JenkinsGateway: the gateway shared by the process for a Jenkins master, see ``JenkinsGateway``
+    """
+    key = (host, user, password)
+    if key not in _gateways:
+        _gateways[key] = JenkinsGateway(host, user=user, password=password)
+    return _gateways[key]
+
+
+def downstream_client(host, user=None, password=None):
+    """
+    Returns:
+        jenkins.Jenkins: the python-jenkins client shared by the process for a Jenkins master
+    """
+    key = (host, user, password)
+    if key not in _downstream_clients:
+        _downstream_clients[key] = python_jenkins.Jenkins(host, user, password)
+    return _downstream_clients[key]
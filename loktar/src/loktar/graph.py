@@ -0,0 +1,226 @@
+from array import array
+
+from loktar.exceptions import GraphCycle
+
+
+class CompactGraph(object):
+    """Directed graph of artifacts stored as integer arrays
+
+    Artifacts names are interned and mapped to integers, adjacency is stored in CSR arrays (the successors of
+    node ``i`` are ``targets[offsets[i]:offsets[i + 1]]``), one for successors and one for predecessors.
+    Subgraphs are views sharing these arrays, only the set of their active nodes is allocated.
+
+    Args:
+        nodes (iterable of str): artifacts names
+        edges (iterable of tuple): edges between artifacts names, their ends are added to the nodes
+    """
+
+    def __init__(self, nodes=(), edges=()):
+        self._names = []
+        self._index = {}
+        for node in nodes:
+            self._add_name(node)
+        edges = {(self._add_name(node_from), self._add_name(node_to)) for node_from, node_to in edges}
+
+        self._succ_offsets, self._succ_targets = self._csr(edges)
+        self._pred_offsets, self._pred_targets = self._csr((node_to, node_from) for node_from, node_to in edges)
+        # Active nodes of the view, None when all the nodes are active
+        self._active = None
+
+    def _add_name(self, name):
+        node_id = self._index.get(name)
+        if node_id is None:
+            node_id = len(self._names)
+            self._names.append(intern(name) if type(name) is str else name)
+            self._index[name] = node_id
+        return node_id
+
+    def _csr(self, edges):
+        edges = sorted(edges)
+        offsets = array("l", [0] * (len(self._names) + 1))
+        for node_from, _ in edges:
+            offsets[node_from + 1] += 1
+        for node_id in xrange(len(self._names)):
+            offsets[node_id + 1] += offsets[node_id]
+        return offsets, array("l", (node_to for _, node_to in edges))
+
+    @classmethod
+    def from_networkx(cls, graph):
+        """Build a compact graph from a networkx graph
+
+        Args:
+            graph (networkx.classes.digraph.DiGraph): Represent a directed graph
+
+        Returns:
+            CompactGraph: the graph
+        """
+        return cls(graph.nodes_iter(), graph.edges_iter())
+
+    def to_networkx(self):
+        """Build a networkx graph, for plotting
+
+        Returns:
+            networkx.classes.digraph.DiGraph: the graph
+        """
+        import networkx as nx
+
+        graph = nx.DiGraph()
+        graph.add_nodes_from(self.nodes())
+        graph.add_edges_from(self.edges())
+        return graph
+
+    def _view(self, active):
+        view = object.__new__(CompactGraph)
+        view.__dict__.update(self.__dict__)
+        view._active = frozenset(active)
+        return view
+
+    def _node_ids(self):
+        return xrange(len(self._names)) if self._active is None else sorted(self._active)
+
+    def _is_active(self, node_id):
+        return self._active is None or node_id in self._active
+
+    def _neighbors(self, offsets, targets, node_id):
+        return [neighbor for neighbor in targets[offsets[node_id]:offsets[node_id + 1]] if self._is_active(neighbor)]
+
+    def _successors(self, node_id):
+        return self._neighbors(self._succ_offsets, self._succ_targets, node_id)
+
+    def _predecessors(self, node_id):
+        return self._neighbors(self._pred_offsets, self._pred_targets, node_id)
+
+    def __contains__(self, name):
+        node_id = self._index.get(name)
+        return node_id is not None and self._is_active(node_id)
+
+    def __len__(self):
+        return len(self._names) if self._active is None else len(self._active)
+
+    def nodes(self):
+        """
+        Returns:
+            list of str: the artifacts names
+        """
+        return [self._names[node_id] for node_id in self._node_ids()]
+
+    def edges(self):
+        """
+        Returns:
+            list of tuple: the edges between artifacts names
+        """
+        return [(self._names[node_id], self._names[successor])
+                for node_id in self._node_ids() for successor in self._successors(node_id)]
+
+    def successors(self, name):
+        return [self._names[successor] for successor in self._successors(self._index[name])]
+
+    def predecessors(self, name):
+        return [self._names[predecessor] for predecessor in self._predecessors(self._index[name])]
+
+    def subgraph(self, names):
+        """View of the graph restricted to some nodes, nothing is copied but the nodes ids
+
+        Args:
+            names (iterable of str): artifacts names to keep, unknown ones are ignored
+
+        Returns:
+            CompactGraph: the view
+        """
+        return self._view(self._index[name] for name in names if name in self)
+
+    def without(self, names):
+        """View of the graph without some nodes, it replaces a deep copy followed by ``remove_nodes_from``
+
+        Args:
+            names (iterable of str): artifacts names to remove, unknown ones are ignored
+
+        Returns:
+            CompactGraph: the view
+        """
+        removed = {self._index[name] for name in names if name in self}
+        return self._view(node_id for node_id in self._node_ids() if node_id not in removed)
+
+    def components(self):
+        """Split the graph in weakly connected components with a union-find
+
+        Returns:
+            list of CompactGraph: views of the components, ordered by their first node
+        """
+        parents = {node_id: node_id for node_id in self._node_ids()}
+
+        def find(node_id):
+            root = node_id
+            while parents[root] != root:
+                root = parents[root]
+            # Path compression
+            while parents[node_id] != root:
+                parents[node_id], node_id = root, parents[node_id]
+            return root
+
+        for node_id in parents:
+            for successor in self._successors(node_id):
+                root_from, root_to = find(node_id), find(successor)
+                if root_from != root_to:
+                    parents[max(root_from, root_to)] = min(root_from, root_to)
+
+        components = {}
+        for node_id in sorted(parents):
+            components.setdefault(find(node_id), []).append(node_id)
+        return [self._view(components[root]) for root in sorted(components)]
+
+    def levels(self):
+        """Generate the dependency levels with a Kahn traversal
+
+        Each node is put one level below its deepest predecessor.
+
+        Raises:
+            loktar.exceptions.GraphCycle: The graph contains a cycle
+
+        Returns:
+            list of list of str: the levels, top level first
+        """
+        remaining_predecessors = {node_id: len(self._predecessors(node_id)) for node_id in self._node_ids()}
+        level = [node_id for node_id in self._node_ids() if remaining_predecessors[node_id] == 0]
+        levels = []
+        nb_leveled = 0
+
+        while level:
+            levels.append([self._names[node_id] for node_id in level])
+            nb_leveled += len(level)
+            next_level = []
+            for node_id in level:
+                for successor in self._successors(node_id):
+                    remaining_predecessors[successor] -= 1
+                    if remaining_predecessors[successor] == 0:
+                        next_level.append(successor)
+            level = next_level
+
+        if nb_leveled != len(self):
+            raise GraphCycle("Graph contains a cycle.")
+        return levels
+
+    def is_acyclic(self):
+        try:
+            self.levels()
+        except GraphCycle:
+            return False
+        return True
+
+    def reachable(self, sources):
+        """Find the nodes reachable from a set of nodes
+
+        Args:
+            sources (iterable of str): nodes the traversal starts from, unknown ones are ignored
+
+        Returns:
+            set of str: nodes that can be reached through a path of at least one edge from one of the sources
+        """
+        reached = set()
+        to_visit = [self._index[name] for name in sources if name in self]
+        while to_visit:
+            for successor in self._successors(to_visit.pop()):
+                if successor not in reached:
+                    reached.add(successor)
+                    to_visit.append(successor)
+        return {self._names[node_id] for node_id in reached}
@@ -1,20 +1,23 @@
 from __future__ import division
 
+from functools import partial
 import logging
-import random
 import re
 import time
 
-import jenkins
-from jenkinsapi.constants import STATUS_SUCCESS
-from jenkinsapi.custom_exceptions import NotBuiltYet
-from jenkinsapi.jenkins import Jenkins
-from requests import HTTPError
-
 from loktar.constants import GITHUB_INFO
+from loktar.constants import SCHEDULER
+from loktar.environment import artifact_archive
 from loktar.exceptions import CIJobFail
+from loktar.lazy import LazyModule
+from loktar.gateway import downstream_client
+from loktar.gateway import jenkins_gateway
+from loktar.gateway import JenkinsGateway
 from loktar.log import Log
+from loktar.monitor import BuildMonitor
 from loktar.notifications import define_job_status_on_github_commit
+from loktar.resources import Capacity
+from loktar.resources import package_request
 from loktar.scm import Github
 from loktar.serialize import serialize
 
@@ -22,6 +25,11 @@ logger = logging.getLogger(__name__)
 
 log = Log()
 
+jenkinsapi_constants = LazyModule("jenkinsapi.constants")
+
+# The builds of a class are launched before the ones of the next classes, whatever their priority
+PRIORITY_CLASSES = ["master", "pull_request"]
+
 
 def ci_downstream(ci_config, artifact_name, type_task, params, job_format="{0} - {1}"):
     """Send a job to the ci
@@ -32,9 +40,9 @@ def ci_downstream(ci_config, artifact_name, type_task, params, job_format="{0} -
         type_task: apparently only ``'superman'``
         params: parameters sent to jenkins
     """
-    ci_server = jenkins.Jenkins(ci_config['host'],
-                                ci_config['user'],
-                                ci_config['password'])
+    ci_server = downstream_client(ci_config['host'],
+                                  ci_config['user'],
+                                  ci_config['password'])
     ci_server.build_job(job_format.format(artifact_name, type_task), params)
 
 
@@ -44,7 +52,15 @@ def job_manager(ci_config,
                 git_branch,
                 commit_id,
                 committer,
-                test_env_path):
+                test_env_path,
+                dependencies=None,
+                durations_db=None,
+                executor=None,
+                resources=None,
+                speculative=None,
+                active_runs=None,
+                commit_time=None,
+                sparse=None):
     """Build all the levels for a component
 
     Args:
@@ -56,13 +72,33 @@ def job_manager(ci_config,
         commit_id: commit_id
         committer: name of the person which committed
         test_env_path: the path where the environment is store (eg: /tmp/toto)
+        dependencies (Optional[list of tuple]): edges of the dependency graph, from a requirement to the artifact
+            requiring it. When they are given, each build is launched as soon as the builds it depends on succeeded
+            (see ``schedule_jobs``) instead of waiting for the whole previous level. Defaults to None.
+        durations_db (Optional[loktar.db.BuildDurations]): history of the build durations. With dependencies or an
+            executor, the builds on the longest remaining path are launched first, and the durations of the builds
+            are recorded. Defaults to None.
+        executor (Optional[loktar.executor.Executor]): runs the builds instead of the Jenkins of ``ci_config``,
+            with the same order: by levels, or as soon as the dependencies are built when they are given. The
+            active runs and the durations apply to it too. Defaults to None.
+        resources (Optional[dict of str: dict]): resource requests of the packages, see
+            ``loktar.resources.resource_request``. With dependencies, the builds are packed onto the capacity
+            LOKTAR_RESOURCES_CPU and LOKTAR_RESOURCES_MEMORY. Defaults to None.
+        speculative (Optional[bool]): with dependencies, launch the tests while the builds they wait for are
+            running, see ``Speculation``. Default value is LOKTAR_SCHEDULER_SPECULATIVE.
+        active_runs (Optional[loktar.db.ActiveRuns]): the run is recorded as the active one of the branch, and its
+            Jenkins builds are stopped as soon as a run of a newer commit of the branch starts, instead of watching
+            the head of the pull request. Defaults to None.
+        commit_time (Optional[float]): the timestamp of the commit, so that a run of an older commit starting
+            last does not stop the run of a newer one, see ``loktar.db.ActiveRuns.start``. Defaults to None.
+        sparse (Optional[dict of str: list]): the paths each artifact needs, as given to
+            ``loktar.environment.prepare_test_env``. The Jenkins jobs of these artifacts receive the archive of their
+            paths instead of the whole test environment, and the executors check only these paths out, see
+            ``loktar.executor.Executor.run``. Defaults to None.
     """
+    speculative = speculative if speculative is not None else SCHEDULER['speculative']
     types_build = ['test', 'artifact'] if git_branch != 'master' else ['artifactmaster']
 
-    jenkins_instance = Jenkins(ci_config['host'],
-                               username=ci_config['user'],
-                               password=ci_config['password'])
-
     for actual_number_lvl, lvl in enumerate(component):
         for type_build in set(types_build) - {'artifactmaster'}:
             for package in lvl:
@@ -74,20 +110,78 @@ def job_manager(ci_config,
                                                    context=context,
                                                    description='Build awaiting launch')
 
-    for actual_number_lvl, lvl in enumerate(component):
-        for type_build in types_build:
-            log.info('Building {type_build} for component {component_id}, level {lvl}/{lvl_nb}'
-                     .format(type_build=type_build,
-                             component_id=component_id,
-                             lvl=actual_number_lvl + 1,
-                             lvl_nb=len(component)))
-            launch_jobs(jenkins_instance,
-                        commit_id,
-                        committer,
-                        git_branch,
-                        lvl,
-                        type_build,
-                        test_env_path)
+    run_id = active_runs.start(git_branch, commit_id, commit_time=commit_time) if active_runs is not None else None
+    superseded = (partial(active_runs.superseding, git_branch, commit_id, commit_time=commit_time)
+                  if active_runs is not None else None)
+    try:
+        if executor is not None:
+            log.info('Building component {0} with {1}'.format(component_id, type(executor).__name__))
+            units = (build_units(component, types_build, dependencies) if dependencies is not None
+                     else level_units(component, types_build))
+            durations = {} if durations_db is None else durations_db.estimates(artifact for artifact, _ in units)
+            executor.run(units,
+                         priorities=critical_path_priorities(units, durations),
+                         superseded=superseded,
+                         durations_db=durations_db,
+                         commit_id=commit_id,
+                         sparse=sparse)
+            return
+
+        jenkins_instance = jenkins_gateway(ci_config['host'],
+                                           user=ci_config['user'],
+                                           password=ci_config['password'])
+
+        if dependencies is not None:
+            log.info('Building component {component_id} as soon as the dependencies are built'
+                     .format(component_id=component_id))
+            units = build_units(component, types_build, dependencies)
+            durations = ({} if durations_db is None
+                         else durations_db.estimates(artifact for artifact, _ in units))
+            speculation = Speculation() if speculative else None
+            try:
+                schedule_jobs(jenkins_instance,
+                              commit_id,
+                              committer,
+                              git_branch,
+                              units,
+                              test_env_path,
+                              priorities=critical_path_priorities(units, durations),
+                              slots=SCHEDULER['slots'],
+                              durations_db=durations_db,
+                              resources=resources,
+                              capacity=Capacity() if resources is not None else None,
+                              speculation=speculation,
+                              superseded=superseded,
+                              sparse=sparse)
+            finally:
+                if speculation is not None:
+                    log.info('Speculative builds of component {component_id}: {accepted} accepted, {discarded} '
+                             'discarded, {saved:.1f} executor-minutes saved, {wasted:.1f} wasted'
+                             .format(component_id=component_id,
+                                     accepted=len(speculation.accepted),
+                                     discarded=len(speculation.discarded),
+                                     **speculation.minutes()))
+            return
+
+        for actual_number_lvl, lvl in enumerate(component):
+            for type_build in types_build:
+                log.info('Building {type_build} for component {component_id}, level {lvl}/{lvl_nb}'
+                         .format(type_build=type_build,
+                                 component_id=component_id,
+                                 lvl=actual_number_lvl + 1,
+                                 lvl_nb=len(component)))
+                launch_jobs(jenkins_instance,
+                            commit_id,
+                            committer,
+                            git_branch,
+                            lvl,
+                            type_build,
+                            test_env_path,
+                            superseded=superseded,
+                            sparse=sparse)
+    finally:
+        if active_runs is not None:
+            active_runs.finish(git_branch, run_id)
 
 
 def split_on_condition(seq, condition):
@@ -121,7 +215,29 @@ def is_good(build):
         build.poll()
         time.sleep(0.5)
         tries -= 1
-    return build._data['result'] == STATUS_SUCCESS
+    return build._data['result'] == jenkinsapi_constants.STATUS_SUCCESS
+
+
+def build_monitor(jenkins_instance, commit_id, git_branch, superseded=None):
+    """Monitor of the builds of a run, which stops when a new commit arrives
+
+    Args:
+        jenkins_instance: instance of the jenkins class
+        commit_id: commit_id
+        git_branch: git branch name to test / build
+        superseded (Optional[function]): returns the commit of a newer run of the branch, see
+            ``loktar.db.ActiveRuns.superseding``. It is watched instead of the head of the pull request of the
+            branch. Defaults to None.
+
+    Returns:
+        loktar.monitor.BuildMonitor: the monitor
+    """
+    if superseded is not None:
+        return BuildMonitor(commit_id, is_good, superseded=superseded, gateway=batch_gateway(jenkins_instance))
+
+    scm = Github(GITHUB_INFO['login']['user'], GITHUB_INFO['login']['password'])
+    pr_id = scm.search_pull_request_id(git_branch)
+    return BuildMonitor(commit_id, is_good, scm=scm, pr_id=pr_id, gateway=batch_gateway(jenkins_instance))
 
 
 def launch_jobs(jenkins_instance,
@@ -130,7 +246,9 @@ def launch_jobs(jenkins_instance,
                 git_branch,
                 lvl,
                 type_build,
-                test_env_path):
+                test_env_path,
+                superseded=None,
+                sparse=None):
 
     """Launch the jobs defined through the loktar.dependency graph
 
@@ -142,84 +260,586 @@ def launch_jobs(jenkins_instance,
         lvl: level being run
         type_build: 'test' or 'artifact'
         test_env_path: the location of the cloned test environment.
+        superseded (Optional[function]): tells when a newer run of the branch started, see ``build_monitor``.
+            Defaults to None.
+        sparse (Optional[dict of str: list]): the paths each artifact needs, see ``get_job_params``.
+            Defaults to None.
     """
-    launched_queues = []
-    for package in lvl:
-        launched_queues.append(launch_queue(jenkins_instance,
-                                            commit_id,
-                                            committer,
-                                            package,
-                                            git_branch,
-                                            type_build,
-                                            test_env_path))
+    # Get an instance of the queue
+    queue_instance = jenkins_instance.get_queue()
 
-    scm = Github(GITHUB_INFO['login']['user'], GITHUB_INFO['login']['password'])
-    pr_id = scm.search_pull_request_id(git_branch)
+    with build_monitor(jenkins_instance, commit_id, git_branch, superseded=superseded) as monitor:
+        try:
+            monitor.dispatch([(partial(launch_queue,
+                                       jenkins_instance,
+                                       commit_id,
+                                       committer,
+                                       package,
+                                       git_branch,
+                                       type_build,
+                                       test_env_path,
+                                       sparse=sparse), package) for package in lvl])
+        except CIJobFail:
+            monitor.stop(queue_instance)
+            raise
+
+        i = 1
+
+        # While there are queued items and running builds
+        while monitor.pending():
+            # We update running builds and queues, and check the stopped builds
+            _, failed_builds = monitor.poll()
+            check_stopping_conditions(monitor, queue_instance, git_branch, failed_builds)
+
+            log_progress(i, monitor)
+            i += 1
+
+            if monitor.pending():
+                monitor.wait()
+
+
+def build_units(component, types_build, dependencies):
+    """Find what each build has to wait for
+
+    A build unit is an artifact with a type of build. The first type of build of an artifact waits for the last type
+    of build of its requirements, the other types wait for the previous type of the same artifact, which gives the
+    same order as the levels without the barrier between them.
+
+    Args:
+        component: a list of loktar.dependency levels
+        types_build (list): types of build, in the order they run for an artifact
+        dependencies (list of tuple): edges of the dependency graph, from a requirement to the artifact requiring it
+
+    Returns:
+        dict of tuple: set: keys are the (artifact, type_build) units, values are the units they wait for
+    """
+    artifacts = {artifact for lvl in component for artifact in lvl}
+    requirements = {artifact: set() for artifact in artifacts}
+    for requirement, artifact in dependencies:
+        if requirement in artifacts and artifact in artifacts:
+            requirements[artifact].add(requirement)
+
+    units = {}
+    for artifact in artifacts:
+        units[(artifact, types_build[0])] = {(requirement, types_build[-1]) for requirement in requirements[artifact]}
+        for previous_type_build, type_build in zip(types_build, types_build[1:]):
+            units[(artifact, type_build)] = {(artifact, previous_type_build)}
+    return units
+
+
+def level_units(component, types_build):
+    """Find what each build has to wait for, level by level
+
+    Like ``launch_jobs`` run by ``job_manager``, each type of build of a level waits for all the builds of the
+    previous type, or of the previous level.
+
+    Args:
+        component: a list of loktar.dependency levels
+        types_build (list): types of build, in the order they run for a level
+
+    Returns:
+        dict of tuple: set: keys are the (artifact, type_build) units, values are the units they wait for
+    """
+    units = {}
+    previous_units = set()
+    for lvl in component:
+        for type_build in types_build:
+            lvl_units = {(package, type_build) for package in lvl}
+            for unit in lvl_units:
+                units[unit] = set(previous_units)
+            previous_units = lvl_units
+    return units
+
+
+def critical_path_priorities(units, durations, default_duration=None):
+    """Compute the length of the longest path from each build unit to the end of the builds
+
+    Launching first the units with the longest remaining path starts the critical chain first.
+
+    Args:
+        units (dict of tuple: set): build units and the units they wait for, see ``build_units``
+        durations (dict of tuple: float): estimated durations of the units, in seconds
+        default_duration (Optional[float]): duration of the units without estimation.
+            Defaults to LOKTAR_SCHEDULER_DEFAULT_DURATION.
+
+    Returns:
+        dict of tuple: float: the duration of the longest path starting with each unit, the unit included
+    """
+    default_duration = default_duration if default_duration is not None else SCHEDULER['default_duration']
+    next_units = {unit: [] for unit in units}
+    for unit, previous_units in units.iteritems():
+        for previous_unit in previous_units:
+            if previous_unit in next_units:
+                next_units[previous_unit].append(unit)
+
+    # Units are processed once all the units waiting for them are, starting from the last ones
+    remaining_next_units = {unit: len(unit_next_units) for unit, unit_next_units in next_units.iteritems()}
+    to_process = [unit for unit, nb_next_units in remaining_next_units.iteritems() if nb_next_units == 0]
+    priorities = {}
+    while to_process:
+        unit = to_process.pop()
+        priorities[unit] = durations.get(unit, default_duration) + max([priorities[next_unit]
+                                                                        for next_unit in next_units[unit]] or [0])
+        for previous_unit in units[unit]:
+            if previous_unit in remaining_next_units:
+                remaining_next_units[previous_unit] -= 1
+                if remaining_next_units[previous_unit] == 0:
+                    to_process.append(previous_unit)
+    return priorities
+
+
+class Speculation(object):
+    """Speculative builds of a run, see ``schedule_jobs``, and the executor time they saved or wasted
+
+    A test launched while the builds it waits for are still running saves the time between its launch and their
+    success, up to its own duration. Its time is wasted when it is stopped, or when it failed and is launched again.
+
+    Args:
+        clock (Optional[function]): current time in seconds. Defaults to ``time.time``.
+    """
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        # Launch times of the speculative builds not accepted yet
+        self.launched = {}
+        # Times the units before them succeeded, and durations of the succeeded speculative builds
+        self.ready_at = {}
+        self.succeeded = {}
+        self.accepted = []
+        self.discarded = []
+        # In seconds
+        self.saved = 0.
+        self.wasted = 0.
+
+    def candidates(self, waiting, in_flight, priorities=None):
+        """
+        Args:
+            waiting (dict of tuple: set): units not launched yet, and the units they still wait for
+            in_flight (list of tuple): (queued item or build, unit) of the launched builds
+            priorities (Optional[dict of tuple: float]): Defaults to None.
+
+        Returns:
+            list of tuple: the tests waiting only for launched builds, the highest priority first
+        """
+        priorities = priorities if priorities is not None else {}
+        launched = {unit for _, unit in in_flight if unit not in self.launched}
+        tests = [unit for unit, previous_units in waiting.iteritems()
+                 if unit[1] == 'test' and previous_units and previous_units <= launched]
+        return sorted((unit for unit in tests if unit not in self.launched and unit not in self.discarded),
+                      key=lambda unit: (-priorities.get(unit, 0), unit))
+
+    def launch(self, unit):
+        self.launched[unit] = self.clock()
+
+    def speculate(self, waiting, in_flight, priorities, trim):
+        """Launch the candidates which fit
+
+        Args:
+            waiting, in_flight, priorities: see ``candidates``
+            trim (function): keeps the units which fit in the slots and the capacity left, see ``trim_units``
+
+        Returns:
+            list of tuple: the units launched
+        """
+        units = trim(self.candidates(waiting, in_flight, priorities))
+        for unit in units:
+            self.launch(unit)
+            log.info('Launching {0} for {1} before the builds it waits for succeeded'.format(unit[1], unit[0]))
+        return units
+
+    def retry(self, failed_builds):
+        """Discard the speculative builds which failed
+
+        A speculative build may fail because of the builds it did not wait for, it is launched again once they
+        succeeded. Once they succeeded, its failure is a real one.
+
+        Args:
+            failed_builds (list of tuple): the builds which failed, as (build, unit)
+
+        Returns:
+            tuple of list: the speculative units to launch again, and the other failed builds
+        """
+        retried_units = []
+        for build, unit in failed_builds:
+            if unit not in self.launched:
+                continue
+            ready = unit in self.ready_at
+            self.discard(unit, build.get_duration().total_seconds())
+            if not ready:
+                log.info('{0} failed before the builds it waits for succeeded, it will be launched again'
+                         .format(build))
+                retried_units.append(unit)
+        return retried_units, [(build, unit) for build, unit in failed_builds if unit not in retried_units]
+
+    def ready(self, unit):
+        """The units a speculative unit waits for succeeded
+
+        Returns:
+            bool: True if its build succeeded too, it is accepted
+        """
+        self.ready_at.setdefault(unit, self.clock())
+        return self._accept(unit)
+
+    def succeed(self, unit, duration):
+        """The build of a speculative unit succeeded
+
+        Args:
+            unit (tuple): the unit
+            duration (float): duration of its build, in seconds
+
+        Returns:
+            bool: True if the units it waits for succeeded too, it is accepted
+        """
+        self.succeeded[unit] = duration
+        return self._accept(unit)
+
+    def discard(self, unit, duration=None):
+        """The build of a speculative unit failed or is stopped, its time is wasted
+
+        Args:
+            unit (tuple): the unit
+            duration (Optional[float]): duration of its build, in seconds. Defaults to the time since its launch.
+        """
+        launched = self.launched.pop(unit)
+        self.ready_at.pop(unit, None)
+        duration = self.succeeded.pop(unit, duration)
+        self.wasted += duration if duration is not None else self.clock() - launched
+        self.discarded.append(unit)
+
+    def accept_ready(self, waiting):
+        """
+        Args:
+            waiting (dict of tuple: set): units not launched yet, and the units they still wait for
+
+        Returns:
+            list of tuple: the speculative units which succeeded before the units they wait for, and are accepted now
+        """
+        return [unit for unit in list(self.launched) if not waiting[unit] and self.ready(unit)]
+
+    def stop(self):
+        """The run is stopped, the speculative builds not accepted yet are wasted"""
+        for unit in list(self.launched):
+            self.discard(unit)
+
+    def minutes(self):
+        """
+        Returns:
+            dict: the "saved" and the "wasted" executor-minutes
+        """
+        return {"saved": self.saved / 60, "wasted": self.wasted / 60}
+
+    def _accept(self, unit):
+        if unit not in self.ready_at or unit not in self.succeeded:
+            return False
+        self.saved += min(max(self.ready_at.pop(unit) - self.launched.pop(unit), 0), self.succeeded.pop(unit))
+        self.accepted.append(unit)
+        return True
+
+
+def schedule_jobs(jenkins_instance,
+                  commit_id,
+                  committer,
+                  git_branch,
+                  units,
+                  test_env_path,
+                  priorities=None,
+                  slots=None,
+                  durations_db=None,
+                  resources=None,
+                  capacity=None,
+                  speculation=None,
+                  superseded=None,
+                  sparse=None):
+    """Launch each build as soon as the builds it waits for succeeded
+
+    The builds are stopped, and CIJobFail raised, as soon as one of them fails or the pull request receives a new
+    commit, like in ``launch_jobs``.
+
+    Args:
+        jenkins_instance: instance of the jenkins class
+        commit_id: commit_id
+        committer: name of the person which committed
+        git_branch: git branch name to test / build
+        units (dict of tuple: set): build units and the units they wait for, see ``build_units``
+        test_env_path: the location of the cloned test environment.
+        priorities (Optional[dict of tuple: float]): the ready units with the highest priority are launched first,
+            see ``critical_path_priorities``. Defaults to None.
+        slots (Optional[int]): maximum number of builds queued or running at the same time. Defaults to None.
+        durations_db (Optional[loktar.db.BuildDurations]): where the durations of the succeeded builds are recorded.
+            Defaults to None.
+        resources (Optional[dict of str: dict]): resource requests of the packages, see
+            ``loktar.resources.package_request``. Defaults to None, the default request.
+        capacity (Optional[loktar.resources.Capacity]): capacity left to this run, the builds are packed onto it and
+            the ready units which do not fit wait for running ones to stop. Defaults to None, no limit.
+        speculation (Optional[Speculation]): the tests are also launched while the builds they wait for are
+            running, when slots are left, and their saved and wasted time is counted in it. Defaults to None.
+        superseded (Optional[function]): tells when a newer run of the branch started, see ``build_monitor``.
+            Defaults to None.
+        sparse (Optional[dict of str: list]): the paths each artifact needs, see ``get_job_params``.
+            Defaults to None.
+    """
+    priorities = priorities if priorities is not None else {}
+    resources = resources if resources is not None else {}
+    speculating = speculation.launched if speculation is not None else {}
+    waiting = {unit: set(previous_units) for unit, previous_units in units.iteritems()}
+    next_units = dependent_units(units)
 
     # Get an instance of the queue
     queue_instance = jenkins_instance.get_queue()
-    running_builds = []
 
     i = 1
 
-    # While there are queued items and running builds
-    while launched_queues + running_builds:
-        # We check for the first stopping condition, which is that the Pull request received a new commit
-        if pr_id is not None:
-            pr = scm.get_pull_request(pr_id)
-            commit_sha = pr.head.sha
-            if commit_id != commit_sha:
-                log.info('PR #{0} received a new commit! Stopping this build.'.format(pr_id))
-                stop_all_jobs(launched_queues, queue_instance, running_builds)
-                raise CIJobFail('New commit arrived: {0}'.format(commit_sha))
-
-        # We update running builds and queues
-        for queue_item in launched_queues:
-            try:
-                queue_item.poll()
-                build = queue_item.get_build()
-            except NotBuiltYet:
-                logger.info('Item not built yet')
-            except HTTPError:
-                log.info('HTTP Error when querying idem {0}'.format(queue_item))
-            else:
-                running_builds.append(build)
-                launched_queues.remove(queue_item)
-
-        # Check if the builds are running + it updates their status
-        running_builds, stopped_builds = split_on_condition(running_builds,
-                                                            lambda build: build.is_running())
-
-        if i % 20 == 0:
-            log.info('Launched: {0}'.format(launched_queues))
-            log.info('Running: {0}'.format(running_builds))
-            log.info('Stopped: {0}'.format(stopped_builds))
-        i += 1
-
-        # We check for the second stopping condition, which is that a build failed
-        failed_builds = filter(lambda build: not is_good(build), stopped_builds)
-        if failed_builds:
-            stop_all_jobs(launched_queues, queue_instance, running_builds)
-            raise CIJobFail('Some builds failed: {0}'.format(failed_builds))
-
-        # Sleep between 0.5 and 1s
-        time.sleep(0.5 + random.randint(0, 500) / 1000)
-
-
-def stop_all_jobs(launched_queues, queue_instance, running_builds):
-    """Stop all jobs in queue or in the build pipe
+    with build_monitor(jenkins_instance, commit_id, git_branch, superseded=superseded) as monitor:
+        try:
+            # While there are builds to launch, queued items and running builds
+            while waiting or monitor.pending():
+                launched_units = take_units(waiting, trim_units(ready_units(waiting, priorities, excluded=speculating),
+                                                                monitor, slots, capacity, resources))
+
+                if speculation is not None:
+                    launched_units += speculation.speculate(waiting, monitor.queued + monitor.running, priorities,
+                                                            partial(trim_units, monitor=monitor, slots=slots,
+                                                                    capacity=capacity, resources=resources,
+                                                                    launching=len(launched_units)))
+
+                dispatch_units(monitor, queue_instance, launched_units, jenkins_instance, commit_id, committer,
+                               git_branch, test_env_path, sparse=sparse)
+                if not monitor.pending():
+                    raise CIJobFail('Some builds wait for each other: {0}'.format(sorted(waiting)))
+
+                # We update running builds and queues, and check the stopped builds
+                stopped_builds, failed_builds = monitor.poll()
+                log_progress(i, monitor, waiting)
+                i += 1
+
+                if speculation is not None:
+                    retried_units, failed_builds = speculation.retry(failed_builds)
+                    release_units(capacity, resources, retried_units)
+
+                check_stopping_conditions(monitor, queue_instance, git_branch, failed_builds)
+
+                # The builds waiting for the succeeded ones may be ready
+                release_units(capacity, resources, [unit for _, unit in stopped_builds])
+                builds_succeeded(stopped_builds, waiting, next_units, speculation, durations_db, commit_id)
+
+                # Without new build to launch, there is nothing to do before the next poll
+                if not stopped_builds and monitor.pending():
+                    monitor.wait()
+        except CIJobFail:
+            if speculation is not None:
+                speculation.stop()
+            raise
+
+
+def dependent_units(units):
+    """
+    Args:
+        units (dict of tuple: set): build units and the units they wait for, see ``build_units``
+
+    Returns:
+        dict of tuple: list: the units waiting for each unit
+    """
+    next_units = {}
+    for unit, previous_units in units.iteritems():
+        for previous_unit in previous_units:
+            next_units.setdefault(previous_unit, []).append(unit)
+    return next_units
+
+
+def unit_priority_class(unit):
+    """
+    Args:
+        unit (tuple): the build unit
+
+    Returns:
+        str: "master" for the artifactmaster builds, "pull_request" for the other ones, see ``PRIORITY_CLASSES``
+    """
+    return "master" if unit[1] == "artifactmaster" else "pull_request"
+
+
+def ready_units(waiting, priorities, excluded=()):
+    """
+    Args:
+        waiting (dict of tuple: set): units not launched yet, and the units they still wait for
+        priorities (dict of tuple: float): see ``critical_path_priorities``
+        excluded (Optional[iterable of tuple]): units not to launch. Defaults to none.
+
+    Returns:
+        list of tuple: the units which do not wait for any other, by priority class (see ``PRIORITY_CLASSES``),
+        then the highest priority first
+    """
+    return sorted((unit for unit, previous_units in waiting.iteritems()
+                   if not previous_units and unit not in excluded),
+                  key=lambda unit: (PRIORITY_CLASSES.index(unit_priority_class(unit)), -priorities.get(unit, 0), unit))
+
+
+def trim_units(units, monitor, slots=None, capacity=None, resources=None, launching=0):
+    """Keep the units which fit in the free slots and in the capacity left
+
+    Args:
+        units (list of tuple): units ready to launch, by decreasing priority
+        monitor (loktar.monitor.BuildMonitor): follows the queued items and running builds
+        slots (Optional[int]): maximum number of builds queued or running at the same time. Defaults to None.
+        capacity (Optional[loktar.resources.Capacity]): the resources of the kept units are taken from it.
+            Defaults to None, no limit.
+        resources (Optional[dict of str: dict]): resource requests of the packages. Defaults to None.
+        launching (Optional[int]): number of builds about to be launched, not followed yet. Defaults to 0.
+
+    Returns:
+        list of tuple: the units to launch
+    """
+    if slots is not None:
+        units = units[:max(slots - len(monitor.queued) - len(monitor.running) - launching, 0)]
+    if capacity is not None:
+        units = capacity.pack(units, resources if resources is not None else {})
+    return units
+
+
+def release_units(capacity, resources, units):
+    """Give the resources of stopped units back to the capacity, see ``trim_units``"""
+    if capacity is not None:
+        for unit in units:
+            capacity.release(package_request(resources, unit[0]))
+
+
+def record_duration(durations_db, unit, duration, commit_id):
+    """Record the duration of a succeeded build
+
+    Args:
+        durations_db (loktar.db.BuildDurations): history of the build durations, nothing is recorded if None
+        unit (tuple): the unit built
+        duration (float): the duration of its build, in seconds
+        commit_id: commit_id
+    """
+    if durations_db is None:
+        return
+    try:
+        durations_db.record(unit[0], unit[1], duration, commit_id=commit_id)
+    except Exception as e:
+        # The history only orders the builds, it must not fail them
+        log.warning('Cannot record the duration of {0}: {1}'.format(unit, str(e)))
+
+
+def take_units(waiting, units):
+    """Remove the units about to be launched from the waiting ones
+
+    Args:
+        waiting (dict of tuple: set): units not launched yet, and the units they still wait for
+        units (list of tuple): the units to launch
+
+    Returns:
+        list of tuple: the units
+    """
+    for unit in units:
+        del waiting[unit]
+        log.info('Launching {0} for {1}'.format(unit[1], unit[0]))
+    return units
+
+
+def builds_succeeded(stopped_builds, waiting, next_units, speculation=None, durations_db=None, commit_id=None):
+    """Release the units waiting for the builds which succeeded
+
+    Args:
+        stopped_builds (list of tuple): the builds which succeeded, as (build, unit)
+        waiting (dict of tuple: set): units not launched yet, and the units they still wait for
+        next_units (dict of tuple: list): see ``dependent_units``
+        speculation (Optional[Speculation]): a speculative build counts once the builds it waits for succeeded
+            too. Defaults to None.
+        durations_db (Optional[loktar.db.BuildDurations]): where the durations are recorded. Defaults to None.
+        commit_id (Optional[str]): the commit built. Defaults to None.
+    """
+    for build, unit in stopped_builds:
+        record_duration(durations_db, unit, build.get_duration().total_seconds(), commit_id)
+        speculative = speculation is not None and unit in speculation.launched
+        if not speculative or speculation.succeed(unit, build.get_duration().total_seconds()):
+            unit_succeeded(waiting, next_units, unit)
+
+    if speculation is not None:
+        for unit in speculation.accept_ready(waiting):
+            unit_succeeded(waiting, next_units, unit)
+
+
+def unit_succeeded(waiting, next_units, unit):
+    """The units waiting for a unit which succeeded stop waiting for it
 
     Args:
-        launched_queues (list): list of queue items
-        queue_instance (instance of jenkins.queues.Queue): instance of a Queue
-        running_builds (list): list of running builds
+        waiting (dict of tuple: set): units not launched yet, and the units they still wait for
+        next_units (dict of tuple: list): see ``dependent_units``
+        unit (tuple): the unit which succeeded
     """
-    # We delete queued jobs
-    for queue_item in launched_queues:
-        queue_instance.delete_item(queue_item)
-    # And we stop running builds
-    for build in running_builds:
-        build.stop()
+    waiting.pop(unit, None)
+    for next_unit in next_units.get(unit, []):
+        waiting[next_unit].discard(unit)
+
+
+def dispatch_units(monitor, queue_instance, units, jenkins_instance, commit_id, committer, git_branch,
+                   test_env_path, sparse=None):
+    """Launch the builds of units, they are all stopped if one of them cannot be launched
+
+    Args:
+        monitor (loktar.monitor.BuildMonitor): follows the launched builds
+        queue_instance: instance of the Jenkins queue
+        units (list of tuple): the units to launch
+        jenkins_instance, commit_id, committer, git_branch, test_env_path, sparse: see ``launch_queue``
+    """
+    try:
+        monitor.dispatch([(partial(launch_queue,
+                                   jenkins_instance,
+                                   commit_id,
+                                   committer,
+                                   package,
+                                   git_branch,
+                                   type_build,
+                                   test_env_path,
+                                   sparse=sparse), (package, type_build))
+                          for package, type_build in units])
+    except CIJobFail:
+        monitor.stop(queue_instance)
+        raise
+
+
+def check_stopping_conditions(monitor, queue_instance, git_branch, failed_builds):
+    """Stop all the builds when the branch received a new commit, or when a build failed
+
+    Args:
+        monitor (loktar.monitor.BuildMonitor): follows the builds
+        queue_instance: instance of the Jenkins queue
+        git_branch: git branch name to test / build
+        failed_builds (list of tuple): the builds which failed since the previous poll, as (build, unit)
+
+    Raises:
+        CIJobFail: the builds are stopped
+    """
+    # We check for the first stopping condition, which is that the branch received a new commit
+    if monitor.new_commit is not None:
+        log.info('{0} received a new commit! Stopping this build.'.format(git_branch))
+        monitor.stop(queue_instance)
+        raise CIJobFail('New commit arrived: {0}'.format(monitor.new_commit))
+
+    # We check for the second stopping condition, which is that a build failed
+    if failed_builds:
+        monitor.stop(queue_instance)
+        raise CIJobFail('Some builds failed: {0}'.format([build for build, _ in failed_builds]))
+
+
+def log_progress(i, monitor, waiting=None):
+    """Log the launched, running and waiting units every 20 polls"""
+    if i % 20 == 0:
+        log.info('Launched: {0}'.format([unit for _, unit in monitor.queued]))
+        log.info('Running: {0}'.format([unit for _, unit in monitor.running]))
+        if waiting is not None:
+            log.info('Waiting: {0}'.format(sorted(waiting)))
+
+
+def batch_gateway(jenkins_instance):
+    """
+    Args:
+        jenkins_instance: instance of the jenkins class
+
+    Returns:
+        loktar.gateway.JenkinsGateway: the instance if it can batch the polls of the builds, None otherwise
+    """
+    return jenkins_instance if isinstance(jenkins_instance, JenkinsGateway) else None
 
 
 def launch_queue(jenkins_instance,
@@ -228,9 +848,14 @@ def launch_queue(jenkins_instance,
                  package,
                  git_branch,
                  type_build,
-                 test_env_path):
+                 test_env_path,
+                 sparse=None):
     """Launch a CI queue
 
+    Args:
+        jenkins_instance: instance of the jenkins class
+        commit_id, committer, package, git_branch, type_build, test_env_path, sparse: see ``get_job_params``
+
     Returns:
         jenkinsapi.queue.QueueItem: QueueItem instance
     """
@@ -244,7 +869,8 @@ def launch_queue(jenkins_instance,
                                 package,
                                 git_branch,
                                 type_build,
-                                test_env_path)
+                                test_env_path,
+                                sparse=sparse)
     # Get a Queue instance which represents the new job build in the queue
     q = job.invoke(build_params=job_params)
     return q
@@ -255,7 +881,8 @@ def get_job_params(commit_id,
                    package,
                    git_branch,
                    type_build,
-                   test_env_path):
+                   test_env_path,
+                   sparse=None):
     """Build the parameters to send to Jenkins jobs
 
     Args:
@@ -265,9 +892,19 @@ def get_job_params(commit_id,
         git_branch:
         type_build:
         test_env_path:
+        sparse (Optional[dict of str: list]): the paths each artifact needs, as given to
+            ``loktar.environment.prepare_test_env``. The jobs of these artifacts receive the archive of their paths,
+            see ``loktar.environment.artifact_archive``, when ``test_env_path`` is the archive returned by
+            ``prepare_test_env``. Defaults to None.
 
     Returns:
     """
+    if sparse is not None and package in sparse:
+        try:
+            test_env_path = artifact_archive(test_env_path, package)
+        except ValueError:
+            log.warning('{0} is not an archive of the test environment, {1} receives all of it'
+                        .format(test_env_path, package))
     composition_parameters = ('{0}:@:{1}'
                               .format(package,
                                       serialize(build_params_to_context(package, type_build)
@@ -0,0 +1,59 @@
+import importlib
+
+
+class LazyModule(object):
+    """Module imported on the first access to one of its attributes
+
+    Heavy third party modules are bound at the top of the loktar modules through this proxy, so importing loktar
+    stays cheap and they are loaded only by the features using them. Attributes can be set and deleted through the
+    proxy, which keeps ``mock.patch("loktar.<module>.<lazy module>.<attribute>")`` working.
+
+    Args:
+        name (str): Name of the module
+        setup (Optional[function]): Called with the module once it is imported. Defaults to None.
+    """
+
+    def __init__(self, name, setup=None):
+        self.__dict__["_name"] = name
+        self.__dict__["_setup"] = setup
+        self.__dict__["_module"] = None
+
+    def _load(self):
+        if self._module is None:
+            module = importlib.import_module(self._name)
+            if self._setup is not None:
+                self._setup(module)
+            self.__dict__["_module"] = module
+        return self._module
+
+    def __getattr__(self, attribute):
+        return getattr(self._load(), attribute)
+
+    def __setattr__(self, attribute, value):
+        setattr(self._load(), attribute, value)
+
+    def __delattr__(self, attribute):
+        delattr(self._load(), attribute)
+
+    def __repr__(self):
+        return "<lazy module '{}'{}>".format(self._name, "" if self._module is None else " (loaded)")
+
+
+def lazy_attribute(module, name):
+    """Callable standing for a function or a class of a module, the module is imported on the first call
+
+    Args:
+        module (str or LazyModule): the module or its name
+        name (str): name of the function or the class in the module
+
+    Returns:
+        function: calls the attribute with the given arguments
+    """
+    if not isinstance(module, LazyModule):
+        module = LazyModule(module)
+
+    def call(*args, **kwargs):
+        return getattr(module, name)(*args, **kwargs)
+
+    call.__name__ = name
+    return call
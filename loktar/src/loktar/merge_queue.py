@@ -0,0 +1,264 @@
+from loktar.cmd import exe
+from loktar.cmd import lcd
+from loktar.cmd import local
+from loktar.constants import MERGE_QUEUE
+from loktar.dependency import ArtifactPathIndex
+from loktar.dependency import dependency_graph_from_modified_artifacts
+from loktar.dependency import gen_dependencies_level
+from loktar.exceptions import CIJobFail
+from loktar.exceptions import PrepareEnvFail
+from loktar.job import job_manager
+from loktar.log import Log
+from loktar.notifications import define_job_status_on_github_commit
+
+log = Log()
+
+
+def mergeable_pull_requests(scm, max_batch=None):
+    """The pull requests the merge queue takes, the oldest first
+
+    Args:
+        scm (loktar.scm.Github): the repository
+        max_batch (Optional[int]): maximum number of pull requests. Defaults to None, all of them.
+
+    Returns:
+        list of github.PullRequest.PullRequest: the open and mergeable pull requests
+    """
+    pull_requests = sorted((pull_request for pull_request in scm.get_pull_requests(state="open")
+                            if pull_request.mergeable),
+                           key=lambda pull_request: pull_request.created_at)
+    return pull_requests[:max_batch]
+
+
+def merge_branches(workspace, branches, batch_branch=None):
+    """Merge branches on top of master, in a branch pushed for the builds of a batch
+
+    Args:
+        workspace (str): a clone of the repository
+        branches (list of str): the branches, merged in this order
+        batch_branch (Optional[str]): default value is LOKTAR_MERGE_QUEUE_BRANCH
+
+    Raises:
+        PrepareEnvFail: the batch branch cannot be built from the branches or pushed, its builds would test a stale
+            batch
+
+    Returns:
+        list of str: the merged branches, the ones in conflict with the previous ones are left out
+    """
+    batch_branch = batch_branch if batch_branch is not None else MERGE_QUEUE["branch"]
+    merged = []
+    with lcd(workspace):
+        if not exe("git fetch origin", remote=False):
+            raise PrepareEnvFail("Can't fetch the branches of the batch")
+        if not exe("git checkout -B {0} origin/master".format(batch_branch), remote=False):
+            raise PrepareEnvFail("Can't create the branch {0} from master".format(batch_branch))
+        for branch in branches:
+            if exe("git merge --no-edit origin/{0}".format(branch), remote=False):
+                merged.append(branch)
+                continue
+            log.warning('{0} conflicts with the other branches of the batch, it is left out'.format(branch))
+            if not exe("git merge --abort", remote=False):
+                raise PrepareEnvFail("Can't abort the merge of {0}".format(branch))
+        if not exe("git push --force origin {0}".format(batch_branch), remote=False):
+            raise PrepareEnvFail("Can't push the branch {0}".format(batch_branch))
+    return merged
+
+
+def batch_graph(scm, repo_path, artifacts, pull_requests, path_index=None, **kwargs):
+    """Single dependency graph of the artifacts modified by the pull requests of a batch
+
+    An artifact depending on artifacts modified by several pull requests is built once for all of them.
+
+    Args:
+        scm (loktar.scm.Github): the repository
+        repo_path (str): where the batch branch is checked out
+        artifacts (dict): all artifacts. Keys are artifacts names, values are directly taken from config.json
+        pull_requests (list of github.PullRequest.PullRequest): the pull requests of the batch
+        path_index (Optional[loktar.dependency.ArtifactPathIndex]): classifies the modified files. Defaults to
+            None, built from the artifacts.
+        **kwargs: see ``loktar.dependency.dependency_graph_from_modified_artifacts``
+
+    Returns:
+        networkx.classes.digraph.DiGraph: The dependency graph.
+    """
+    path_index = path_index if path_index is not None else ArtifactPathIndex(artifacts)
+    modified_artifacts = set()
+    for pull_request in pull_requests:
+        modified = path_index.artifacts_from_paths(scm.get_modified_files_from_pull_request(pull_request.number))
+        log.info('Merge queue: PR #{0} modifies {1}'.format(pull_request.number, sorted(modified)))
+        modified_artifacts |= modified
+    return dependency_graph_from_modified_artifacts(repo_path, artifacts, modified_artifacts, **kwargs)
+
+
+class BatchBuild(object):
+    """Build of a batch of pull requests, as called by ``MergeQueue``
+
+    The branches of the pull requests are merged together (see ``merge_branches``), then the artifacts they modify
+    are built from the batch branch with a single dependency graph (see ``batch_graph``), each component by
+    ``loktar.job.job_manager``.
+
+    Args:
+        scm (loktar.scm.Github): the repository
+        workspace (str): a clone of the repository, the batch branch is built in it
+        artifacts (dict): all artifacts. Keys are artifacts names, values are directly taken from config.json
+        ci_config (dict): part of the config.json file under the ``'jenkins'`` key
+        committer (Optional[str]): the committer given to the builds. Defaults to "merge-queue".
+        batch_branch (Optional[str]): default value is LOKTAR_MERGE_QUEUE_BRANCH
+        **kwargs: other arguments of ``loktar.job.job_manager``, like the executor
+    """
+
+    def __init__(self, scm, workspace, artifacts, ci_config, committer="merge-queue", batch_branch=None, **kwargs):
+        self.scm = scm
+        self.workspace = workspace
+        self.artifacts = artifacts
+        self.ci_config = ci_config
+        self.committer = committer
+        self.batch_branch = batch_branch if batch_branch is not None else MERGE_QUEUE["branch"]
+        self.job_kwargs = kwargs
+        self.path_index = ArtifactPathIndex(artifacts)
+
+    def __call__(self, batch):
+        """Build a batch
+
+        Args:
+            batch (list of github.PullRequest.PullRequest): the pull requests, merged in this order
+
+        Raises:
+            CIJobFail: a build failed, or the dependency graph of the batch has a cycle
+            PrepareEnvFail: the batch branch cannot be built
+
+        Returns:
+            list of github.PullRequest.PullRequest: the merged pull requests, the ones in conflict are left out
+        """
+        merged_branches = merge_branches(self.workspace, [pull_request.head.ref for pull_request in batch],
+                                         batch_branch=self.batch_branch)
+        merged = [pull_request for pull_request in batch if pull_request.head.ref in merged_branches]
+        if not merged:
+            return merged
+
+        dep_graph = batch_graph(self.scm, self.workspace, self.artifacts, merged, path_index=self.path_index)
+        no_problem, dep_lvl, _ = gen_dependencies_level(dep_graph)
+        if not no_problem:
+            raise CIJobFail('The dependency graph of {0} has a cycle'.format(merged_branches))
+        with lcd(self.workspace):
+            commit_id = local("git rev-parse HEAD", capture=True)
+
+        for component_id, component in enumerate(dep_lvl):
+            job_manager(self.ci_config,
+                        component,
+                        component_id,
+                        self.batch_branch,
+                        commit_id,
+                        self.committer,
+                        self.workspace,
+                        dependencies=dep_graph.edges(),
+                        **self.job_kwargs)
+        return merged
+
+
+def run_merge_queue(scm, build, max_batch=None):
+    """Test the mergeable pull requests by batches, and set the merge queue status of their heads
+
+    Args:
+        scm (loktar.scm.Github): the repository
+        build (function): builds a batch, like ``BatchBuild``
+        max_batch (Optional[int]): maximum number of pull requests built together,
+            default value is LOKTAR_MERGE_QUEUE_MAX_BATCH
+
+    Returns:
+        tuple of list: the pull requests which passed, and the culprits, see ``MergeQueue.run``
+    """
+    passed, culprits = MergeQueue(build, max_batch=max_batch).run(mergeable_pull_requests(scm))
+    for pull_request in passed:
+        define_job_status_on_github_commit(pull_request.head.sha, "success", "", context="Merge Queue",
+                                           description="Passed with the other pull requests of its batch")
+    for pull_request in culprits:
+        define_job_status_on_github_commit(pull_request.head.sha, "failure", "", context="Merge Queue",
+                                           description="Breaks the build or conflicts with other pull requests")
+    return passed, culprits
+
+
+class MergeQueue(object):
+    """Test several pull requests with a single build, and find the culprits when it fails
+
+    A failed batch is split in two halves, built one after the other, until each culprit is alone. When the first
+    half passes, the second one holds the culprit and is split without being built first, so a single culprit among
+    N pull requests is found in at most 1 + 2 * log2(N) builds, while the batch costs a single build when it passes.
+    A pull request is only a culprit once it failed alone: when it passes, the failure came from a flaky build or
+    from its combination with the rest of the batch, and it is not blamed.
+
+    The pull requests a build leaves out of its batch, because they conflict with the other ones, are culprits too.
+
+    Args:
+        build (function): builds a batch, called with its list of pull requests. It returns the pull requests it
+            merged, like ``merge_branches``, or None when it merged all of them. It raises CIJobFail when a build
+            fails, like ``loktar.job.job_manager``.
+        max_batch (Optional[int]): maximum number of pull requests built together,
+            default value is LOKTAR_MERGE_QUEUE_MAX_BATCH
+    """
+
+    def __init__(self, build, max_batch=None):
+        self.build = build
+        self.max_batch = max_batch if max_batch is not None else MERGE_QUEUE["max_batch"]
+        if self.max_batch < 1:
+            raise ValueError("max_batch must be positive, actual value: {0}".format(self.max_batch))
+        # Number of builds run
+        self.builds = 0
+
+    def run(self, pull_requests):
+        """Test pull requests by batches
+
+        Args:
+            pull_requests (list): the pull requests, in merge order
+
+        Returns:
+            tuple of list: the pull requests which passed, and the culprits
+        """
+        passed, culprits = [], []
+        for start in range(0, len(pull_requests), self.max_batch):
+            self._bisect(pull_requests[start:start + self.max_batch], passed, culprits)
+        log.info('Merge queue: {0} passed, {1} failed in {2} builds'.format(len(passed), len(culprits),
+                                                                            self.builds))
+        return passed, culprits
+
+    def test(self, batch):
+        """
+        Returns:
+            tuple: True if the build of the batch succeeded, and the pull requests it merged. All of them are
+            considered merged when the build failed.
+        """
+        self.builds += 1
+        log.info('Merge queue: building {0}'.format(batch))
+        try:
+            merged = self.build(batch)
+        except CIJobFail as e:
+            log.info('Merge queue: {0} failed: {1}'.format(batch, str(e)))
+            return False, batch
+        return True, batch if merged is None else [pull_request for pull_request in batch if pull_request in merged]
+
+    def _bisect(self, batch, passed, culprits, failed=False):
+        """
+        Returns:
+            bool: True if a build failed because of a pull request of the batch
+        """
+        # A pull request is built alone before being blamed, even when the failure of its batch points to it
+        if not failed or len(batch) == 1:
+            succeeded, merged = self.test(batch)
+            conflicts = [pull_request for pull_request in batch if pull_request not in merged]
+            if conflicts:
+                log.info('Merge queue: {0} conflict with the other pull requests'.format(conflicts))
+                culprits.extend(conflicts)
+            if succeeded:
+                if failed:
+                    log.warning('Merge queue: {0} passes alone, its batch failed because of a flaky build or of '
+                                'their combination'.format(batch))
+                passed.extend(merged)
+                return False
+        if len(batch) == 1:
+            culprits.extend(batch)
+            return True
+
+        middle = len(batch) // 2
+        first_half_failed = self._bisect(batch[:middle], passed, culprits)
+        # Without culprit in the first half, the failure comes from the second one
+        return self._bisect(batch[middle:], passed, culprits, failed=not first_half_failed) or first_half_failed
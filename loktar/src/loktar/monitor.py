@@ -0,0 +1,347 @@
+from functools import partial
+import Queue
+import threading
+import time
+
+from loktar.constants import BUILD_MONITOR
+from loktar.exceptions import CIJobFail
+from loktar.gateway import GatewayBuild
+from loktar.lazy import LazyModule
+from loktar.log import Log
+
+log = Log()
+
+jenkinsapi_exceptions = LazyModule("jenkinsapi.custom_exceptions")
+requests = LazyModule("requests")
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCESS = "success"
+FAILURE = "failure"
+# A build followed through the gateway but missing from the builds it read, it is polled on its own
+REFRESH = "refresh"
+
+
+def _timed(function):
+    start = time.time()
+    return function(), time.time() - start
+
+
+class Workers(object):
+    """Pool of threads running the polls, the launches and the cancellations of the builds
+
+    ``multiprocessing.pool.ThreadPool`` keeps a thread looping on ``time.sleep`` to maintain its workers, these threads
+    only block on their queue.
+
+    Args:
+        size (int): number of threads
+    """
+
+    def __init__(self, size):
+        self._tasks = Queue.Queue()
+        self._threads = [threading.Thread(target=self._work, name="loktar-monitor-{0}".format(i))
+                         for i in xrange(size)]
+        for thread in self._threads:
+            thread.daemon = True
+            thread.start()
+
+    def run(self, tasks):
+        """Run functions without argument at the same time
+
+        Args:
+            tasks (list of function): the functions
+
+        Raises:
+            Exception: the first exception raised by a function, once all of them returned
+
+        Returns:
+            list: what the functions returned, in order
+        """
+        outcomes = self.settle(tasks)
+        errors = [error for _, error in outcomes if error is not None]
+        if errors:
+            raise errors[0]
+        return [result for result, _ in outcomes]
+
+    def settle(self, tasks):
+        """Run functions without argument at the same time, whatever they raise
+
+        Args:
+            tasks (list of function): the functions
+
+        Returns:
+            list of tuple: (what the function returned, None) or (None, what it raised), in order
+        """
+        outcomes = [None] * len(tasks)
+        done = Queue.Queue()
+        for index, task in enumerate(tasks):
+            self._tasks.put((task, index, outcomes, done))
+        for _ in tasks:
+            done.get()
+        return outcomes
+
+    def close(self):
+        for _ in self._threads:
+            self._tasks.put(None)
+        for thread in self._threads:
+            thread.join()
+
+    def _work(self):
+        for task, index, outcomes, done in iter(self._tasks.get, None):
+            try:
+                outcomes[index] = (task(), None)
+            except Exception as e:
+                outcomes[index] = (None, e)
+            done.put(index)
+
+
+class BuildMonitor(object):
+    """Follow queued items and builds until they stop, all of them polled at the same time
+
+    Each ``poll`` sends the requests for every queued item and every build at once, through a pool of threads, and
+    checks the result of the stopped builds in the same go, so a failure is known after the slowest request instead
+    of the sum of them. With a gateway, the queued items and the builds are read from the recent builds of their
+    jobs instead, and only the stopped builds are checked one by one. The interval between two polls starts short and
+    grows while nothing changes. Between the polls, the head of the pull request, or the record of the active runs,
+    is watched by its own thread, which cuts the wait short as soon as a new commit arrives.
+
+    Args:
+        commit_id (str): the commit built
+        check_build (function): tells if a stopped build succeeded, like ``loktar.job.is_good``
+        scm (Optional[loktar.scm.Github]): where the pull request is watched. Defaults to None, no watch.
+        pr_id (Optional[int]): the pull request of the commit. Defaults to None, no watch.
+        workers (Optional[int]): size of the pool of threads, default value is LOKTAR_BUILD_MONITOR_WORKERS
+        min_interval (Optional[float]): shortest interval between two polls, in seconds,
+            default value is LOKTAR_BUILD_MONITOR_MIN_INTERVAL
+        max_interval (Optional[float]): longest interval between two polls, in seconds,
+            default value is LOKTAR_BUILD_MONITOR_MAX_INTERVAL
+        commit_interval (Optional[float]): interval between two checks of the pull request, in seconds,
+            default value is LOKTAR_BUILD_MONITOR_COMMIT_INTERVAL
+        gateway (Optional[loktar.gateway.JenkinsGateway]): batches the polls. Defaults to None.
+        superseded (Optional[function]): returns the commit of the run which superseded this one, None while there
+            is none, like ``loktar.db.ActiveRuns.superseding``. It is watched instead of the pull request.
+            Defaults to None.
+    """
+
+    def __init__(self, commit_id, check_build, scm=None, pr_id=None, workers=None, min_interval=None,
+                 max_interval=None, commit_interval=None, gateway=None, superseded=None):
+        self.commit_id = commit_id
+        self.check_build = check_build
+        self.gateway = gateway
+        self.scm = scm
+        self.pr_id = pr_id
+        self.superseded = superseded
+        self.min_interval = min_interval if min_interval is not None else BUILD_MONITOR["min_interval"]
+        self.max_interval = max_interval if max_interval is not None else BUILD_MONITOR["max_interval"]
+        self.commit_interval = commit_interval if commit_interval is not None else BUILD_MONITOR["commit_interval"]
+        self.interval = self.min_interval
+        self.new_commit = None
+        # Lists of (queue item or build, unit)
+        self.queued = []
+        self.running = []
+        self.dispatch_latencies = {}
+        self._workers = Workers(workers if workers is not None else BUILD_MONITOR["workers"])
+        self._changed = threading.Event()
+        self._closed = threading.Event()
+        self._watcher = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Stop the watch of the pull request and the pool of threads"""
+        self._closed.set()
+        self._workers.close()
+
+    def add(self, queue_item, unit):
+        """Follow a launched item
+
+        Args:
+            queue_item (jenkinsapi.queue.QueueItem): the item returned by ``loktar.job.launch_queue``
+            unit: anything identifying the build, given back with it
+        """
+        self.queued.append((queue_item, unit))
+
+    def dispatch(self, launches):
+        """Launch builds at the same time and follow them
+
+        Args:
+            launches (list of tuple): (function launching a build and returning its queue item, unit). The functions
+                are started in order.
+
+        Raises:
+            CIJobFail: some builds could not be launched, the other ones are followed
+
+        Returns:
+            dict: the time taken to launch each build, in seconds, keyed by unit
+        """
+        start = time.time()
+        outcomes = self._workers.settle([partial(_timed, launch) for launch, _ in launches])
+
+        latencies, failed = {}, []
+        for (_, unit), (result, error) in zip(launches, outcomes):
+            if error is not None:
+                log.error('Cannot launch {0}: {1}'.format(unit, str(error)))
+                failed.append(unit)
+                continue
+            queue_item, latencies[unit] = result
+            self.queued.append((queue_item, unit))
+            log.info('{0} launched in {1:.2f}s'.format(unit, latencies[unit]))
+
+        if latencies:
+            log.info('{0} builds launched in {1:.2f}s, the slowest in {2:.2f}s'
+                     .format(len(latencies), time.time() - start, max(latencies.values())))
+        self.dispatch_latencies.update(latencies)
+        if failed:
+            raise CIJobFail('Cannot launch {0}'.format(failed))
+        return latencies
+
+    def pending(self):
+        """
+        Returns:
+            bool: True while some items are queued or some builds are running
+        """
+        return bool(self.queued or self.running)
+
+    def poll(self):
+        """Poll all the queued items and running builds at once
+
+        The head of the pull request, or the active run, is checked before the first poll, which stops there if it
+        moved. The watch then goes on in its own thread, see ``wait``.
+
+        Returns:
+            tuple of list: the builds which succeeded and the builds which failed since the previous poll,
+            as (build, unit)
+        """
+        if self._watcher is None and self._watched():
+            self._check_head()
+            if self.new_commit is not None:
+                return [], []
+
+        queued, running, succeeded, failed = [], [], [], []
+        if self.gateway is not None:
+            items = self._batched_items(queued)
+        else:
+            items = [(item, unit, state) for state, items in ((QUEUED, self.queued), (RUNNING, self.running))
+                     for item, unit in items]
+        results = self._workers.run([partial(self._follow, item, state) for item, _, state in items])
+
+        for (_, unit, _), (state, item) in zip(items, results):
+            {QUEUED: queued, RUNNING: running, SUCCESS: succeeded, FAILURE: failed}[state].append((item, unit))
+
+        changed = len(queued) != len(self.queued) or succeeded or failed
+        self.interval = self.min_interval if changed else min(self.interval * 2, self.max_interval)
+        self.queued, self.running = queued, running
+        return succeeded, failed
+
+    def wait(self):
+        """Wait before the next poll, or until a new commit arrives on the pull request"""
+        if self._watcher is None and self._watched():
+            self._watcher = threading.Thread(target=self._watch, name="loktar-commit-watcher")
+            self._watcher.daemon = True
+            self._watcher.start()
+        self._changed.wait(self.interval)
+        self._changed.clear()
+
+    def stop(self, queue_instance):
+        """Delete the queued items and stop the running builds, all at once
+
+        An item which cannot be stopped does not keep the other ones from being stopped.
+
+        Args:
+            queue_instance (jenkinsapi.queue.Queue): the queue of the items
+        """
+        stopped = self.queued + self.running
+        deletions = [partial(queue_instance.delete_item, queue_item) for queue_item, _ in self.queued]
+        outcomes = self._workers.settle(deletions + [build.stop for build, _ in self.running])
+        for (item, _), (_, error) in zip(stopped, outcomes):
+            if error is not None:
+                # The other ones are stopped anyway
+                log.warning('Cannot stop {0}: {1}'.format(item, str(error)))
+        self.queued, self.running = [], []
+
+    def _batched_items(self, queued):
+        """Refresh the followed items from the recent builds of their jobs, read by the gateway
+
+        Args:
+            queued (list): where the items still in the queue are added, as (queue item, unit)
+
+        Returns:
+            list of tuple: (item, unit, state) of the items to follow in the pool of threads. The queued items found
+            among the builds are replaced by their builds.
+        """
+        job_names = [queue_item.name for queue_item, _ in self.queued]
+        job_names.extend(build.job_name for build, _ in self.running)
+        builds = self.gateway.builds(job_names, workers=self._workers)
+        items = []
+        for queue_item, unit in self.queued:
+            job_builds = builds.get(queue_item.name, {})
+            if queue_item.queue_id in job_builds:
+                items.append((GatewayBuild(self.gateway, queue_item.name, job_builds[queue_item.queue_id]), unit,
+                              RUNNING))
+            elif not job_builds or min(job_builds) > queue_item.queue_id:
+                # Out of the window of recent builds, cancelled, or of a job without builds to compare it with: the
+                # item is polled on its own
+                items.append((queue_item, unit, QUEUED))
+            else:
+                queued.append((queue_item, unit))
+        for build, unit in self.running:
+            job_builds = builds.get(build.job_name, {})
+            if build.queue_id in job_builds:
+                build.update(job_builds[build.queue_id])
+                items.append((build, unit, RUNNING))
+            else:
+                # Out of the window of recent builds, or its job could not be read
+                items.append((build, unit, REFRESH))
+        return items
+
+    def _follow(self, item, state):
+        if state == QUEUED:
+            try:
+                item.poll()
+                build = item.get_build()
+            except jenkinsapi_exceptions.NotBuiltYet:
+                return QUEUED, item
+            except requests.HTTPError:
+                log.info('HTTP Error when querying item {0}'.format(item))
+                return QUEUED, item
+            # The next polls read the build through the gateway, like the ones found among the recent builds
+            item = build if self.gateway is None else GatewayBuild(self.gateway, item.name, build._data)
+        elif state == REFRESH:
+            item.poll()
+        if item.is_running():
+            return RUNNING, item
+        return (SUCCESS if self.check_build(item) else FAILURE), item
+
+    def _watched(self):
+        return self.superseded is not None or self.pr_id is not None
+
+    def _check_head(self):
+        if self.superseded is None:
+            self._new_head(self._head_sha())
+            return
+        commit_sha = self.superseded()
+        if commit_sha is not None:
+            log.info('A newer run superseded this one, for the commit {0}'.format(commit_sha))
+            self.new_commit = commit_sha
+            self._changed.set()
+
+    def _head_sha(self):
+        return self.scm.get_pull_request(self.pr_id).head.sha
+
+    def _new_head(self, commit_sha):
+        if commit_sha != self.commit_id:
+            log.info('PR #{0} received a new commit: {1}'.format(self.pr_id, commit_sha))
+            self.new_commit = commit_sha
+            self._changed.set()
+
+    def _watch(self):
+        while self.new_commit is None and not self._closed.wait(self.commit_interval):
+            try:
+                self._check_head()
+            except Exception as e:
+                # The builds are still followed, the next check may work
+                log.warning('Cannot check for a newer commit: {0}'.format(str(e)))
@@ -1,14 +1,15 @@
-from github import Github
-from slacker import Error
-from slacker import Slacker
-
 from loktar.decorators import retry
 from loktar.constants import GITHUB_INFO
 from loktar.constants import SLACK
 from loktar.exceptions import NotificationError
+from loktar.lazy import lazy_attribute
+from loktar.lazy import LazyModule
 from loktar.log import Log
 
 logger = Log()
+slacker = LazyModule("slacker")
+Github = lazy_attribute("github", "Github")
+Slacker = lazy_attribute(slacker, "Slacker")
 
 
 @retry
@@ -114,7 +115,7 @@ def send_message_to_slack(message, **kwargs):
         )
 
         assert response.successful is True
-    except Error as e:
+    except slacker.Error as e:
         logger.error("Error for sending message to slack because : {0}".format(str(e)))
         raise NotificationError(str(e))
     except AssertionError:
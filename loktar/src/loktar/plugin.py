@@ -1,10 +1,10 @@
-from fabric.api import cd
-from fabric.api import lcd
-from fabric.api import settings
 import importlib
 import sys
 
+from loktar.cmd import cd
 from loktar.cmd import exe
+from loktar.cmd import lcd
+from loktar.cmd import settings
 from loktar.constants import PLUGINS_INFO
 from loktar.constants import ROOT_PATH
 from loktar.decorators import retry
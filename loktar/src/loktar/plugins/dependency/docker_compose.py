@@ -1,6 +1,7 @@
 import os
 import yaml
 
+FILES = ["*docker-compose*"]
 
 def docker_compose_deps(basepath):
     """Get docker image dependencies.
@@ -18,5 +19,23 @@ def docker_compose_deps(basepath):
 
     return set(filter(None, services))
 
+
+def docker_compose_deps_from_files(files):
+    """Get docker image dependencies from docker-compose files already read.
+
+    Args:
+        files (dict of str: str): Contents of the docker-compose files keyed by their path
+
+    Returns:
+        set: Dependencies names.
+    """
+    services = list()
+    for content in files.values():
+        services.extend(yaml.safe_load(content)["services"].keys())
+
+    return set(filter(None, services))
+
+
 Plugin = docker_compose_deps
+FilesPlugin = docker_compose_deps_from_files
 
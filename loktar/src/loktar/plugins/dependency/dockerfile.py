@@ -1,6 +1,7 @@
 import os
 import re
 
+FILES = ["Dockerfile"]
 
 def docker_deps(basepath):
     """Get docker image dependencies.
@@ -14,18 +15,35 @@ def docker_deps(basepath):
     docker_file = os.path.join(basepath, "Dockerfile")
     if os.path.exists(docker_file):
         with open(docker_file, "r") as f:
-            dockerfile = f.read()
-        re_dockerfile = re.compile("FROM (.+)")
-        docker_from = re_dockerfile.findall(dockerfile)
-        assert len(docker_from) <= 1
-        if docker_from:
-            docker_from = docker_from[0]
-            docker_image_name_tag = docker_from.rsplit("/", 1)[-1]
-            docker_image_name = docker_image_name_tag.split(":", 1)[0]
-            return {docker_image_name}
-        else:
-            return set()
+            return _base_image(f.read())
     else:
         return set()
 
+
+def docker_deps_from_files(files):
+    """Get docker image dependencies from a Dockerfile already read.
+
+    Args:
+        files (dict of str: str): Contents of the Dockerfile keyed by its path
+
+    Returns:
+        set: Dependencies names.
+    """
+    return _base_image(files["Dockerfile"]) if "Dockerfile" in files else set()
+
+
+def _base_image(dockerfile):
+    re_dockerfile = re.compile("FROM (.+)")
+    docker_from = re_dockerfile.findall(dockerfile)
+    assert len(docker_from) <= 1
+    if docker_from:
+        docker_from = docker_from[0]
+        docker_image_name_tag = docker_from.rsplit("/", 1)[-1]
+        docker_image_name = docker_image_name_tag.split(":", 1)[0]
+        return {docker_image_name}
+    else:
+        return set()
+
+
 Plugin = docker_deps
+FilesPlugin = docker_deps_from_files
@@ -1,6 +1,9 @@
 import os
 import re
 
+FILES = ["requirements.txt", "test_requirements.txt",
+         "app/requirements.txt", "app/test_requirements.txt",
+         "src/requirements.txt", "src/test_requirements.txt"]
 
 def python_deps(basepath):
     """Get python dependencies from requirements.txt and test_requirements.txt.
@@ -26,7 +29,24 @@ def python_deps(basepath):
             with open(req_file, "r") as f:
                 requirements.extend(f.readlines())
 
-    requirements_names = set(filter(None, map(lambda x: re.split("==|>=|>|<=|<", x)[0], requirements)))
-    return requirements_names
+    return _requirements_names(requirements)
+
+
+def python_deps_from_files(files):
+    """Get python dependencies from requirements files already read.
+
+    Args:
+        files (dict of str: str): Contents of the requirements files keyed by their path
+
+    Returns:
+        set: Requirements names.
+    """
+    return _requirements_names([line for content in files.values() for line in content.splitlines()])
+
+
+def _requirements_names(requirements):
+    return set(filter(None, map(lambda x: re.split("==|>=|>|<=|<", x)[0].strip(), requirements)))
+
 
 Plugin = python_deps
+FilesPlugin = python_deps_from_files
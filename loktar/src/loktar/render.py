@@ -0,0 +1,244 @@
+import atexit
+import multiprocessing
+import os
+import time
+from uuid import uuid4
+from xml.sax.saxutils import escape
+
+from loktar.cmd import lcd
+from loktar.cmd import local
+from loktar.constants import DEPENDENDY_GRAPH
+from loktar.exceptions import FailDrawDepGraph
+from loktar.graph import CompactGraph
+from loktar.log import Log
+
+logger = Log()
+
+TEXT_OUTPUT_TYPES = ("dot", "svg")
+
+# SVG geometry, in pixels
+NODE_WIDTH = 180
+NODE_HEIGHT = 30
+LEVEL_SPACING = 240
+NODE_SPACING = 50
+MARGIN = 20
+
+
+def new_graph_name():
+    """
+    Returns:
+        str: a name for a rendered graph, unique in the dependency graph repository
+    """
+    return "{0}_{1}".format(str(time.time()).replace(".", "_"), uuid4().hex[:8])
+
+
+def _dot_id(name):
+    return '"{}"'.format(name.replace("\\", "\\\\").replace('"', '\\"'))
+
+
+def _levels(nodes, edges, dependencies_levels):
+    if dependencies_levels is not None:
+        return dependencies_levels
+    return [component.levels() for component in CompactGraph(nodes, edges).components()]
+
+
+def dot_source(nodes, edges, dependencies_levels=None):
+    """Write a dependency graph in the DOT language, without any graph library
+
+    Args:
+        nodes (iterable of str): artifacts names
+        edges (iterable of tuple): edges between artifacts names
+        dependencies_levels (Optional[list]): levels of each component, computed when None. Defaults to None.
+
+    Returns:
+        str: the DOT source, the artifacts of a level share the same rank
+    """
+    lines = ["digraph dependencies {", "    rankdir=LR;", "    node [shape=box];"]
+    lines.extend("    {};".format(_dot_id(node)) for node in sorted(nodes))
+    for component in _levels(nodes, edges, dependencies_levels):
+        for level in component:
+            lines.append("    {{rank=same; {}}}".format(" ".join("{};".format(_dot_id(node)) for node in level)))
+    lines.extend("    {} -> {};".format(_dot_id(node_from), _dot_id(node_to)) for node_from, node_to in sorted(edges))
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+
+def svg_source(nodes, edges, dependencies_levels=None):
+    """Draw a dependency graph in SVG, without any graph or plotting library
+
+    Levels are columns from left to right, components are stacked from top to bottom.
+
+    Args:
+        nodes (iterable of str): artifacts names
+        edges (iterable of tuple): edges between artifacts names
+        dependencies_levels (Optional[list]): levels of each component, computed when None. Defaults to None.
+
+    Returns:
+        str: the SVG document
+    """
+    positions = {}
+    component_top = MARGIN
+    width = 0
+    for component in _levels(nodes, edges, dependencies_levels):
+        for level_i, level in enumerate(component):
+            for node_i, node in enumerate(level):
+                positions[node] = (MARGIN + level_i * LEVEL_SPACING, component_top + node_i * NODE_SPACING)
+            width = max(width, MARGIN + level_i * LEVEL_SPACING + NODE_WIDTH + MARGIN)
+        component_top += max(len(level) for level in component) * NODE_SPACING + MARGIN
+
+    elements = ['<svg xmlns="http://www.w3.org/2000/svg" width="{}" height="{}">'.format(width, component_top),
+                '<defs><marker id="arrow" markerWidth="10" markerHeight="10" refX="10" refY="5" orient="auto">'
+                '<path d="M0,0 L10,5 L0,10 z" fill="green"/></marker></defs>']
+    for node_from, node_to in sorted(edges):
+        (x_from, y_from), (x_to, y_to) = positions[node_from], positions[node_to]
+        elements.append('<line x1="{}" y1="{}" x2="{}" y2="{}" stroke="green" marker-end="url(#arrow)"/>'.format(
+            x_from + NODE_WIDTH, y_from + NODE_HEIGHT // 2, x_to, y_to + NODE_HEIGHT // 2))
+    for node, (x, y) in sorted(positions.iteritems()):
+        elements.append('<rect x="{}" y="{}" width="{}" height="{}" rx="5" fill="lightblue" stroke="black"/>'.format(
+            x, y, NODE_WIDTH, NODE_HEIGHT))
+        elements.append('<text x="{}" y="{}" text-anchor="middle" font-family="sans-serif" font-size="12">{}</text>'
+                        .format(x + NODE_WIDTH // 2, y + NODE_HEIGHT * 2 // 3, escape(node)))
+    elements.append("</svg>")
+    return "\n".join(elements) + "\n"
+
+
+def render_graph(nodes, edges, dependencies_levels, save_path, name_file, output_type):
+    """Render a dependency graph in a file
+
+    Args:
+        nodes (list of str): artifacts names
+        edges (list of tuple): edges between artifacts names
+        dependencies_levels (list): levels of each component
+        save_path (str): The directory where the file is saved
+        name_file (str): The name of the file, without extension
+        output_type (str): "dot" and "svg" are written as text, "png" is drawn with matplotlib
+
+    Raises:
+        FailDrawDepGraph: The output type is unknown
+
+    Returns:
+        str: path of the rendered file
+    """
+    final_path = os.path.join(save_path, "{0}.{1}".format(name_file, output_type))
+    logger.info("Rendering the dependency graph in {0}".format(final_path))
+
+    if output_type in TEXT_OUTPUT_TYPES:
+        source = dot_source if output_type == "dot" else svg_source
+        with open(final_path, "w") as fd:
+            fd.write(source(nodes, edges, dependencies_levels))
+    elif output_type == "png":
+        # matplotlib is only needed, and imported, for this output
+        from loktar.dependency import gplot
+        gplot(CompactGraph(nodes, edges).to_networkx(), dependencies_levels,
+              save_path=save_path, output_type=output_type, name_file=name_file)
+    else:
+        logger.error("The output type {0} is unknown".format(output_type))
+        raise FailDrawDepGraph("Unknown output type {0}".format(output_type))
+
+    return final_path
+
+
+def publish_graph(repo, name_file):
+    """Push a rendered graph to the dependency graph repository
+
+    Args:
+        repo (str): Path of the dependency graph repository
+        name_file (str): The name of the rendered file
+    """
+    with lcd(repo):
+        local("git checkout master")
+        local("git fetch origin")
+        local("git merge origin/master")
+        local("git add .")
+        local("git commit -m 'Add {0}'".format(name_file))
+        local("git push origin")
+    logger.info("The dependency graph {0} is published".format(name_file))
+
+
+class GraphRenderer(object):
+    """Render and publish dependency graphs in a background process
+
+    Rendering a big graph and pushing it takes much longer than computing the dependency levels, so it is done off
+    the path to the builds: ``submit`` only queues the graph and returns the name of the file to come.
+    Pending graphs are still rendered when the submitting process exits.
+
+    Args:
+        repo (str): Path of the dependency graph repository, default value is LOKTAR_CI_DEPENDENCY_GRAPH_REPO
+        output_type (str): "dot", "svg" or "png", default value is LOKTAR_CI_DEPENDENCY_GRAPH_OUTPUT_TYPE
+        publish (bool): Push the rendered graphs to the repository. Defaults to True.
+    """
+
+    def __init__(self, repo=None, output_type=None, publish=True):
+        self.repo = repo if repo is not None else DEPENDENDY_GRAPH["repo"]
+        self.output_type = output_type if output_type is not None else DEPENDENDY_GRAPH["output_type"]
+        self.publish = publish
+        self._queue = None
+        self._process = None
+
+    def start(self):
+        if self._process is not None:
+            return
+        self._queue = multiprocessing.Queue()
+        self._process = multiprocessing.Process(target=self._run, name="loktar-graph-renderer")
+        self._process.start()
+        atexit.register(self.stop)
+        logger.info("Dependency graph renderer started (pid {0})".format(self._process.pid))
+
+    def stop(self, timeout=None):
+        """Wait for the pending graphs and stop the renderer
+
+        Args:
+            timeout (Optional[float]): Maximum time to wait, in seconds. Defaults to None, wait for all of them.
+        """
+        if self._process is None:
+            return
+        self._queue.put(None)
+        self._process.join(timeout)
+        self._queue, self._process = None, None
+
+    def submit(self, graph, dependencies_levels, callback=None):
+        """Queue a graph to render
+
+        Args:
+            graph (networkx.classes.digraph.DiGraph or loktar.graph.CompactGraph): the dependency graph
+            dependencies_levels (list): levels of each component
+            callback (Optional[function]): Called with the name and the path of the file once it is rendered and
+                published, in the renderer process. It must be a module level function. Defaults to None.
+
+        Returns:
+            str: the name of the file to come, without extension
+        """
+        self.start()
+        name_file = new_graph_name()
+        self._queue.put((name_file, graph.nodes(), graph.edges(), dependencies_levels, callback))
+        return name_file
+
+    def render(self, name_file, nodes, edges, dependencies_levels, callback=None):
+        """Render and publish a graph, this is what the renderer process does for each submitted graph"""
+        final_path = render_graph(nodes, edges, dependencies_levels, self.repo, name_file, self.output_type)
+        if self.publish:
+            publish_graph(self.repo, name_file)
+        if callback is not None:
+            callback(name_file, final_path)
+
+    def _run(self):
+        for job in iter(self._queue.get, None):
+            try:
+                self.render(*job)
+            except Exception as e:
+                # A broken graph must not stop the rendering of the next ones
+                logger.error("Cannot render the dependency graph {0}: {1}".format(job[0], str(e)))
+
+
+_renderer = None
+
+
+def default_renderer():
+    """
+    Returns:
+        GraphRenderer: the renderer shared by the process
+    """
+    global _renderer
+    if _renderer is None:
+        _renderer = GraphRenderer()
+    return _renderer
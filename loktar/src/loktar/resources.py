@@ -0,0 +1,136 @@
+import multiprocessing
+import os
+
+from loktar.constants import RESOURCES
+
+
+def resource_request(package):
+    """Resources a build of a package needs
+
+    They are declared in config.json, under the ``"resources"`` key of the package. Example:
+    ``{"cpu": 4, "memory": 8192, "exclusive": "docker"}``. Two builds with the same exclusive tag never run at the
+    same time.
+
+    Args:
+        package (dict): package configuration, or None
+
+    Raises:
+        ValueError: a request is negative
+
+    Returns:
+        dict: the "cpu", the "memory" in MB and the "exclusive" tag, None without tag
+    """
+    resources = (package or {}).get("resources", {})
+    request = {
+        "cpu": float(resources.get("cpu", RESOURCES["default_cpu"])),
+        "memory": int(resources.get("memory", RESOURCES["default_memory"])),
+        "exclusive": resources.get("exclusive")
+    }
+    if request["cpu"] < 0 or request["memory"] < 0:
+        raise ValueError("resources must be positive, actual value: {0}".format(resources))
+    return request
+
+
+def package_request(requests, package_name):
+    """
+    Args:
+        requests (dict of str: dict): requests of the packages, like the ``"resources"`` of their configuration or
+            the result of ``resource_request``
+        package_name (str): the package
+
+    Returns:
+        dict: the request of the package, completed with the defaults, see ``resource_request``
+    """
+    return resource_request({"resources": requests.get(package_name) or {}})
+
+
+def machine_capacity():
+    """
+    Returns:
+        tuple: the number of CPUs and the physical memory in MB of this machine, the memory is None when unknown
+    """
+    try:
+        memory = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") // (1024 * 1024)
+    except (AttributeError, ValueError, OSError):
+        memory = None
+    return multiprocessing.cpu_count(), memory
+
+
+class Capacity(object):
+    """Resources of the executors, and what the running builds use of them
+
+    A build larger than the whole capacity runs alone, rather than never.
+
+    Args:
+        cpu (Optional[float]): CPUs of the executors, default value is LOKTAR_RESOURCES_CPU
+        memory (Optional[int]): memory of the executors in MB, default value is LOKTAR_RESOURCES_MEMORY
+        max_skips (Optional[int]): number of times the first unit which does not fit may be passed by the units
+            behind it, see ``pack``, default value is LOKTAR_RESOURCES_MAX_SKIPS
+    """
+
+    def __init__(self, cpu=None, memory=None, max_skips=None):
+        self.cpu = cpu if cpu is not None else RESOURCES["cpu"]
+        self.memory = memory if memory is not None else RESOURCES["memory"]
+        self.max_skips = max_skips if max_skips is not None else RESOURCES["max_skips"]
+        self.used = {"cpu": 0., "memory": 0}
+        self.tags = set()
+        self.running = 0
+        # unit: number of packings it did not fit in
+        self.skipped = {}
+
+    def fits(self, request):
+        """
+        Args:
+            request (dict): see ``resource_request``
+
+        Returns:
+            bool: True if the build can start now
+        """
+        if request["exclusive"] is not None and request["exclusive"] in self.tags:
+            return False
+        if not self.running:
+            return True
+        return all(limit is None or self.used[resource] + request[resource] <= limit
+                   for resource, limit in (("cpu", self.cpu), ("memory", self.memory)))
+
+    def take(self, request):
+        self.used["cpu"] += request["cpu"]
+        self.used["memory"] += request["memory"]
+        if request["exclusive"] is not None:
+            self.tags.add(request["exclusive"])
+        self.running += 1
+
+    def release(self, request):
+        self.used["cpu"] -= request["cpu"]
+        self.used["memory"] -= request["memory"]
+        self.tags.discard(request["exclusive"])
+        self.running -= 1
+
+    def pack(self, ready_units, requests):
+        """Take the resources of the ready units which fit in what is left
+
+        The units are taken in the given order, a unit which does not fit is skipped, so the smaller units behind
+        it fill the free resources. Once a unit was skipped ``max_skips`` times, the units behind it wait too, so
+        that the running builds release the resources it needs instead of a steady stream of small units taking
+        them.
+
+        Args:
+            ready_units (list of tuple): build units, by decreasing priority
+            requests (dict of str: dict): requests of the packages, see ``package_request``.
+                The missing packages get the default request.
+
+        Returns:
+            list of tuple: the units to start
+        """
+        packed = []
+        for unit in ready_units:
+            request = package_request(requests, unit[0])
+            if self.fits(request):
+                self.take(request)
+                self.skipped.pop(unit, None)
+                packed.append(unit)
+                continue
+            self.skipped[unit] = self.skipped.get(unit, 0) + 1
+            if self.skipped[unit] > self.max_skips:
+                break
+        return packed
@@ -0,0 +1,133 @@
+import fnmatch
+import os
+
+try:
+    from os import scandir
+except ImportError:
+    from scandir import scandir
+
+from loktar.constants import PLUGINS_INFO
+from loktar.log import Log
+from loktar.plugin import find_plugin
+
+logger = Log()
+
+
+def dependency_patterns(package):
+    """Get the files read by the dependency plugins of a package
+
+    Args:
+        package (dict): package configuration
+
+    Returns:
+        set of str: glob patterns relative to the package path, gathered from the ``FILES`` list of the plugins
+    """
+    patterns = set()
+    for plugin_type in package.get("dependencies_type", []):
+        plugin = find_plugin(plugin_type, "dependency", PLUGINS_INFO["locations"], PLUGINS_INFO["workspace"])
+        patterns |= set(getattr(plugin, "FILES", []))
+    return patterns
+
+
+def select_files(files, patterns):
+    """Keep the files matching some patterns
+
+    Wildcards only apply to the file name, like in ``glob``.
+
+    Args:
+        files (dict of str: str): relative paths are keys, contents are values
+        patterns (iterable of str): glob patterns relative to the package path
+
+    Returns:
+        dict of str: str: the files matching at least one of the patterns
+    """
+    patterns = [os.path.split(pattern) for pattern in patterns]
+    return {file_path: content for file_path, content in files.iteritems()
+            if any(fnmatch.fnmatch(os.path.basename(file_path), pattern_name)
+                   for pattern_dir, pattern_name in patterns if os.path.dirname(file_path) == pattern_dir)}
+
+
+def pattern_directories(repo_path, artifacts):
+    """Bucket the dependency patterns of the artifacts by the directory they look into
+
+    Args:
+        repo_path (str): normalized path of the repository
+        artifacts (dict): all artifacts. Keys are artifacts names, values are directly taken from config.json
+
+    Returns:
+        tuple: the directories holding dependency files, mapped to the (artifact name, pattern directory, pattern
+        name) looking into them, and the set of directories that have to be crossed to reach them
+    """
+    wanted = {}
+    crossed = set()
+    for artifact_name, config in artifacts.iteritems():
+        artifact_root = os.path.normpath(os.path.join(repo_path,
+                                                      config.get("artifact_dir", ""),
+                                                      config["artifact_name"]))
+        for pattern in dependency_patterns(config):
+            pattern_dir, pattern_name = os.path.split(pattern)
+            directory = os.path.normpath(os.path.join(artifact_root, pattern_dir))
+            wanted.setdefault(directory, []).append((artifact_name, pattern_dir, pattern_name))
+
+            while directory != repo_path and directory not in crossed:
+                crossed.add(directory)
+                directory = os.path.dirname(directory)
+    return wanted, crossed
+
+
+def read_matching_file(entry_path, patterns, files):
+    """Read a file once, for all the artifacts with a pattern matching it
+
+    Args:
+        entry_path (str): path of the file
+        patterns (list of tuple): (artifact name, pattern directory, pattern name) looking into its directory
+        files (dict of str: dict): where the content is added, see ``scan_repository``
+    """
+    file_name = os.path.basename(entry_path)
+    content = None
+    for artifact_name, pattern_dir, pattern_name in patterns:
+        if fnmatch.fnmatch(file_name, pattern_name):
+            if content is None:
+                with open(entry_path, "r") as fd:
+                    content = fd.read()
+            files[artifact_name][os.path.join(pattern_dir, file_name)] = content
+
+
+def scan_repository(repo_path, artifacts):
+    """Collect the dependency files of all the artifacts in a single walk of the repository
+
+    Only the directories that can hold a dependency file are listed, each of them once, so the file system is not
+    probed for every candidate file of every artifact.
+
+    Args:
+        repo_path (str): this is the path where the repo to parse is
+        artifacts (dict): all artifacts. Keys are artifacts names, values are directly taken from config.json
+
+    Returns:
+        dict of str: dict: artifacts names are keys, values are dicts of file contents keyed by their path
+        relative to the artifact path
+    """
+    repo_path = os.path.normpath(repo_path)
+    wanted, crossed = pattern_directories(repo_path, artifacts)
+
+    files = {artifact_name: {} for artifact_name in artifacts}
+    nb_listed = 0
+    to_visit = [repo_path] if wanted else []
+    while to_visit:
+        directory = to_visit.pop()
+        try:
+            entries = list(scandir(directory))
+        except OSError:
+            continue
+        nb_listed += 1
+
+        for entry in entries:
+            entry_path = os.path.join(directory, entry.name)
+            if entry.is_dir():
+                if entry_path in crossed:
+                    to_visit.append(entry_path)
+            elif directory in wanted and entry.is_file():
+                read_matching_file(entry_path, wanted[directory], files)
+
+    logger.info("Dependency files collected for {} artifacts in {} directories".format(len(artifacts), nb_listed))
+    return files
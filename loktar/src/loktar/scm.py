@@ -1,17 +1,19 @@
-from fabric.api import lcd
-from github import Github as GitHub
-from github import GithubException
-from github import UnknownObjectException
 import os
-import requests
 import StringIO
 
 from loktar.cmd import exe
+from loktar.cmd import lcd
 from loktar.constants import GITHUB_INFO
 from loktar.decorators import retry
 from loktar.exceptions import SCMError
+from loktar.lazy import lazy_attribute
+from loktar.lazy import LazyModule
 from loktar.log import Log
 
+github = LazyModule("github")
+GitHub = lazy_attribute(github, "Github")
+requests = LazyModule("requests")
+
 
 class Github(object):
     """Wrapper for the github3 library
@@ -225,7 +227,7 @@ class Github(object):
                                                                    patch_note,
                                                                    commit_id,
                                                                    type_object)
-        except GithubException as e:
+        except github.GithubException as e:
             self.logger.error(str(e))
             raise SCMError(str(e))
 
@@ -254,7 +256,7 @@ class Github(object):
         try:
             pr_info = self.get_pull_request(pull_request_id)
 
-        except GithubException as e:
+        except github.GithubException as e:
             self.logger.error(str(e))
             raise SCMError(str(e))
 
@@ -264,7 +266,7 @@ class Github(object):
     def get_commit(self, commit_id):
         try:
             return self._repository.get_commit(commit_id)
-        except (UnknownObjectException, AssertionError) as e:
+        except (github.UnknownObjectException, AssertionError) as e:
             raise SCMError(str(e))
 
     @retry
@@ -0,0 +1,105 @@
+import heapq
+
+from loktar.constants import SCHEDULER
+from loktar.job import build_units
+from loktar.job import critical_path_priorities
+from loktar.job import dependent_units
+from loktar.log import Log
+
+logger = Log()
+
+
+def simulate(units, durations, slots=None, priorities=None, default_duration=None):
+    """Replay the scheduling of build units, without launching anything
+
+    Like ``loktar.job.schedule_jobs``, a unit is launched once the units it waits for are done and a slot is free,
+    the ready units with the highest priority first.
+
+    Args:
+        units (dict of tuple: set): build units and the units they wait for, see ``loktar.job.build_units``
+        durations (dict of tuple: float): durations of the units, in seconds
+        slots (Optional[int]): maximum number of units running at the same time. Defaults to None, no limit.
+        priorities (Optional[dict of tuple: float]): priorities of the units, ready units are otherwise launched in
+            name order. Defaults to None.
+        default_duration (Optional[float]): duration of the units without duration.
+            Defaults to LOKTAR_SCHEDULER_DEFAULT_DURATION.
+
+    Returns:
+        float: the makespan, time between the first launch and the end of the last unit
+    """
+    default_duration = default_duration if default_duration is not None else SCHEDULER["default_duration"]
+    priorities = priorities if priorities is not None else {}
+    waiting = {unit: len(previous_units) for unit, previous_units in units.iteritems()}
+    next_units = dependent_units(units)
+
+    ready = [(-priorities.get(unit, 0), unit) for unit, nb_previous in waiting.iteritems() if nb_previous == 0]
+    heapq.heapify(ready)
+    # (end time, unit) of the running units
+    running = []
+    clock = 0.
+    nb_done = 0
+
+    while ready or running:
+        while ready and (slots is None or len(running) < slots):
+            _, unit = heapq.heappop(ready)
+            heapq.heappush(running, (clock + durations.get(unit, default_duration), unit))
+
+        clock, unit = heapq.heappop(running)
+        nb_done += 1
+        for next_unit in next_units.get(unit, []):
+            waiting[next_unit] -= 1
+            if waiting[next_unit] == 0:
+                heapq.heappush(ready, (-priorities.get(next_unit, 0), next_unit))
+
+    if nb_done != len(units):
+        raise ValueError("Some units wait for each other")
+    return clock
+
+
+def compare_policies(units, durations, slots=None, default_duration=None):
+    """Compare the makespan of the critical path order with the name order
+
+    Args:
+        units (dict of tuple: set): build units and the units they wait for, see ``loktar.job.build_units``
+        durations (dict of tuple: float): durations of the units, in seconds
+        slots (Optional[int]): maximum number of units running at the same time. Defaults to None, no limit.
+        default_duration (Optional[float]): duration of the units without duration.
+            Defaults to LOKTAR_SCHEDULER_DEFAULT_DURATION.
+
+    Returns:
+        dict of str: float: makespans keyed by policy, "name_order" and "critical_path"
+    """
+    priorities = critical_path_priorities(units, durations, default_duration=default_duration)
+    return {
+        "name_order": simulate(units, durations, slots=slots, default_duration=default_duration),
+        "critical_path": simulate(units, durations, slots=slots, priorities=priorities,
+                                  default_duration=default_duration)
+    }
+
+
+def replay(run, durations_db, slots=None):
+    """Replay a recorded run with the recorded build durations
+
+    Args:
+        run (dict): a run payload, as returned by the init worker and stored by ``loktar.db.Run``.
+            It holds the dependency levels ("dep_lvl"), the dependency edges ("dep_edges") and the "git_branch".
+        durations_db (loktar.db.BuildDurations): history of the build durations
+        slots (Optional[int]): maximum number of builds running at the same time.
+            Defaults to LOKTAR_SCHEDULER_SLOTS.
+
+    Returns:
+        dict of str: float: makespans keyed by policy, see ``compare_policies``
+    """
+    slots = slots if slots is not None else SCHEDULER["slots"]
+    types_build = ["test", "artifact"] if run["git_branch"] != "master" else ["artifactmaster"]
+    makespans = {"name_order": 0., "critical_path": 0.}
+
+    # Components are independent and built side by side, so they are replayed together
+    component = [level for run_component in run["dep_lvl"] for level in run_component]
+    units = build_units(component, types_build, run.get("dep_edges", []))
+    durations = durations_db.estimates(artifact_name for artifact_name, _ in units)
+    makespans.update(compare_policies(units, durations, slots=slots))
+
+    logger.info("Replayed run on {}: {:.0f}s in name order, {:.0f}s with the critical path first".format(
+        run["git_branch"], makespans["name_order"], makespans["critical_path"]))
+    return makespans
@@ -0,0 +1,207 @@
+import hashlib
+import json
+import os
+import tempfile
+
+from loktar.constants import DEPENDENCY_SNAPSHOT
+from loktar.log import Log
+from loktar.scanner import scan_repository
+
+logger = Log()
+
+
+def config_fingerprint(config):
+    """Fingerprint an artifact configuration
+
+    Args:
+        config (dict): artifact configuration, directly taken from config.json
+
+    Returns:
+        str: a digest changing whenever the configuration changes
+    """
+    return hashlib.sha1(json.dumps(config, sort_keys=True)).hexdigest()
+
+
+class DependencySnapshot(object):
+    """Requirements of every artifact of the repository at a given commit
+
+    The raw requirements returned by the dependency plugins are kept, not only the ones matching an artifact,
+    so an artifact added later is linked to the artifacts already requiring it without scanning them again.
+
+    Args:
+        commit_id (str): commit the requirements were computed at
+        requirements (dict of str: set): keys are artifacts names, values are their raw requirements
+        configs (dict of str: str): keys are artifacts names, values are the fingerprints of their configuration
+    """
+
+    def __init__(self, commit_id, requirements, configs):
+        self.commit_id = commit_id
+        self._requirements = requirements
+        self._configs = configs
+
+    @classmethod
+    def build(cls, commit_id, repo_path, artifacts, **kwargs):
+        """Compute the snapshot of a whole repository
+
+        Args:
+            commit_id (str): commit checked out in repo_path
+            repo_path (str): this is the path where the repo to parse is
+            artifacts (dict): all artifacts. Keys are artifacts names, values are directly taken from config.json
+            **kwargs: forwarded to ``loktar.dependency.get_artifacts_requirements``
+
+        Returns:
+            DependencySnapshot: the snapshot
+        """
+        return cls(commit_id, {}, {}).update(commit_id, repo_path, artifacts, artifacts.keys(), **kwargs)
+
+    def update(self, commit_id, repo_path, artifacts, changed_artifacts, **kwargs):
+        """Derive the snapshot of a newer commit
+
+        Only the changed artifacts, the new ones and the ones whose configuration changed are scanned,
+        the requirements of the others are carried over. Removed artifacts are dropped.
+
+        Args:
+            commit_id (str): commit checked out in repo_path
+            repo_path (str): this is the path where the repo to parse is
+            artifacts (dict): all artifacts. Keys are artifacts names, values are directly taken from config.json
+            changed_artifacts (iterable of str): artifacts touched by the diff since the commit of this snapshot
+            **kwargs: forwarded to ``loktar.dependency.get_artifacts_requirements``
+
+        Returns:
+            DependencySnapshot: the new snapshot, this one is left untouched
+        """
+        from loktar.dependency import get_artifacts_requirements
+
+        configs = {artifact_name: config_fingerprint(config) for artifact_name, config in artifacts.iteritems()}
+        changed_artifacts = set(changed_artifacts)
+        kept = {artifact_name for artifact_name in self._requirements
+                if self._configs.get(artifact_name) == configs.get(artifact_name)} - changed_artifacts
+        outdated = {artifact_name: artifacts[artifact_name] for artifact_name in artifacts if artifact_name not in kept}
+
+        requirements = {artifact_name: self._requirements[artifact_name]
+                        for artifact_name in artifacts if artifact_name not in outdated}
+        if outdated:
+            requirements.update(get_artifacts_requirements(outdated.keys(), outdated, repo_path,
+                                                           artifacts_files=scan_repository(repo_path, outdated),
+                                                           internal_only=False,
+                                                           **kwargs))
+
+        logger.info("Dependency snapshot {}: {} artifacts scanned, {} reused from {}".format(
+            commit_id, len(outdated), len(artifacts) - len(outdated), self.commit_id))
+        return DependencySnapshot(commit_id, requirements, configs)
+
+    def artifacts_requirements(self, artifacts=None):
+        """Get the requirements among the artifacts
+
+        Args:
+            artifacts (Optional[iterable of str]): artifacts to consider. Defaults to the ones of the snapshot.
+
+        Returns:
+            dict of str: set: keys are the artifacts names, values are their requirements among the artifacts,
+            artifacts without requirements are left out. The dict can be given to ``loktar.dependency.graph_edges``.
+        """
+        artifacts = set(self._requirements if artifacts is None else artifacts)
+        return {artifact_name: requirements & artifacts
+                for artifact_name, requirements in self._requirements.iteritems()
+                if artifact_name in artifacts and requirements & artifacts}
+
+    def to_dict(self):
+        return {"commit_id": self.commit_id,
+                "configs": self._configs,
+                "requirements": {artifact_name: sorted(requirements)
+                                 for artifact_name, requirements in self._requirements.iteritems()}}
+
+    @classmethod
+    def from_dict(cls, data):
+        requirements = {artifact_name: set(artifact_requirements)
+                        for artifact_name, artifact_requirements in data["requirements"].iteritems()}
+        return cls(data["commit_id"], requirements, data["configs"])
+
+
+class SnapshotStore(object):
+    """Directory of dependency snapshots, one file per commit
+
+    Args:
+        path (str): Location of the snapshots, default value is LOKTAR_DEPENDENCY_SNAPSHOT_PATH
+        keep (int): Number of snapshots kept on disk, default value is LOKTAR_DEPENDENCY_SNAPSHOT_KEEP
+    """
+
+    def __init__(self, path=None, keep=None):
+        self.path = path if path is not None else DEPENDENCY_SNAPSHOT["path"]
+        self.keep = keep if keep is not None else DEPENDENCY_SNAPSHOT["keep"]
+
+    def _snapshot_path(self, commit_id):
+        return os.path.join(self.path, "{}.json".format(commit_id))
+
+    def load(self, commit_id):
+        """Load the snapshot of a commit
+
+        Args:
+            commit_id (str): commit of the snapshot
+
+        Returns:
+            DependencySnapshot: the snapshot or None if it is not stored or unreadable
+        """
+        if self.path is None or commit_id is None or not os.path.exists(self._snapshot_path(commit_id)):
+            return None
+        try:
+            with open(self._snapshot_path(commit_id), "r") as fd:
+                snapshot = DependencySnapshot.from_dict(json.load(fd))
+            # Used snapshots are the last ones to be removed
+            os.utime(self._snapshot_path(commit_id), None)
+            return snapshot
+        except (IOError, ValueError, KeyError) as e:
+            logger.warning("The dependency snapshot of {} is unreadable: {}".format(commit_id, str(e)))
+            return None
+
+    def save(self, snapshot):
+        """Store a snapshot, the oldest ones are removed beyond ``keep`` snapshots
+
+        The file is replaced atomically, so concurrent workers never read a partial snapshot.
+
+        Args:
+            snapshot (DependencySnapshot): the snapshot to store
+        """
+        if self.path is None:
+            return
+
+        if not os.path.exists(self.path):
+            os.makedirs(self.path)
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, prefix=".snapshot")
+        with os.fdopen(fd, "w") as tmp_file:
+            json.dump(snapshot.to_dict(), tmp_file)
+        os.rename(tmp_path, self._snapshot_path(snapshot.commit_id))
+
+        snapshots = sorted((os.path.join(self.path, file_name) for file_name in os.listdir(self.path)
+                            if file_name.endswith(".json")),
+                           key=os.path.getmtime, reverse=True)
+        for snapshot_path in snapshots[self.keep:]:
+            os.remove(snapshot_path)
+
+    def snapshot(self, commit_id, repo_path, artifacts, changed_artifacts, base_commit_id=None, **kwargs):
+        """Get the snapshot of a commit, derived from the snapshot of its base commit when it is stored
+
+        Args:
+            commit_id (str): commit checked out in repo_path
+            repo_path (str): this is the path where the repo to parse is
+            artifacts (dict): all artifacts. Keys are artifacts names, values are directly taken from config.json
+            changed_artifacts (iterable of str): artifacts touched by the diff between base_commit_id and commit_id
+            base_commit_id (Optional[str]): commit the changes are based on. Defaults to None.
+            **kwargs: forwarded to ``loktar.dependency.get_artifacts_requirements``
+
+        Returns:
+            DependencySnapshot: the snapshot of commit_id, stored for the next runs
+        """
+        snapshot = self.load(commit_id)
+        if snapshot is not None:
+            return snapshot
+
+        base_snapshot = self.load(base_commit_id)
+        if base_snapshot is None:
+            logger.info("No dependency snapshot for {}, scanning the whole repository".format(base_commit_id))
+            snapshot = DependencySnapshot.build(commit_id, repo_path, artifacts, **kwargs)
+        else:
+            snapshot = base_snapshot.update(commit_id, repo_path, artifacts, changed_artifacts, **kwargs)
+
+        self.save(snapshot)
+        return snapshot
@@ -1,8 +1,9 @@
-import boto.s3 as s3
-
 from loktar.decorators import retry
 from loktar.constants import AWS
 from loktar.exceptions import UnknownStorageMethod
+from loktar.lazy import LazyModule
+
+s3 = LazyModule("boto.s3")
 
 
 @retry
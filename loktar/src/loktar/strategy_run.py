@@ -4,6 +4,7 @@ from loktar.exceptions import CITestFail
 from loktar.exceptions import ImportPluginError
 from loktar.log import Log
 from loktar.plugin import find_plugin
+from loktar.scanner import select_files
 
 ACCEPT_RUN_TYPE = ["test", "artifact", "dependency"]
 
@@ -16,6 +17,12 @@ def strategy_runner(package, run_type, remote=False, **kwargs):
             run_type (str): Represent the strategy to run on a package (test or artifact)
             remote (bool): Represent if the plugin is executed in remote or not, default value: False
 
+        Keyword Args:
+            basepath (str): Path to the package, used by the dependency plugins
+            files (dict of str: str): Dependency files of the package already collected by
+                ``loktar.scanner.scan_repository``. They are handed to the dependency plugins exposing a
+                ``FilesPlugin``, the other plugins still read the files from ``basepath``.
+
         Raises:
             CITestFail: some error occurred during the test
             CITestUnknown: wrong value for config['test_type']
@@ -63,7 +70,10 @@ def strategy_runner(package, run_type, remote=False, **kwargs):
             except ImportPluginError:
                 raise
 
-            dependencies |= plugin.Plugin(kwargs.get("basepath"))
+            if kwargs.get("files") is not None and hasattr(plugin, "FilesPlugin"):
+                dependencies |= plugin.FilesPlugin(select_files(kwargs["files"], plugin.FILES))
+            else:
+                dependencies |= plugin.Plugin(kwargs.get("basepath"))
 
         return dependencies
     else:
@@ -0,0 +1,200 @@
+import errno
+import fcntl
+import os
+from uuid import uuid4
+
+from loktar.cmd import exe
+from loktar.cmd import exec_command_with_retry
+from loktar.cmd import exec_with_output_capture
+from loktar.cmd import lcd
+from loktar.constants import GITHUB_INFO
+from loktar.constants import MAX_RETRY_GITHUB
+from loktar.constants import WORKSPACE_POOL
+from loktar.exceptions import PrepareEnvFail
+from loktar.log import Log
+
+log = Log()
+
+
+def lock_file(path, blocking=True):
+    """Take an exclusive lock on a file, shared by all the processes of the machine
+
+    The lock is released when the file is closed, or when the process holding it dies.
+
+    Args:
+        path (str): the lock file, created if missing
+        blocking (Optional[bool]): wait for the lock. Defaults to True.
+
+    Returns:
+        file: the open lock file, None when the lock is held by another process and ``blocking`` is False
+    """
+    fd = open(path, "a")
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except IOError as e:
+        fd.close()
+        if e.errno in (errno.EAGAIN, errno.EACCES):
+            return None
+        raise
+    return fd
+
+
+class Workspace(object):
+    """A checkout leased from a ``WorkspacePool``, removed when it is released
+
+    Args:
+        pool (WorkspacePool): the pool it comes from
+        path (str): where the branch is checked out
+        lock (file): the lock of the lease, see ``lock_file``
+    """
+
+    def __init__(self, pool, path, lock):
+        self.pool = pool
+        self.path = path
+        self._lock = lock
+
+    def release(self):
+        """Remove the checkout, releasing a workspace twice does nothing"""
+        if self._lock is None:
+            return
+        try:
+            self.pool.remove(self.path)
+        finally:
+            os.remove(self._lock.name)
+            self._lock.close()
+            self._lock = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+class WorkspacePool(object):
+    """Checkouts of a repository from a persistent mirror, instead of a full clone per job
+
+    The mirror is cloned once, then each lease only fetches the new objects and checks the branch out in a
+    ``git worktree``, which shares the objects of the mirror. The changes of the mirror are serialized by a lock
+    file, so several processes of the machine can lease workspaces at the same time. Each lease holds a lock of its
+    own until it is released: the checkouts of the processes which died without releasing them are removed by the
+    next lease.
+
+    Args:
+        root (Optional[str]): where the mirrors and the checkouts are kept, default value is
+            LOKTAR_WORKSPACE_POOL_ROOT
+        organization (Optional[str]): default value is LOKTAR_GITHUB_INFO_ORGANIZATION
+        repository (Optional[str]): default value is LOKTAR_GITHUB_INFO_REPOSITORY
+        url (Optional[str]): the repository to mirror. Defaults to the GitHub repository of ``organization``.
+    """
+
+    def __init__(self, root=None, organization=None, repository=None, url=None):
+        self.root = root if root is not None else WORKSPACE_POOL["root"]
+        organization = organization if organization is not None else GITHUB_INFO["organization"]
+        repository = repository if repository is not None else GITHUB_INFO["repository"]
+        self.url = url if url is not None else "git@github.com:{0}/{1}.git".format(organization, repository)
+        self.mirror = os.path.join(self.root, organization, "{0}.git".format(repository))
+        self.leases = os.path.join(self.root, "leases")
+        for directory in (os.path.dirname(self.mirror), self.leases):
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+
+    def lease(self, branch="master", path=None, paths=None):
+        """Check a branch out, from the mirror updated with the new commits
+
+        Args:
+            branch (Optional[str]): the branch, or the commit, to check out. Defaults to "master".
+            path (Optional[str]): where to check it out. Defaults to a new directory in the pool.
+            paths (Optional[list of str]): the directories and files to check out, relative to the root of the
+                repository, see ``loktar.dependency.required_paths``. Defaults to None, the whole repository.
+
+        Raises:
+            PrepareEnvFail: the repository cannot be fetched, or the branch checked out
+
+        Returns:
+            Workspace: the checkout, to release once the job does not need it anymore
+        """
+        path = path if path is not None else os.path.join(self.root, "worktrees", uuid4().hex)
+        lock = lock_file(self._lease_lock(path))
+        try:
+            with self._mirror_lock():
+                self._update()
+                self._remove_stale()
+                # Detached, so that several jobs can check the same branch out
+                if not exe("git --git-dir={0} worktree add --force --detach{1} {2} {3}"
+                           .format(self.mirror, "" if paths is None else " --no-checkout", path, branch),
+                           remote=False):
+                    raise PrepareEnvFail("Can't check {0} out in {1}".format(branch, path))
+            if paths is not None:
+                try:
+                    self._sparse_checkout(path, paths)
+                except PrepareEnvFail:
+                    self.remove(path)
+                    raise
+        except Exception:
+            os.remove(lock.name)
+            lock.close()
+            raise
+        log.info("Workspace {0} leased for {1}".format(path, branch))
+        return Workspace(self, path, lock)
+
+    def remove(self, path):
+        """Remove a checkout of the pool
+
+        Args:
+            path (str): where it is checked out
+        """
+        with self._mirror_lock():
+            # The job may have removed the .git file of the checkout, the directory is removed by hand
+            exe("rm -rf {0}".format(path), remote=False)
+            exe("git --git-dir={0} worktree prune".format(self.mirror), remote=False)
+        log.info("Workspace {0} released".format(path))
+
+    def _sparse_checkout(self, path, paths):
+        # The patterns are anchored at the root of the repository, the sparse checkout only applies to this worktree.
+        # The worktree was added without checkout, the files matching the patterns are read from HEAD.
+        with lcd(path):
+            sparse_paths = " ".join("/{0}".format(sparse_path.strip("/")) for sparse_path in paths)
+            checked_out = exe("git sparse-checkout set --no-cone {0}".format(sparse_paths), remote=False)
+            if not checked_out or not exe("git read-tree -mu HEAD", remote=False):
+                raise PrepareEnvFail("Can't check {0} out in {1}".format(", ".join(paths), path))
+
+    def _update(self):
+        if os.path.isdir(self.mirror):
+            if not exec_command_with_retry("git --git-dir={0} fetch --prune origin".format(self.mirror), 0,
+                                           MAX_RETRY_GITHUB):
+                raise PrepareEnvFail("Can't fetch {0} in {1}".format(self.url, self.mirror))
+            return
+
+        # Cloned aside, so that an interrupted clone is never taken for the mirror
+        clone = "{0}.{1}".format(self.mirror, uuid4().hex)
+        if not exec_command_with_retry("git clone --mirror {0} {1}".format(self.url, clone), 0, MAX_RETRY_GITHUB):
+            exe("rm -rf {0}".format(clone), remote=False)
+            raise PrepareEnvFail("The git clone can't mirror the repository: {0}, check if you have the correct "
+                                 "credentials".format(self.url))
+        os.rename(clone, self.mirror)
+
+    def _remove_stale(self):
+        _, lines = exec_with_output_capture("git --git-dir={0} worktree list --porcelain".format(self.mirror),
+                                            remote=False)
+        worktrees = []
+        for line in lines:
+            if line.startswith("worktree "):
+                worktrees.append([line[len("worktree "):]])
+            elif worktrees:
+                worktrees[-1].append(line)
+        # The mirror itself is listed as the bare worktree
+        for path in (worktree[0] for worktree in worktrees if "bare" not in worktree):
+            lock = lock_file(self._lease_lock(path), blocking=False)
+            if lock is not None:
+                log.warning("Removing the workspace {0}, its job did not release it".format(path))
+                exe("rm -rf {0}".format(path), remote=False)
+                os.remove(lock.name)
+                lock.close()
+        exe("git --git-dir={0} worktree prune".format(self.mirror), remote=False)
+
+    def _lease_lock(self, path):
+        return os.path.join(self.leases, "{0}.lock".format(os.path.basename(path.rstrip("/"))))
+
+    def _mirror_lock(self):
+        return lock_file("{0}.lock".format(self.mirror))
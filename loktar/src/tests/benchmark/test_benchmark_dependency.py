@@ -0,0 +1,129 @@
+import copy
+import multiprocessing
+import random
+import time
+
+from mock import MagicMock
+import networkx as nx
+import pytest
+
+from loktar.dependency import gen_dependencies_level
+from loktar.dependency import get_artifacts_requirements
+from loktar.dependency import get_do_not_touch_artifacts
+from loktar.graph import CompactGraph
+from loktar.scanner import scan_repository
+from loktar.job import build_params_to_context
+
+
+def layered_dag(seed, nb_nodes, nb_layers, max_requirements):
+    rand = random.Random(seed)
+    nodes = ['artifact{0}'.format(i) for i in xrange(nb_nodes)]
+    layers = [nodes[i::nb_layers] for i in xrange(nb_layers)]
+    graph = nx.DiGraph()
+    graph.add_nodes_from(nodes)
+    for depth, layer in enumerate(layers[1:], 1):
+        for node in layer:
+            upper_layer = layers[rand.randint(0, depth - 1)]
+            for requirement in rand.sample(upper_layer, min(len(upper_layer), rand.randint(1, max_requirements))):
+                graph.add_edge(requirement, node)
+    return graph
+
+
+def fake_scm(green_builds, red_builds):
+    class Status(object):
+        def __init__(self, artifact, state):
+            self.raw_data = {'context': build_params_to_context(artifact, 'test')}
+            self.state = state
+
+    statuses = [Status(artifact, 'success') for artifact in green_builds]
+    statuses.extend(Status(artifact, 'error') for artifact in red_builds)
+    last_commit = MagicMock(sha='sha', files=[])
+
+    scm = MagicMock()
+    scm.get_last_statuses_from_pull_request.return_value = last_commit, statuses
+    scm.get_last_commits_from_pull_request.return_value = [last_commit]
+    return scm
+
+
+@pytest.fixture(scope='module')
+def synthetic_repo(tmpdir_factory):
+    nb_artifacts = 5000
+    rand = random.Random(42)
+    repo = tmpdir_factory.mktemp('repo')
+    artifacts = {}
+    for i in xrange(nb_artifacts):
+        artifact_name = 'artifact{0}'.format(i)
+        artifacts[artifact_name] = {'artifact_name': artifact_name,
+                                    'artifact_dir': 'group{0}'.format(i % 50),
+                                    'dependencies_type': ['python_requirements', 'docker_compose']}
+        artifact_dir = repo.ensure_dir('group{0}'.format(i % 50), artifact_name)
+        requirements = ['artifact{0}'.format(j) for j in rand.sample(xrange(nb_artifacts), 5)]
+        artifact_dir.join('requirements.txt').write('\n'.join(requirements + ['requests==2.7.0']))
+        services = ''.join('  artifact{0}:\n    image: artifact{0}:latest\n    environment:\n      - A=1\n'
+                           .format(j) for j in rand.sample(xrange(nb_artifacts), 20))
+        artifact_dir.join('docker-compose.yml').write('version: "2"\nservices:\n' + services)
+    return str(repo), artifacts
+
+
+@pytest.mark.parametrize('backend', ['threading', 'multiprocessing'])
+def test_benchmark_get_artifacts_requirements(synthetic_repo, backend):
+    repo_path, artifacts = synthetic_repo
+    artifacts_files = scan_repository(repo_path, artifacts)
+
+    timings = []
+    results = []
+    for workers in sorted({1, 2, 4, multiprocessing.cpu_count()}):
+        start = time.time()
+        results.append(get_artifacts_requirements(artifacts.keys(), artifacts, repo_path,
+                                                  artifacts_files=artifacts_files,
+                                                  workers=workers,
+                                                  backend=backend))
+        timings.append((workers, time.time() - start))
+
+    print('\n{0} artifacts, {1} backend, {2} cores'.format(len(artifacts), backend, multiprocessing.cpu_count()))
+    for workers, elapsed in timings:
+        print('{0} workers: {1:.2f}s (speedup x{2:.2f})'.format(workers, elapsed, timings[0][1] / elapsed))
+    # The merged output does not depend on the number of workers
+    assert all(result == results[0] for result in results)
+
+
+@pytest.mark.parametrize('nb_nodes', [1000, 3000, 6000])
+def test_benchmark_get_do_not_touch_artifacts(nb_nodes):
+    dep_graph = layered_dag(42, nb_nodes, 12, 4)
+    artifacts = {node: {} for node in dep_graph.nodes()}
+    # Most of the artifacts got green builds, a few of them are red and have to be rebuilt
+    red_builds = set(random.Random(42).sample(dep_graph.nodes(), nb_nodes // 50))
+    scm = fake_scm(set(dep_graph.nodes()) - red_builds, red_builds)
+
+    start = time.time()
+    do_not_touch_artifacts = get_do_not_touch_artifacts(42, artifacts, scm, dep_graph)
+    elapsed = time.time() - start
+
+    print('\n{0} artifacts, {1} edges: {2} not touched in {3:.3f}s'.format(nb_nodes,
+                                                                           dep_graph.number_of_edges(),
+                                                                           len(do_not_touch_artifacts),
+                                                                           elapsed))
+    assert not do_not_touch_artifacts & red_builds
+    assert elapsed < 5
+
+
+@pytest.mark.parametrize('nb_nodes', [10000, 30000])
+def test_benchmark_compact_graph(nb_nodes):
+    dep_graph = layered_dag(42, nb_nodes, 20, 3)
+    removed = random.Random(42).sample(dep_graph.nodes(), nb_nodes // 10)
+
+    start = time.time()
+    cleaned_dep_graph = copy.deepcopy(dep_graph)
+    cleaned_dep_graph.remove_nodes_from(removed)
+    _, networkx_levels, _ = gen_dependencies_level(cleaned_dep_graph)
+    networkx_elapsed = time.time() - start
+
+    start = time.time()
+    compact_graph = CompactGraph.from_networkx(dep_graph)
+    _, compact_levels, _ = gen_dependencies_level(compact_graph.without(removed))
+    compact_elapsed = time.time() - start
+
+    print('\n{0} artifacts, {1} edges: deep copy {2:.2f}s, compact view {3:.2f}s'.format(
+        nb_nodes, dep_graph.number_of_edges(), networkx_elapsed, compact_elapsed))
+    assert sorted([map(sorted, component) for component in networkx_levels]) == \
+        sorted([map(sorted, component) for component in compact_levels])
@@ -0,0 +1,24 @@
+import subprocess
+import sys
+import time
+
+import pytest
+
+# Import time of a fresh interpreter loading the module, the interpreter start up excluded
+IMPORT_BUDGET = 0.3
+
+
+def import_time(statement):
+    start = time.time()
+    subprocess.check_call([sys.executable, "-c", statement])
+    return time.time() - start
+
+
+@pytest.mark.parametrize("module", ["loktar.check", "loktar.dependency", "loktar.exit", "loktar.job",
+                                    "loktar.strategy_run"])
+def test_benchmark_import(module):
+    start_up = min(import_time("pass") for _ in range(3))
+    elapsed = min(import_time("import {}".format(module)) for _ in range(3)) - start_up
+
+    print("\n{0}: {1:.3f}s".format(module, elapsed))
+    assert elapsed < IMPORT_BUDGET
@@ -1,5 +1,10 @@
+import os
+import random
+import threading
+
 from github import GithubException
 from mock import MagicMock
+import networkx as nx
 import pytest
 from uuid import uuid4
 
@@ -139,12 +144,15 @@ class FakeElasticSearch(object):
         self.runs = list()
 
     def index(self, *args, **kwargs):
-        run_id = str(uuid4())
+        run_id = kwargs.get("id") or str(uuid4())
+        replaced = [run for run in self.runs if run["_id"] == run_id]
+        for run in replaced:
+            self.runs.remove(run)
         self.runs.append({
             u'_type': kwargs.get("doc_type"),
             u'_source': kwargs.get("body"),
             u'_index': kwargs.get("index"),
-            u'_version': 1,
+            u'_version': replaced[0]["_version"] + 1 if replaced else 1,
             u'found': True,
             u'_id': run_id
         })
@@ -166,6 +174,17 @@ class FakeElasticSearch(object):
         for run in self.runs:
             if run["_id"] == kwargs.get("id"):
                 return run
+        if kwargs.get("ignore") == 404:
+            return {u'_id': kwargs.get("id"), u'found': False}
+
+    def delete(self, *args, **kwargs):
+        for run in self.runs:
+            if run["_id"] == kwargs.get("id"):
+                if kwargs.get("version", run["_version"]) == run["_version"]:
+                    self.runs.remove(run)
+                    return {u'_id': run["_id"], u'found': True}
+                return {u'status': 409}
+        return {u'_id': kwargs.get("id"), u'found': False}
 
     def search(self, *args, **kwargs):
         return {
@@ -246,3 +265,49 @@ class FakeClient(object):
 @pytest.fixture
 def fake_docker_client():
     return FakeClient
+
+
+def recording_runner(package, type_build):
+    # Runs the builds of the executors. time.sleep is patched by the unit tests, in the build processes too
+    with open(package["record"], "a") as fd:
+        fd.write("start {0} {1}\n".format(package["pkg_name"], type_build))
+    threading.Event().wait(package.get("duration", 0.05))
+    with open(package["record"], "a") as fd:
+        fd.write("end {0} {1}\n".format(package["pkg_name"], type_build))
+    if package["pkg_name"] == "broken":
+        return "CITestFail: broken", 0
+    return None, package.get("duration", 0.05)
+
+
+def rooted_runner(package, type_build):
+    # Tells where the build ran
+    with open(os.path.join(package["artifact_root_location"], "built"), "a") as fd:
+        fd.write("{0} {1}\n".format(package["pkg_name"], type_build))
+    return None, 0
+
+
+def dying_runner(package, type_build):
+    # Like a build process killed by the OOM killer
+    os._exit(1)
+
+
+def random_dag(seed, nb_nodes, edge_probability):
+    rand = random.Random(seed)
+    nodes = ["artifact{0}".format(i) for i in xrange(nb_nodes)]
+    graph = nx.DiGraph()
+    graph.add_nodes_from(nodes)
+    # Edges always go from a lower index to a higher one, so the graph is acyclic
+    graph.add_edges_from((nodes[i], nodes[j])
+                         for i in xrange(nb_nodes)
+                         for j in xrange(i + 1, nb_nodes)
+                         if rand.random() < edge_probability)
+    return graph
+
+
+def packages(tmpdir, names, **extra):
+    record = str(tmpdir.join("record"))
+    return {name: dict({"pkg_name": name, "record": record}, **extra.get(name, {})) for name in names}
+
+
+def records(tmpdir):
+    return tmpdir.join("record").read().splitlines()
@@ -0,0 +1,95 @@
+import os
+
+import pytest
+
+from loktar.cache import RequirementsCache
+from loktar.dependency import get_artifact_requirements
+
+
+@pytest.fixture
+def repo(tmpdir):
+    artifact_dir = tmpdir.mkdir("some_dir").mkdir("artifact")
+    artifact_dir.join("requirements.txt").write("my_lib==1.0\nrequests==2.7.0\n")
+    artifact_dir.mkdir("app").join("test_requirements.txt").write("my_test_lib\n")
+    artifact_dir.join("Dockerfile").write("FROM my_base_image:42\n")
+    return tmpdir
+
+
+@pytest.fixture
+def artifacts():
+    return {
+        "artifact": {"artifact_name": "artifact", "artifact_dir": "some_dir",
+                     "dependencies_type": ["python_requirements", "dockerfile"]},
+        "my_lib": {"artifact_name": "my_lib", "dependencies_type": []},
+        "my_test_lib": {"artifact_name": "my_test_lib", "dependencies_type": []},
+        "my_base_image": {"artifact_name": "my_base_image", "dependencies_type": []}
+    }
+
+
+def test_requirements_cache_digest(repo, artifacts):
+    cache = RequirementsCache(str(repo.join("cache.json")))
+    basepath = str(repo.join("some_dir", "artifact"))
+
+    digest = cache.digest(artifacts["artifact"], basepath)
+    assert digest == cache.digest(artifacts["artifact"], basepath)
+
+    # A file that is not read by the plugins does not change the digest
+    repo.join("some_dir", "artifact", "setup.py").write("")
+    assert digest == cache.digest(artifacts["artifact"], basepath)
+
+    repo.join("some_dir", "artifact", "app", "test_requirements.txt").write("my_other_lib\n")
+    assert digest != cache.digest(artifacts["artifact"], basepath)
+
+
+def test_requirements_cache_digest_unknown_inputs(mocker, repo):
+    class CustomPlugin(object):
+        pass
+
+    mocker.patch("loktar.cache.find_plugin", return_value=CustomPlugin)
+    cache = RequirementsCache(str(repo.join("cache.json")))
+
+    assert cache.digest({"dependencies_type": ["custom"]}, str(repo)) is None
+
+
+def test_requirements_cache_persistence(repo):
+    cache_path = str(repo.join("cache", "requirements.json"))
+    cache = RequirementsCache(cache_path)
+    cache.set("artifact", "digest0", {"b", "a"})
+    cache.set("other_artifact", "digest1", set())
+    cache.save()
+
+    cache = RequirementsCache(cache_path)
+    assert cache.get("artifact", "digest0") == {"a", "b"}
+    assert cache.get("artifact", "digest1") is None
+    assert cache.get("unknown", "digest0") is None
+    assert (cache.hits, cache.misses) == (1, 2)
+    assert cache.entries() == {"artifact": {"digest": "digest0", "requirements": ["a", "b"]},
+                               "other_artifact": {"digest": "digest1", "requirements": []}}
+
+    cache.invalidate(["artifact"])
+    assert cache.entries().keys() == ["other_artifact"]
+    cache.invalidate()
+    assert cache.entries() == {}
+    cache.save()
+    assert RequirementsCache(cache_path).entries() == {}
+
+
+def test_requirements_cache_unreadable(repo):
+    repo.join("cache.json").write("{not json")
+    assert RequirementsCache(str(repo.join("cache.json"))).entries() == {}
+
+
+def test_get_artifact_requirements_cached(mocker, repo, artifacts):
+    cache = RequirementsCache(str(repo.join("cache.json")))
+    runner = mocker.patch("loktar.dependency.strategy_runner",
+                          side_effect=lambda *args, **kwargs: {"my_lib", "my_base_image", "requests"})
+
+    for _ in range(3):
+        requirements = get_artifact_requirements("artifact", artifacts, str(repo), cache=cache)
+        assert requirements == {"my_lib", "my_base_image"}
+    assert runner.call_count == 1
+
+    repo.join("some_dir", "artifact", "Dockerfile").write("FROM my_other_image\n")
+    get_artifact_requirements("artifact", artifacts, str(repo), cache=cache)
+    assert runner.call_count == 2
+    assert os.path.basename(runner.call_args[1]["basepath"]) == "artifact"
@@ -6,6 +6,7 @@ from loktar.cmd import cwd
 from loktar.cmd import exe
 from loktar.cmd import exec_command_with_retry
 from loktar.cmd import exec_with_output_capture
+from loktar.cmd import fabric_api
 from loktar.cmd import transfer_file
 
 
@@ -127,6 +128,11 @@ def test_cwd():
         assert path == "/tmp"
 
 
+def test_fabric_defaults():
+    assert fabric_api.env.warn_only is True
+    assert fabric_api.env.disable_known_hosts is True
+
+
 @pytest.mark.parametrize('remote', [True, False])
 def test_exec_with_output_capture(mocker, remote):
     mocker.patch("loktar.cmd.local", return_value=FakeFabricSuccess())
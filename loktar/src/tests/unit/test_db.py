@@ -2,6 +2,8 @@
 from conftest import FakeElasticSearch
 import pytest
 
+from loktar.db import ActiveRuns
+from loktar.db import BuildDurations
 from loktar.db import Run
 
 
@@ -34,3 +36,66 @@ def test_define_job_status_on_github_commit(mocker, mock_env):
     assert run.get_runs() == [{'awesome': 'payload0', 'foo': 'bar0'},
                               {'awesome': 'payload1', 'foo': 'bar1'},
                               {'awesome': 'payload2', 'foo': 'bar2'}]
+
+
+def test_build_durations(mocker):
+    mocker.patch("loktar.db.Elasticsearch", return_value=FakeElasticSearch())
+    mocker.patch("time.time", side_effect=xrange(100))
+
+    durations = BuildDurations()
+    for duration in (10, 20, 30):
+        durations.record("lib", "test", duration, commit_id="commit_id")
+    durations.record("lib", "artifact", 60)
+    durations.record("other_lib", "test", 5)
+    # The fake database does not sort the durations, the most recent are the first ones in elasticsearch
+    durations._db_connection.runs.reverse()
+
+    assert durations.estimates(["lib"], history=2) == {("lib", "test"): 25., ("lib", "artifact"): 60.}
+    assert durations.estimates(["lib", "other_lib"])[("other_lib", "test")] == 5.
+    assert durations.estimates([]) == {}
+
+
+def test_active_runs(mocker):
+    mocker.patch("loktar.db.Elasticsearch", return_value=FakeElasticSearch())
+
+    active_runs = ActiveRuns()
+    assert active_runs.active("feature") is None
+    first_run = active_runs.start("feature", "first_commit")
+    assert active_runs.superseding("feature", "first_commit") is None
+    assert active_runs.active("feature")["commit_id"] == "first_commit"
+    # The other components of the same commit do not supersede it
+    other_component = active_runs.start("feature", "first_commit")
+    assert active_runs.superseding("feature", "first_commit") is None
+    active_runs.finish("feature", first_run)
+    assert active_runs.active("feature")["run_id"] == other_component
+
+    second_run = active_runs.start("feature", "second_commit")
+    assert active_runs.superseding("feature", "first_commit") == "second_commit"
+    assert active_runs.superseding("feature", "second_commit") is None
+
+    # The superseded run does not remove the record of the new one
+    active_runs.finish("feature", other_component)
+    assert active_runs.active("feature")["run_id"] == second_run
+    active_runs.finish("feature", second_run)
+    assert active_runs.active("feature") is None
+
+
+def test_active_runs_older_commit_starts_last(mocker):
+    mocker.patch("loktar.db.Elasticsearch", return_value=FakeElasticSearch())
+
+    active_runs = ActiveRuns()
+    new_run = active_runs.start("feature", "new_commit", commit_time=200)
+    # A build restarted on an older commit does not supersede the run of the newer one
+    old_run = active_runs.start("feature", "old_commit", commit_time=100)
+    assert active_runs.active("feature")["run_id"] == new_run
+    assert active_runs.superseding("feature", "new_commit", commit_time=200) is None
+    assert active_runs.superseding("feature", "old_commit", commit_time=100) == "new_commit"
+
+    active_runs.finish("feature", old_run)
+    assert active_runs.active("feature")["run_id"] == new_run
+    # The other components of a commit keep its timestamp
+    other_component = active_runs.start("feature", "new_commit")
+    assert active_runs.active("feature")["commit_time"] == 200
+    assert active_runs.superseding("feature", "old_commit", commit_time=100) == "new_commit"
+    active_runs.finish("feature", other_component)
+    assert active_runs.active("feature") is None
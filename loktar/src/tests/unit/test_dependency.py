@@ -1,5 +1,10 @@
+import copy
+from itertools import product
 import os
+import random
+import sys
 
+from conftest import random_dag
 from mock import MagicMock
 import networkx as nx
 import pytest
@@ -10,7 +15,14 @@ from loktar.dependency import gen_dependencies_level
 from loktar.dependency import get_do_not_touch_artifacts
 from loktar.dependency import get_excluded_deps
 from loktar.dependency import get_artifact_requirements
+from loktar.dependency import get_artifacts_requirements
+from loktar.dependency import graph_edges
 from loktar.dependency import artifact_from_path
+from loktar.dependency import ArtifactPathIndex
+from loktar.dependency import artifacts_required_paths
+from loktar.dependency import reachable_nodes
+from loktar.dependency import required_paths
+from loktar.dependency import requirement_edges
 #from loktar.dependency import pull_request_information
 from loktar.job import build_params_to_context
 
@@ -71,62 +83,217 @@ def test_artifact_from_path(path, artifact, expected):
     assert artifact_from_path(path, artifacts) == expected
 
 
-# def test_get_artifact_requirements(mocker):
-#     l_repo_path = '/repo/'
-#     artifacts = {'my_biglibrary': {'artifact_dir': 'some_dir', 'artifact_name': 'my_biglibrary', 'type': 'library'},
-#                  'my_smalllibrary': {'artifact_name': 'my_smalllibrary', 'type': 'library'},
-#                  'artifact1': {'artifact_name': 'artifact1', 'artifact_dir': 'some_artifact_dir'},
-#                  'artifact2': {'artifact_name': 'artifact2'},
-#                  'artifact3': {'artifact_name': 'artifact3'}}
-#
-#     mocker.patch('loktar.dependency.strategy_runner', side_effect=strategy_runner_deps)
-#
-#     artifact_name = 'artifact1'
-#
-#     requirements = get_artifact_requirements(artifact_name,
-#                                              artifacts,
-#                                              l_repo_path)
-#     assert requirements == {'my_biglibrary', 'my_smalllibrary'}
-#
-#
-# @pytest.mark.parametrize('exclude', [True, False])
-# def test_dependency_graph_from_modified_artifact(mocker, exclude):
-#     # We take the following example:
-#     #             _ _ _ _ _ _ _ _ _ _ _ _ artifact1
-#     #           /                         /
-#     #          |          my_smalllibrary
-#     #          |         /                \
-#     #     (my_biglibrary)                 (artifact2)
-#     #                    \
-#     #                     (artifact3)
-#     #
-#     # artifacts surrounded by parentheses were modified. If my_biglibrary's dependencies are excluded, then
-#     # there should be no link between artifact2 and my_biglibrary, ie the graph is {my_biglibrary -> artifact3,
-#     # artifact2}.
-#     # However if my_biglibrary's dependencies are _not_ excluded, the graph should be the same as above.
-#
-#     modified_artifact = {'my_biglibrary', 'artifact2', 'artifact3'}
-#     artifacts = {'my_biglibrary': {'artifact_dir': 'some_dir', 'artifact_name': 'my_biglibrary'},
-#                  'my_smalllibrary': {'artifact_name': 'my_smalllibrary'},
-#                  'artifact1': {'artifact_name': 'artifact1', 'artifact_dir': 'some_artifact_dir'},
-#                  'artifact2': {'artifact_name': 'artifact2'},
-#                  'artifact3': {'artifact_name': 'artifact3'}}
-#     exclude_dep_from_artifact = {'my_biglibrary'} if exclude else None
-#
-#     mocker.patch('loktar.dependency.strategy_runner', side_effect=strategy_runner_deps)
-#
-#     edges_list = dependency_graph_from_modified_artifacts(repo_path,
-#                                                           artifacts,
-#                                                           modified_artifact,
-#                                                           exclude_dep_from_artifact).edges()
-#     if exclude:
-#         assert set(edges_list) == {('my_biglibrary', 'artifact3')}
-#     else:
-#         assert set(edges_list) == {('my_biglibrary', 'artifact3'), ('my_biglibrary', 'my_smalllibrary'),
-#                                    ('my_smalllibrary', 'artifact1'), ('my_smalllibrary', 'artifact2'),
-#                                    ('my_biglibrary', 'artifact1')}
-#
-#
+def test_artifact_path_index():
+    artifacts = {'my_biglibrary': {'artifact_dir': 'some_dir', 'artifact_name': 'my_biglibrary'},
+                 'my_smalllibrary': {'artifact_name': 'my_smalllibrary'},
+                 'nested': {'artifact_dir': 'my_smalllibrary/plugins', 'artifact_name': 'nested'},
+                 'artifact1': {'artifact_name': 'artifact1', 'artifact_dir': 'some_artifact_dir/'}}
+    path_index = ArtifactPathIndex(artifacts)
+
+    paths = ['some_dir/my_biglibrary/setup.py',
+             'some_dir/my_biglibrary/setup.py',
+             'some_dir/README.md',
+             'my_smalllibrary/plugins/nested/Makefile',
+             'my_smalllibrary/plugins/__init__.py',
+             'some_artifact_dir/artifact1']
+
+    assert path_index.classify(paths) == {'some_dir/my_biglibrary/setup.py': 'my_biglibrary',
+                                          'some_dir/README.md': None,
+                                          'my_smalllibrary/plugins/nested/Makefile': 'nested',
+                                          'my_smalllibrary/plugins/__init__.py': 'my_smalllibrary',
+                                          'some_artifact_dir/artifact1': 'artifact1'}
+    assert path_index.artifacts_from_paths(paths) == {'my_biglibrary', 'nested', 'my_smalllibrary', 'artifact1'}
+    assert path_index.artifacts_from_paths([]) == set()
+    assert artifact_from_path('some_dir/my_biglibrary/setup.py', path_index) == 'my_biglibrary'
+    assert artifact_from_path('some_dir/README.md', path_index) is None
+
+
+@pytest.mark.parametrize('workers,backend', [(1, 'threading'), (3, 'threading'), (2, 'multiprocessing')])
+def test_get_artifacts_requirements_parallel(tmpdir, workers, backend):
+    artifacts = {}
+    for i in xrange(10):
+        artifact_name = 'artifact{0}'.format(i)
+        artifacts[artifact_name] = {'artifact_name': artifact_name, 'dependencies_type': ['python_requirements']}
+        tmpdir.mkdir(artifact_name).join('requirements.txt').write(
+            '\n'.join('artifact{0}'.format(j) for j in xrange(i)) + '\nrequests==2.7.0\n')
+
+    requirements = get_artifacts_requirements(artifacts.keys(), artifacts, str(tmpdir),
+                                              workers=workers,
+                                              backend=backend)
+
+    assert requirements == {'artifact{0}'.format(i): {'artifact{0}'.format(j) for j in xrange(i)}
+                            for i in xrange(10)}
+
+
+def reference_incomplete_paths(dep_graph, do_not_touch_artifacts):
+    # Former path enumeration of get_do_not_touch_artifacts, kept as a reference for the regression test
+    null_node = '__null__'
+    augmented_dep_graph = copy.deepcopy(dep_graph)
+    augmented_dep_graph.add_edges_from([(null_node, node) for node in augmented_dep_graph.nodes()])
+    do_not_touch_artifacts = do_not_touch_artifacts | {null_node}
+
+    have_incomplete_path = set()
+    for artifact_from, artifact_to in product(do_not_touch_artifacts, do_not_touch_artifacts):
+        paths = nx.all_simple_paths(augmented_dep_graph, artifact_from, artifact_to)
+        paths = filter(lambda path: not (len(path) == 2 and null_node in path), paths)
+        for path in paths:
+            if set(path) - do_not_touch_artifacts:
+                have_incomplete_path |= {artifact_to}
+    return have_incomplete_path
+
+
+def test_reachable_nodes():
+    graph = nx.DiGraph([('A', 'B'), ('B', 'C'), ('A', 'E'), ('D', 'C')])
+
+    assert reachable_nodes(graph, {'A'}) == {'B', 'C', 'E'}
+    assert reachable_nodes(graph, {'B', 'D'}) == {'C'}
+    assert reachable_nodes(graph, {'C', 'unknown'}) == set()
+    assert reachable_nodes(graph, set()) == set()
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_reachable_nodes_matches_path_enumeration(seed):
+    graph = random_dag(seed, 9, 0.3)
+    do_not_touch_artifacts = set(random.Random(seed).sample(graph.nodes(), 6))
+
+    have_incomplete_path = reachable_nodes(graph, set(graph.nodes()) - do_not_touch_artifacts)
+    have_incomplete_path &= do_not_touch_artifacts
+
+    assert have_incomplete_path == reference_incomplete_paths(graph, do_not_touch_artifacts)
+
+
+def reference_graph_edges(artifacts_requirements, modified_artifacts, exclude_dep_from_artifacts):
+    # Former recursive graph_edges, kept as a reference for the regression test
+    if not modified_artifacts:
+        return []
+
+    edges_list = []
+    next_modified_artifacts = set()
+    artifacts_done = set()
+
+    for artifact_name in artifacts_requirements:
+        requirements = artifacts_requirements[artifact_name]
+        modified_requirements = (requirements & modified_artifacts - exclude_dep_from_artifacts
+                                 if artifact_name not in modified_artifacts
+                                 else requirements & modified_artifacts)
+
+        if modified_requirements:
+            edges_list.extend(map(lambda x: (x, artifact_name), modified_requirements))
+            artifacts_done |= modified_requirements
+            next_modified_artifacts |= {artifact_name}
+
+    for artifact_name in artifacts_done:
+        artifacts_requirements.pop(artifact_name, None)
+
+    edges_list.extend(reference_graph_edges(artifacts_requirements, next_modified_artifacts,
+                                            exclude_dep_from_artifacts))
+    return edges_list
+
+
+@pytest.mark.parametrize('seed', range(50))
+def test_graph_edges_matches_reference(seed):
+    rand = random.Random(seed)
+    nodes = ['artifact{0}'.format(i) for i in xrange(30)]
+    # Requirements may be cyclic and may not be artifacts
+    artifacts_requirements = {node: set(rand.sample(nodes + ['external'], rand.randint(1, 4)))
+                              for node in rand.sample(nodes, 20)}
+    modified_artifacts = set(rand.sample(nodes, rand.randint(0, 5)))
+    exclude_dep_from_artifacts = set(rand.sample(nodes, rand.randint(0, 10)))
+    expected = reference_graph_edges(copy.deepcopy(artifacts_requirements), modified_artifacts,
+                                     exclude_dep_from_artifacts)
+
+    edges = graph_edges(artifacts_requirements, modified_artifacts, exclude_dep_from_artifacts)
+
+    assert sorted(edges) == sorted(expected)
+
+
+def test_graph_edges_deep_chain():
+    depth = 5 * sys.getrecursionlimit()
+    artifacts_requirements = {'artifact{0}'.format(i + 1): {'artifact{0}'.format(i)} for i in xrange(depth)}
+    requirements_copy = copy.deepcopy(artifacts_requirements)
+
+    edges = graph_edges(artifacts_requirements, {'artifact0'}, set())
+
+    assert len(edges) == depth
+    assert edges[-1] == ('artifact{0}'.format(depth - 1), 'artifact{0}'.format(depth))
+    assert artifacts_requirements == requirements_copy
+
+
+def test_required_paths():
+    artifacts = {
+        "lib": {"artifact_name": "lib", "artifact_dir": "libs"},
+        "other_lib": {"artifact_name": "other_lib"},
+        "service": {"artifact_name": "service"},
+        "unrelated": {"artifact_name": "unrelated"}
+    }
+    dependencies = [("lib", "other_lib"), ("other_lib", "service"), ("external", "service"), ("lib", "unrelated")]
+
+    assert required_paths("service", artifacts, dependencies) == ["config.json", "libs/lib", "other_lib", "service"]
+    assert required_paths("lib", artifacts, dependencies) == ["config.json", "libs/lib"]
+    assert requirement_edges({"service": {"other_lib", "external"}, "other_lib": {"lib"}, "unrelated": {"lib"},
+                              "lib": set()}) == sorted(dependencies)
+    assert artifacts_required_paths(["service", "unrelated"], artifacts,
+                                    {"service": {"other_lib"}, "other_lib": {"lib"}, "unrelated": {"lib"}}) == {
+        "service": ["config.json", "libs/lib", "other_lib", "service"],
+        "unrelated": ["config.json", "libs/lib", "unrelated"]}
+
+
+def test_get_artifact_requirements(mocker):
+    l_repo_path = '/repo/'
+    artifacts = {'my_biglibrary': {'artifact_dir': 'some_dir', 'artifact_name': 'my_biglibrary', 'type': 'library'},
+                 'my_smalllibrary': {'artifact_name': 'my_smalllibrary', 'type': 'library'},
+                 'artifact1': {'artifact_name': 'artifact1', 'artifact_dir': 'some_artifact_dir'},
+                 'artifact2': {'artifact_name': 'artifact2'},
+                 'artifact3': {'artifact_name': 'artifact3'}}
+
+    mocker.patch('loktar.dependency.strategy_runner', side_effect=strategy_runner_deps)
+
+    artifact_name = 'artifact1'
+
+    requirements = get_artifact_requirements(artifact_name,
+                                             artifacts,
+                                             l_repo_path)
+    assert requirements == {'my_biglibrary', 'my_smalllibrary'}
+
+
+@pytest.mark.parametrize('exclude', [True, False])
+def test_dependency_graph_from_modified_artifact(mocker, exclude):
+    # We take the following example:
+    #             _ _ _ _ _ _ _ _ _ _ _ _ artifact1
+    #           /                         /
+    #          |          my_smalllibrary
+    #          |         /                \
+    #     (my_biglibrary)                 (artifact2)
+    #                    \
+    #                     (artifact3)
+    #
+    # artifacts surrounded by parentheses were modified. If my_biglibrary's dependencies are excluded, then
+    # there should be no link between artifact2 and my_biglibrary, ie the graph is {my_biglibrary -> artifact3,
+    # artifact2}.
+    # However if my_biglibrary's dependencies are _not_ excluded, the graph should be the same as above.
+
+    modified_artifact = {'my_biglibrary', 'artifact2', 'artifact3'}
+    artifacts = {'my_biglibrary': {'artifact_dir': 'some_dir', 'artifact_name': 'my_biglibrary'},
+                 'my_smalllibrary': {'artifact_name': 'my_smalllibrary'},
+                 'artifact1': {'artifact_name': 'artifact1', 'artifact_dir': 'some_artifact_dir'},
+                 'artifact2': {'artifact_name': 'artifact2'},
+                 'artifact3': {'artifact_name': 'artifact3'}}
+    exclude_dep_from_artifact = {'my_biglibrary'} if exclude else None
+
+    mocker.patch('loktar.dependency.strategy_runner', side_effect=strategy_runner_deps)
+
+    edges_list = dependency_graph_from_modified_artifacts(repo_path,
+                                                          artifacts,
+                                                          modified_artifact,
+                                                          exclude_dep_from_artifact).edges()
+    if exclude:
+        assert set(edges_list) == {('my_biglibrary', 'artifact3')}
+    else:
+        assert set(edges_list) == {('my_biglibrary', 'artifact3'), ('my_biglibrary', 'my_smalllibrary'),
+                                   ('my_smalllibrary', 'artifact1'), ('my_smalllibrary', 'artifact2'),
+                                   ('my_biglibrary', 'artifact1')}
+
+
 # @pytest.mark.parametrize('cycle', [True, False])
 # @pytest.mark.parametrize('draw', [True, False])
 # def test_gen_dependencies_level(mocker, cycle, draw):
@@ -185,68 +352,67 @@ def test_artifact_from_path(path, artifact, expected):
 #     assert exclude_dep == {'A'} if exclude else exclude_dep == set()
 #
 #
-# @pytest.mark.parametrize('include_root', [True, False])
-# @pytest.mark.parametrize('rebuild', [True, False])
-# def test_get_do_not_touch_artifacts(include_root, rebuild):
-#     class Status(object):
-#         def __init__(self, artifact, state, status_type='some type'):
-#             self.raw_data = {'context': build_params_to_context(artifact, status_type)}
-#             self.state = state
-#
-#     class FakePullRequest(object):
-#         def __init__(self, *args, **kwargs):
-#             class SHA(object):
-#                 @property
-#                 def sha(self):
-#                     return 'sha'
-#
-#             self.head = SHA()
-#
-#     id_pr = 42
-#
-#     scm = MagicMock()
-#     if include_root:
-#         green_builds = {'A', 'B', 'C', 'D'}
-#     else:
-#         green_builds = {'B', 'C', 'D'}
-#     red_builds = {'E'}
-#
-#     statuses = [Status(artifact, state)
-#                 for artifact, state in (zip(green_builds, ['success'] * len(green_builds)) +
-#                                         zip(red_builds, ['error'] * len(red_builds)))]
-#
-#     last_commit = MagicMock()
-#     last_commit.sha = 'sha'
-#     # This excludes C
-#     last_commit.files = [MagicMock(filename='C')]
-#     # last_status_commit = MagicMock()
-#     scm.get_last_commits_from_pull_request.return_value = [last_commit]
-#     scm.get_last_statuses_from_pull_request.return_value = last_commit, statuses
-#     scm.get_pull_request.return_value = FakePullRequest()
-#
-#     modified_artifact = {'A': {}, 'B': {}, 'C': {}, 'D': {}, 'E': {}}
-#     # Dependency graph used for this test:
-#     #
-#     # [A - red or green / unmodified]____[B - green / unmodified]____[C - green / modified]____[D - green / unmodified]
-#     #  \___[E - red / unmodified]
-#     edges = [('A', 'B'),
-#              ('B', 'C'),
-#              ('C', 'D'),
-#              ('A', 'E')]
-#
-#     dep_graph = nx.DiGraph(edges)
-#     dep_graph.add_nodes_from(modified_artifact)
-#
-#     # Here we should have do_not_touch_artifact set to {'A', 'B', 'D'} before going through the path check
-#     # Since C is between B and D, D will be excluded and only A and B remain
-#     do_not_touch_artifact = get_do_not_touch_artifacts(id_pr, modified_artifact, scm, dep_graph, rebuild)
-#     if include_root and not rebuild:
-#         assert do_not_touch_artifact == {'A', 'B'}
-#     elif include_root and rebuild:
-#         # In this case there are no modified artifact because there are
-#         # no new commits. Since the root is included, this means A has
-#         # a green build, and so do B, C, D. Since A -> B -> C -> D,
-#         # we can safely ignore all these artifacts.
-#         assert do_not_touch_artifact == {'A', 'B', 'C', 'D'}
-#     else:
-#         assert do_not_touch_artifact == set()
+@pytest.mark.parametrize('include_root', [True, False])
+@pytest.mark.parametrize('rebuild', [True, False])
+def test_get_do_not_touch_artifacts(include_root, rebuild):
+    class Status(object):
+        def __init__(self, artifact, state, status_type='some type'):
+            self.raw_data = {'context': build_params_to_context(artifact, status_type)}
+            self.state = state
+
+    class FakePullRequest(object):
+        def __init__(self, *args, **kwargs):
+            class SHA(object):
+                @property
+                def sha(self):
+                    return 'sha'
+
+            self.head = SHA()
+
+    id_pr = 42
+
+    scm = MagicMock()
+    if include_root:
+        green_builds = {'A', 'B', 'C', 'D'}
+    else:
+        green_builds = {'B', 'C', 'D'}
+    red_builds = {'E'}
+
+    statuses = [Status(artifact, 'success') for artifact in green_builds]
+    statuses.extend(Status(artifact, 'error') for artifact in red_builds)
+
+    last_commit = MagicMock()
+    last_commit.sha = 'sha'
+    # This excludes C
+    last_commit.files = [MagicMock(filename='C')]
+    # last_status_commit = MagicMock()
+    scm.get_last_commits_from_pull_request.return_value = [last_commit]
+    scm.get_last_statuses_from_pull_request.return_value = last_commit, statuses
+    scm.get_pull_request.return_value = FakePullRequest()
+
+    modified_artifact = {'A': {}, 'B': {}, 'C': {}, 'D': {}, 'E': {}}
+    # Dependency graph used for this test:
+    #
+    # [A - red or green / unmodified]____[B - green / unmodified]____[C - green / modified]____[D - green / unmodified]
+    #  \___[E - red / unmodified]
+    edges = [('A', 'B'),
+             ('B', 'C'),
+             ('C', 'D'),
+             ('A', 'E')]
+
+    dep_graph = nx.DiGraph(edges)
+    dep_graph.add_nodes_from(modified_artifact)
+
+    # Here we should have do_not_touch_artifact set to {'A', 'B', 'D'} before going through the path check
+    # Since C is between B and D, D will be excluded and only A and B remain
+    do_not_touch_artifact = get_do_not_touch_artifacts(id_pr, modified_artifact, scm, dep_graph, rebuild)
+    if include_root and not rebuild:
+        assert do_not_touch_artifact == {'A', 'B'}
+    elif include_root and rebuild:
+        # In this case there are no modified artifact because there are
+        # no new commits. Since the root is included, this means A has
+        # a green build, and so do B, C, D. Since A -> B -> C -> D,
+        # we can safely ignore all these artifacts.
+        assert do_not_touch_artifact == {'A', 'B', 'C', 'D'}
+    else:
+        assert do_not_touch_artifact == set()
@@ -0,0 +1,321 @@
+import threading
+import time
+
+from conftest import dying_runner
+from conftest import packages
+from conftest import recording_runner
+from conftest import records
+from conftest import rooted_runner
+from mock import MagicMock
+from mockredis import mock_strict_redis_client
+import pytest
+
+from loktar.distributed import DistributedExecutor
+from loktar.distributed import get_broker
+from loktar.distributed import LocalBroker
+from loktar.distributed import RedisBroker
+from loktar.distributed import Worker
+from loktar.exceptions import CIJobFail
+from loktar.executor import get_executor
+from loktar.job import build_units
+from loktar.job import level_units
+
+
+@pytest.fixture
+def workers():
+    stop = threading.Event()
+    threads = []
+
+    def start(broker, count, runner=recording_runner):
+        for index in range(count):
+            worker = Worker(broker, worker_id="worker-{0}".format(index), runner=runner, heartbeat_interval=0.05,
+                            poll_timeout=0.05)
+            thread = threading.Thread(target=worker.serve, args=(stop,))
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+
+    yield start
+    stop.set()
+    for thread in threads:
+        thread.join(10)
+
+
+def test_distributed_executor(tmpdir, workers):
+    broker = LocalBroker()
+    workers(broker, 2)
+    units = build_units([["lib", "other_lib"], ["service"]], ["test", "artifact"], [("lib", "service")])
+    executor = DistributedExecutor(broker, packages(tmpdir, ["lib", "other_lib", "service"]), repo_path="/repo",
+                                   poll_timeout=0.05)
+
+    durations_db = MagicMock()
+
+    durations = executor.run(units, durations_db=durations_db, commit_id="commit_id")
+
+    assert sorted(durations) == sorted(units)
+    assert durations_db.record.call_count == len(units)
+    assert set(executor.workers.values()) <= {"worker-0", "worker-1"}
+    lines = records(tmpdir)
+    for unit, previous_units in units.iteritems():
+        for previous_unit in previous_units:
+            assert lines.index("end {0} {1}".format(*previous_unit)) < lines.index("start {0} {1}".format(*unit))
+    assert broker.workers() == ["worker-0", "worker-1"]
+
+
+def test_distributed_executor_fail_fast(tmpdir, workers):
+    broker = LocalBroker()
+    workers(broker, 2)
+    executor = DistributedExecutor(broker, packages(tmpdir, ["broken", "slow", "service"], slow={"duration": 30}),
+                                   poll_timeout=0.05)
+
+    start = time.time()
+    with pytest.raises(CIJobFail):
+        executor.run(build_units([["broken", "slow"], ["service"]], ["artifactmaster"], [("broken", "service")]))
+
+    # The worker running the slow build stops it, and the service is never published
+    assert time.time() - start < 10
+    threading.Event().wait(0.3)
+    assert "end slow artifactmaster" not in records(tmpdir)
+    assert "start service artifactmaster" not in records(tmpdir)
+
+
+def test_distributed_executor_cancel(tmpdir, workers):
+    broker = LocalBroker()
+    workers(broker, 1)
+    executor = DistributedExecutor(broker, packages(tmpdir, ["slow"], slow={"duration": 30}), poll_timeout=0.05)
+    canceller = threading.Timer(0.2, executor.cancel, args=("new commit",))
+    canceller.start()
+
+    with pytest.raises(CIJobFail) as excinfo:
+        executor.run(level_units([["slow"]], ["test"]))
+
+    assert "new commit" in str(excinfo.value)
+
+
+def test_distributed_executor_superseded(tmpdir, workers):
+    broker = LocalBroker()
+    workers(broker, 1)
+    executor = DistributedExecutor(broker, packages(tmpdir, ["slow"], slow={"duration": 30}), poll_timeout=0.05)
+
+    with pytest.raises(CIJobFail) as excinfo:
+        executor.run(level_units([["slow"]], ["test"]), superseded=MagicMock(return_value="new_commit"))
+
+    assert "new_commit" in str(excinfo.value)
+
+
+def test_distributed_executor_lost_worker(tmpdir, workers):
+    broker = LocalBroker(lease_timeout=0.2)
+    # A worker takes the build and dies before running it
+    lost_worker = threading.Thread(target=broker.pull, args=("lost",), kwargs={"timeout": 5})
+    lost_worker.start()
+    executor = DistributedExecutor(broker, packages(tmpdir, ["lib"]), poll_timeout=0.05)
+    threading.Timer(0.1, workers, args=(broker, 1)).start()
+
+    durations = executor.run(level_units([["lib"]], ["test"]))
+
+    lost_worker.join()
+    assert executor.workers == {("lib", "test"): "worker-0"}
+    assert list(durations) == [("lib", "test")]
+
+
+def test_worker_crash(tmpdir):
+    broker = LocalBroker()
+    broker.publish({"id": "task", "run_id": "run", "unit": ["lib", "test"], "package": {"pkg_name": "lib"}})
+
+    assert Worker(broker, runner=dying_runner, heartbeat_interval=0.05, poll_timeout=0).run_once()
+    assert not Worker(broker, runner=dying_runner, poll_timeout=0).run_once()
+
+    result, = broker.results("run")
+    assert result["error"] == "The build process exited with 1"
+
+
+def test_worker_sparse(tmpdir):
+    broker = LocalBroker()
+    executor = DistributedExecutor(broker, {"lib": {"pkg_name": "lib"}}, repo_path="/repo")
+    broker.publish(executor.task(("lib", "test"), "run", 0, 0, commit_id="commit_id",
+                                 paths=["config.json", "lib"]))
+    workspaces = MagicMock()
+    workspaces.lease.return_value.path = str(tmpdir)
+
+    assert Worker(broker, runner=rooted_runner, heartbeat_interval=0.05, poll_timeout=0,
+                  workspaces=workspaces).run_once()
+
+    workspaces.lease.assert_called_once_with("commit_id", paths=["config.json", "lib"])
+    assert workspaces.lease.return_value.release.call_count == 1
+    assert tmpdir.join("built").read() == "lib test\n"
+    result, = broker.results("run")
+    assert result["error"] is None
+
+
+def test_local_broker_lease():
+    broker = LocalBroker(lease_timeout=0.1)
+    broker.publish({"id": "first", "run_id": "run"})
+    broker.publish({"id": "second", "run_id": "run"})
+
+    assert broker.pull("worker")["id"] == "first"
+    broker.heartbeat("worker", "first")
+    assert broker.requeue_expired() == []
+    threading.Event().wait(0.15)
+    assert broker.requeue_expired() == ["first"]
+    # The requeued builds come first
+    assert broker.pull("other")["id"] == "first"
+
+    broker.cancel("run")
+    assert broker.pull("other") is None
+    assert broker.cancelled("run")
+
+
+def test_local_broker_cancelled_ttl():
+    broker = LocalBroker(cancelled_ttl=0.1)
+    broker.cancel("old")
+    threading.Event().wait(0.15)
+    broker.cancel("run")
+
+    assert not broker.cancelled("old")
+    assert broker.cancelled("run")
+    assert broker._cancelled.keys() == ["run"]
+
+
+def test_local_broker_priority_classes():
+    broker = LocalBroker()
+    broker.publish({"id": "old_pr", "run_id": "pr"})
+    broker.publish({"id": "new_pr", "run_id": "pr", "priority_class": "pull_request"})
+    broker.publish({"id": "release", "run_id": "master", "priority_class": "master"})
+
+    assert broker.pull_above("worker", "master") is None
+    assert broker.pull_above("worker", "pull_request")["id"] == "release"
+    assert broker.pull("worker")["id"] == "old_pr"
+    broker.requeue("old_pr")
+    assert [broker.pull("worker")["id"] for _ in range(2)] == ["old_pr", "new_pr"]
+
+
+@pytest.mark.parametrize("broker", [LocalBroker(), RedisBroker(mock_strict_redis_client(), namespace="test")])
+def test_broker_run_age(broker):
+    broker.publish({"id": "new-000000", "run_id": "new", "run_start": 20})
+    broker.publish({"id": "old-000000", "run_id": "old", "run_start": 10})
+    broker.publish({"id": "old-000001", "run_id": "old", "run_start": 10})
+    broker.publish({"id": "release", "run_id": "master", "run_start": 30, "priority_class": "master"})
+
+    # The builds of the oldest run come first in their class, a requeued build gets its place back
+    assert [broker.pull("worker")["id"] for _ in range(2)] == ["release", "old-000000"]
+    broker.requeue("old-000000")
+    assert [broker.pull("worker")["id"] for _ in range(3)] == ["old-000000", "old-000001", "new-000000"]
+    assert broker.pull("worker") is None
+
+
+@pytest.mark.parametrize("broker", [LocalBroker(), RedisBroker(mock_strict_redis_client(), namespace="test")])
+def test_broker_run_size(mocker, broker):
+    mocker.patch.dict("loktar.distributed.DISTRIBUTED", {"pull_request_order": "size"})
+    broker.publish({"id": "big-000000", "run_id": "big", "run_start": 10, "run_size": 30})
+    broker.publish({"id": "small-000000", "run_id": "small", "run_start": 20, "run_size": 2})
+    broker.publish({"id": "release", "run_id": "master", "run_start": 30, "run_size": 50, "priority_class": "master"})
+
+    # The master builds still come by age, before the builds of the smallest pull request run
+    assert [broker.pull("worker")["id"] for _ in range(3)] == ["release", "small-000000", "big-000000"]
+
+
+def test_worker_preemption(tmpdir):
+    broker = LocalBroker()
+    record = str(tmpdir.join("record"))
+    broker.publish({"id": "pr", "run_id": "pr", "unit": ["slow", "test"], "priority_class": "pull_request",
+                    "package": {"pkg_name": "slow", "record": record, "duration": 0.3}})
+    threading.Timer(0.1, broker.publish, args=({"id": "release", "run_id": "master",
+                                                "unit": ["lib", "artifactmaster"], "priority_class": "master",
+                                                "package": {"pkg_name": "lib", "record": record}},)).start()
+    worker = Worker(broker, runner=recording_runner, heartbeat_interval=0.02, poll_timeout=0, preempt=True)
+
+    assert worker.run_once()
+    assert worker.run_once()
+
+    # The release build runs while the pull request build waits, then the pull request build starts again
+    assert records(tmpdir) == ["start slow test", "start lib artifactmaster", "end lib artifactmaster",
+                               "start slow test", "end slow test"]
+    assert [result["task_id"] for result in broker.results("master") + broker.results("pr")] == ["release", "pr"]
+
+
+def test_distributed_executor_priority_class():
+    broker = LocalBroker()
+    units = {("lib", "test"): set(), ("release", "artifactmaster"): set()}
+
+    with pytest.raises(ValueError):
+        DistributedExecutor(broker, {}, priority_class="urgent")
+    published = []
+    broker.publish = published.append
+    executor = DistributedExecutor(broker, {"lib": {"pkg_name": "lib"}, "release": {"pkg_name": "release"}},
+                                   poll_timeout=0.05)
+    threading.Timer(0.1, executor.cancel).start()
+    with pytest.raises(CIJobFail):
+        executor.run(units)
+
+    assert sorted(task["priority_class"] for task in published) == ["master", "pull_request"]
+
+
+def test_redis_broker():
+    broker = RedisBroker(mock_strict_redis_client(), namespace="test", lease_timeout=60)
+    broker.publish({"id": "first", "run_id": "run", "run_start": 10, "unit": ["lib", "test"]})
+    broker.publish({"id": "second", "run_id": "run", "run_start": 10, "unit": ["lib", "artifact"]})
+
+    task = broker.pull("worker")
+    assert task == {"id": "first", "run_id": "run", "run_start": 10, "unit": ["lib", "test"]}
+    broker.heartbeat("worker", "first")
+    assert broker.workers() == ["worker"]
+    assert broker.requeue_expired() == []
+
+    broker.report({"run_id": "run", "task_id": "first", "error": None})
+    assert broker.results("run") == [{"run_id": "run", "task_id": "first", "error": None}]
+    assert broker.results("run") == []
+    assert broker.client.lrange("test:processing", 0, -1) == []
+
+    broker.cancel("run")
+    assert broker.pull("worker") is None
+    assert broker.client.hgetall("test:tasks") == {}
+
+
+def test_redis_broker_forget_cancelled():
+    broker = RedisBroker(mock_strict_redis_client(), namespace="test", lease_timeout=60, cancelled_ttl=120)
+    broker.publish({"id": "first", "run_id": "run"})
+    broker.publish({"id": "other", "run_id": "other_run"})
+
+    broker.cancel("run")
+    broker.forget("run")
+
+    assert broker.cancelled("run")
+    assert 0 < broker.client.ttl("test:cancelled:run") <= 120
+    assert broker.client.hkeys("test:tasks") == ["other"]
+    assert broker.client.zrange("test:ready:pull_request", 0, -1) == ["other"]
+
+
+def test_redis_broker_requeue():
+    broker = RedisBroker(mock_strict_redis_client(), namespace="test", lease_timeout=0)
+    broker.publish({"id": "first", "run_id": "run"})
+    broker.publish({"id": "second", "run_id": "run"})
+
+    assert broker.pull("lost")["id"] == "first"
+    assert broker.requeue_expired() == ["first"]
+    assert broker.requeue_expired() == []
+    assert broker.pull("worker")["id"] == "first"
+    assert broker.pull("worker")["id"] == "second"
+
+
+def test_redis_broker_priority_classes():
+    broker = RedisBroker(mock_strict_redis_client(), namespace="test", lease_timeout=60)
+    broker.publish({"id": "pr", "run_id": "pr"})
+    broker.publish({"id": "release", "run_id": "master", "priority_class": "master"})
+
+    assert broker.pull_above("worker", "master") is None
+    assert broker.pull("worker")["id"] == "release"
+    broker.requeue("release")
+    assert broker.client.lrange("test:processing", 0, -1) == []
+    assert broker.pull_above("worker", "pull_request")["id"] == "release"
+    assert broker.pull("worker")["id"] == "pr"
+
+
+def test_get_broker():
+    assert isinstance(get_broker("local"), LocalBroker)
+    assert isinstance(get_broker("redis", client=mock_strict_redis_client()), RedisBroker)
+    with pytest.raises(ValueError):
+        get_broker("rabbitmq")
+
+
+def test_get_executor():
+    assert isinstance(get_executor("distributed", broker=LocalBroker(), packages={}), DistributedExecutor)
@@ -1,8 +1,11 @@
+from mock import MagicMock
 import pytest
 
+from loktar.environment import artifact_archive
 from loktar.environment import get_config
 from loktar.environment import prepare_test_env
 from loktar.environment import PrepareEnvFail
+from loktar.job import get_job_params
 
 
 @pytest.mark.parametrize("full", [False, True])
@@ -44,3 +47,85 @@ def test_prepare_test_env_prepare_env_fail(mocker, branch, when_to_fail):
     mocker.patch("loktar.environment.exec_command_with_retry", side_effect=fake_exec_command_with_retry)
     with pytest.raises(PrepareEnvFail):
         prepare_test_env(branch)
+
+
+@pytest.mark.parametrize("fail", [False, True])
+def test_prepare_test_env_workspace_pool(mocker, fail):
+    mocker.patch("loktar.environment.os")
+    mocker.patch("loktar.environment.lcd")
+    mocker.patch("loktar.environment.local")
+    commands = []
+
+    def fake_exec_command_with_retry(cmd, *args, **kwargs):
+        commands.append(cmd)
+        return not (fail and cmd.startswith("git merge"))
+
+    mocker.patch("loktar.environment.exec_command_with_retry", side_effect=fake_exec_command_with_retry)
+    workspaces = MagicMock()
+
+    if fail:
+        with pytest.raises(PrepareEnvFail):
+            prepare_test_env("foobar", unique_name_dir="job", workspaces=workspaces)
+    else:
+        assert prepare_test_env("foobar", unique_name_dir="job", workspaces=workspaces) == "/tmp/ci/job.tar.gz"
+
+    workspaces.lease.assert_called_once_with("foobar", path="/tmp/ci/job")
+    assert workspaces.lease.return_value.release.called
+    # The mirror of the pool is already up to date
+    assert not [cmd for cmd in commands if cmd.startswith("git clone") or cmd.startswith("git fetch")]
+    assert "git merge --no-ff --no-edit master" in commands
+    if not fail:
+        assert commands[-1] == "tar -czf job.tar.gz --exclude=job/.git job"
+
+
+def test_prepare_test_env_sparse(mocker):
+    mocker.patch("loktar.environment.os.mkdir")
+    mocker.patch("loktar.environment.os.path.exists", side_effect=lambda path: not path.endswith("new_lib"))
+    mocker.patch("loktar.environment.lcd")
+    mocker.patch("loktar.environment.local")
+    commands = []
+    mocker.patch("loktar.environment.exec_command_with_retry",
+                 side_effect=lambda cmd, *args: commands.append(cmd) is None)
+
+    archive = prepare_test_env("foobar", unique_name_dir="job", sparse={
+        "service": ["config.json", "lib", "service"],
+        "new_lib": ["config.json", "new_lib"]
+    })
+
+    assert archive == "/tmp/ci/job.tar.gz"
+    assert artifact_archive(archive, "service") == "/tmp/ci/job.service.tar.gz"
+    assert "tar -czf job.service.tar.gz job/config.json job/lib job/service" in commands
+    assert "tar -czf job.new_lib.tar.gz job/config.json" in commands
+
+
+def test_prepare_test_env_sparse_job_params(mocker):
+    # Like the init worker: the archives of the planned artifacts, then the parameters of their jobs
+    mocker.patch("loktar.environment.os.mkdir")
+    mocker.patch("loktar.environment.os.path.exists", return_value=True)
+    mocker.patch("loktar.environment.lcd")
+    mocker.patch("loktar.environment.local")
+    commands = []
+    mocker.patch("loktar.environment.exec_command_with_retry",
+                 side_effect=lambda cmd, *args: commands.append(cmd) is None)
+    sparse = {"service": ["config.json", "lib", "service"]}
+    result = {"test_env_path": prepare_test_env("foobar", unique_name_dir="job", sparse=sparse), "sparse": sparse}
+
+    params = get_job_params("commit_id", "committer", "service", "foobar", "test", result["test_env_path"],
+                            sparse=result["sparse"])
+    lib_params = get_job_params("commit_id", "committer", "lib", "foobar", "test", result["test_env_path"],
+                                sparse=result["sparse"])
+
+    assert params["branch"] == "foobar:@:/tmp/ci/job.service.tar.gz:@:commit_id"
+    assert "tar -czf job.service.tar.gz job/config.json job/lib job/service" in commands
+    assert lib_params["branch"] == "foobar:@:/tmp/ci/job.tar.gz:@:commit_id"
+
+
+def test_artifact_archive_directory():
+    checkout = "/mnt/ci/0b7c4a3e-1111-2222-3333-444455556666"
+
+    with pytest.raises(ValueError):
+        artifact_archive(checkout, "service")
+    # The job receives the whole test environment
+    params = get_job_params("commit_id", "committer", "service", "foobar", "test", checkout,
+                            sparse={"service": ["config.json", "service"]})
+    assert params["branch"] == "foobar:@:{0}:@:commit_id".format(checkout)
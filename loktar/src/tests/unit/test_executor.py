@@ -0,0 +1,214 @@
+import threading
+import time
+
+from conftest import dying_runner
+from conftest import packages
+from conftest import recording_runner
+from conftest import records
+from conftest import rooted_runner
+from mock import MagicMock
+import pytest
+
+from loktar.exceptions import CIJobFail
+from loktar.executor import Executor
+from loktar.executor import get_executor
+from loktar.executor import JenkinsExecutor
+from loktar.executor import LocalExecutor
+from loktar.executor import run_unit
+from loktar.executor import SupersededWatcher
+from loktar.job import build_units
+from loktar.job import level_units
+from loktar.resources import Capacity
+
+
+@pytest.mark.parametrize("dependencies", [None, [("lib", "service")]])
+def test_local_executor_order(tmpdir, dependencies):
+    component = [["lib", "other_lib"], ["service"]]
+    units = (build_units(component, ["test", "artifact"], dependencies) if dependencies is not None
+             else level_units(component, ["test", "artifact"]))
+    executor = LocalExecutor(packages(tmpdir, ["lib", "other_lib", "service"]), workers=2, runner=recording_runner)
+
+    durations = executor.run(units)
+
+    assert sorted(durations) == sorted(units)
+    lines = records(tmpdir)
+    for unit, previous_units in units.iteritems():
+        for previous_unit in previous_units:
+            assert lines.index("end {0} {1}".format(*previous_unit)) < lines.index("start {0} {1}".format(*unit))
+    # No more builds than workers at the same time
+    running = 0
+    for line in lines:
+        running += 1 if line.startswith("start") else -1
+        assert running <= 2
+
+
+def test_local_executor_fail_fast(tmpdir):
+    executor = LocalExecutor(packages(tmpdir, ["broken", "slow", "service"], slow={"duration": 30}),
+                             workers=4, runner=recording_runner)
+    units = build_units([["broken", "slow"], ["service"]], ["artifactmaster"], [("broken", "service")])
+
+    start = time.time()
+    with pytest.raises(CIJobFail):
+        executor.run(units)
+
+    # The slow build is stopped, and the service never runs
+    assert time.time() - start < 10
+    assert "end slow artifactmaster" not in records(tmpdir)
+    assert "start service artifactmaster" not in records(tmpdir)
+
+
+def test_local_executor_cancel(tmpdir):
+    executor = LocalExecutor(packages(tmpdir, ["slow"], slow={"duration": 30}), workers=1, runner=recording_runner)
+    canceller = threading.Timer(0.2, executor.cancel, args=("new commit",))
+    canceller.start()
+
+    start = time.time()
+    with pytest.raises(CIJobFail) as excinfo:
+        executor.run(level_units([["slow"]], ["test"]))
+
+    assert "new commit" in str(excinfo.value)
+    assert time.time() - start < 10
+
+
+def test_local_executor_superseded(tmpdir):
+    executor = LocalExecutor(packages(tmpdir, ["slow"], slow={"duration": 30}), workers=1, runner=recording_runner)
+    superseded = MagicMock(return_value="new_commit")
+
+    start = time.time()
+    with pytest.raises(CIJobFail) as excinfo:
+        executor.run(level_units([["slow"]], ["test"]), superseded=superseded)
+
+    assert "new_commit" in str(excinfo.value)
+    assert time.time() - start < 10
+
+
+def test_local_executor_durations_db(tmpdir):
+    executor = LocalExecutor(packages(tmpdir, ["lib"]), workers=1, runner=recording_runner)
+    durations_db = MagicMock()
+
+    durations = executor.run(level_units([["lib"]], ["test"]), durations_db=durations_db, commit_id="commit_id")
+
+    durations_db.record.assert_called_once_with("lib", "test", durations[("lib", "test")], commit_id="commit_id")
+
+
+def test_local_executor_sparse(tmpdir):
+    workspaces = MagicMock()
+    workspaces.lease.return_value.path = str(tmpdir.mkdir("sparse"))
+    executor = LocalExecutor({"lib": {"pkg_name": "lib"}, "service": {"pkg_name": "service"}},
+                             repo_path=str(tmpdir.mkdir("repo")), workers=1, runner=rooted_runner,
+                             workspaces=workspaces)
+
+    executor.run(level_units([["lib", "service"]], ["test"]), commit_id="commit_id",
+                 sparse={"service": ["config.json", "service"]})
+
+    # Only the service has paths, the library is built in the repository
+    workspaces.lease.assert_called_once_with("commit_id", paths=["config.json", "service"])
+    assert workspaces.lease.return_value.release.call_count == 1
+    assert tmpdir.join("sparse", "built").read() == "service test\n"
+    assert tmpdir.join("repo", "built").read() == "lib test\n"
+
+
+def test_superseded_watcher():
+    cancelled = threading.Event()
+    cancel = MagicMock(side_effect=lambda reason: cancelled.set())
+    superseded = MagicMock(side_effect=[None, "new_commit"])
+
+    with SupersededWatcher(cancel, superseded, interval=0.01):
+        cancelled.wait(5)
+
+    cancel.assert_called_once_with("New commit arrived: new_commit")
+    assert superseded.call_count == 2
+    # Nothing is watched without superseded
+    with SupersededWatcher(cancel) as watcher:
+        assert watcher._thread is None
+
+
+def test_local_executor_worker_died(tmpdir):
+    executor = LocalExecutor(packages(tmpdir, ["service"]), workers=1, runner=dying_runner)
+
+    start = time.time()
+    with pytest.raises(CIJobFail) as excinfo:
+        executor.run(level_units([["service"]], ["test"]))
+
+    assert "service" in str(excinfo.value)
+    assert time.time() - start < 10
+    assert executor.capacity.running == 0
+
+
+def test_local_executor_resources(tmpdir):
+    executor = LocalExecutor(packages(tmpdir, ["jvm", "other_jvm", "docker", "other_docker"],
+                                      jvm={"resources": {"cpu": 3}}, other_jvm={"resources": {"cpu": 3}},
+                                      docker={"resources": {"exclusive": "docker"}},
+                                      other_docker={"resources": {"exclusive": "docker"}}),
+                             workers=4, runner=recording_runner, capacity=Capacity(cpu=5))
+
+    executor.run(level_units([["jvm", "other_jvm", "docker", "other_docker"]], ["test"]))
+
+    # The two JVM builds, like the two docker builds, never run at the same time
+    lines = records(tmpdir)
+    for first, second in (("jvm", "other_jvm"), ("docker", "other_docker")):
+        first_ended = lines.index("end {0} test".format(first)) < lines.index("start {0} test".format(second))
+        assert first_ended or lines.index("end {0} test".format(second)) < lines.index("start {0} test".format(first))
+    assert executor.capacity.running == 0
+
+
+def test_local_executor_cycle(tmpdir):
+    executor = LocalExecutor(packages(tmpdir, ["lib", "service"]), workers=1, runner=recording_runner)
+
+    with pytest.raises(CIJobFail):
+        executor.run(build_units([["lib", "service"]], ["test"], [("lib", "service"), ("service", "lib")]))
+
+
+def test_local_executor_package():
+    executor = LocalExecutor({"lib": {"pkg_name": "lib"}, "moved": {"pkg_name": "moved",
+                                                                    "artifact_root_location": "/elsewhere"}},
+                             repo_path="/repo", workers=1)
+
+    assert executor.package("lib") == {"pkg_name": "lib", "artifact_root_location": "/repo"}
+    assert executor.package("moved")["artifact_root_location"] == "/elsewhere"
+    assert executor.packages["lib"] == {"pkg_name": "lib"}
+
+
+def test_run_unit(mocker):
+    strategy_runner = mocker.patch("loktar.executor.strategy_runner")
+
+    assert run_unit({"pkg_name": "lib"}, "artifactmaster")[0] is None
+    strategy_runner.assert_called_once_with({"pkg_name": "lib"}, "artifact")
+
+    strategy_runner.side_effect = SystemExit(1)
+    assert run_unit({"pkg_name": "lib"}, "test")[0] == "SystemExit: 1"
+
+
+def test_jenkins_executor(mocker):
+    schedule_jobs = mocker.patch("loktar.executor.schedule_jobs")
+    units = level_units([["lib"]], ["test"])
+
+    JenkinsExecutor("jenkins", "commit_id", "committer", "branch", "/tmp", slots=3).run(units, priorities={})
+
+    schedule_jobs.assert_called_once_with("jenkins", "commit_id", "committer", "branch", units, "/tmp",
+                                          priorities={}, slots=3, durations_db=None, resources=None, capacity=None,
+                                          superseded=None, sparse=None)
+
+
+def test_jenkins_executor_resources(mocker):
+    schedule_jobs = mocker.patch("loktar.executor.schedule_jobs")
+    executor = JenkinsExecutor("jenkins", "commit_id", "committer", "branch", "/tmp", resources={},
+                               capacity=Capacity(cpu=8))
+
+    executor.run(level_units([["lib"]], ["test"]))
+    executor.run(level_units([["lib"]], ["test"]))
+
+    # Each run packs its builds onto the whole capacity
+    first, second = [run[1]["capacity"] for run in schedule_jobs.call_args_list]
+    assert first is not second and first.cpu == 8
+
+
+def test_executor_interface():
+    with pytest.raises(TypeError):
+        Executor()
+
+
+def test_get_executor():
+    assert isinstance(get_executor("local", packages={}, workers=1), LocalExecutor)
+    with pytest.raises(ValueError):
+        get_executor("kubernetes")
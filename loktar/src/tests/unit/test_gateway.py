@@ -0,0 +1,138 @@
+from datetime import timedelta
+
+from mock import MagicMock
+import pytest
+import requests
+
+from loktar.gateway import downstream_client
+from loktar.gateway import GatewayBuild
+from loktar.gateway import jenkins_gateway
+from loktar.gateway import JenkinsGateway
+from loktar.gateway import session_requester
+from loktar.monitor import Workers
+
+
+def build_data(number, queue_id, building=False, result=None):
+    return {"number": number, "queueId": queue_id, "building": building, "result": result, "duration": 1500,
+            "url": "http://jenkins/job/lib - test/{0}/".format(number)}
+
+
+@pytest.fixture
+def gateway(mocker):
+    mocker.patch("requests.Session")
+    return JenkinsGateway("http://jenkins/", user="user", password="password", builds_window=10)
+
+
+def test_session_requester():
+    session = MagicMock()
+    session.post.return_value.status_code = 201
+    requester = session_requester(session, "user", "password", baseurl="http://jenkins")
+
+    requester.get_url("http://jenkins/api/json", params={"tree": "jobs"})
+    requester.post_and_confirm_status("http://jenkins/job/lib/build", data="", valid=[201])
+
+    assert session.get.call_args[1]["params"] == {"tree": "jobs"}
+    assert session.get.call_args[1]["auth"] == ("user", "password")
+    assert session.post.call_args[0] == ("http://jenkins/job/lib/build",)
+
+
+def test_gateway_session(gateway):
+    assert gateway.host == "http://jenkins"
+    assert gateway.session.auth == ("user", "password")
+    assert gateway.session.mount.call_count == 2
+
+
+def test_gateway_job_handles(mocker, gateway):
+    job = mocker.patch("jenkinsapi.job.Job")
+    mocker.patch("jenkinsapi.jenkins.Jenkins")
+
+    assert gateway["lib - test"] is gateway["lib - test"]
+    job.assert_called_once_with("http://jenkins/job/lib%20-%20test", "lib - test", jenkins_obj=gateway.jenkins)
+    assert gateway.jenkins is gateway.jenkins
+    gateway.get_queue()
+    gateway.jenkins.get_queue.assert_called_once_with()
+
+
+def test_gateway_root_builds(gateway):
+    gateway.session.get.return_value.json.return_value = {"jobs": [
+        {"name": "lib - test", "builds": [build_data(2, 12, building=True), build_data(1, 11)]},
+        {"name": "never built", "builds": []},
+        {"name": "other - test", "builds": [build_data(1, 3)]}]}
+
+    builds = gateway.builds(["lib - test", "lib - test", "never built", "deleted"])
+
+    assert builds == {"lib - test": {12: build_data(2, 12, building=True), 11: build_data(1, 11)},
+                      "never built": {}}
+    gateway.session.get.assert_called_once_with(
+        "http://jenkins/api/json",
+        params={"tree": "jobs[name,builds[number,queueId,building,result,duration,url]{0,10}]"})
+    assert gateway.builds([]) == {}
+    assert gateway.session.get.call_count == 1
+
+    gateway.session.get.return_value.raise_for_status.side_effect = requests.HTTPError("502 Bad Gateway")
+    assert gateway.builds(["lib - test"]) == {}
+
+
+def test_gateway_builds_request():
+    with pytest.raises(ValueError):
+        JenkinsGateway("http://jenkins/", builds_request="all")
+
+
+def test_gateway_builds(gateway):
+    gateway.builds_request = "job"
+    jobs = {
+        "http://jenkins/job/lib%20-%20test/api/json": {"builds": [build_data(2, 12, building=True),
+                                                                  build_data(1, 11)]},
+        "http://jenkins/job/never%20built/api/json": {"builds": []}
+    }
+
+    def get(url, params):
+        if url not in jobs:
+            raise requests.HTTPError("404 Client Error: Not Found")
+        return MagicMock(**{"json.return_value": jobs[url]})
+
+    gateway.session.get.side_effect = get
+
+    builds = gateway.builds(["lib - test", "lib - test", "never built", "deleted"])
+
+    assert builds == {"lib - test": {12: build_data(2, 12, building=True), 11: build_data(1, 11)},
+                      "never built": {}}
+    assert gateway.session.get.call_count == 3
+    gateway.session.get.assert_any_call(
+        "http://jenkins/job/lib%20-%20test/api/json",
+        params={"tree": "builds[number,queueId,building,result,duration,url]{0,10}"})
+    assert gateway.builds([]) == {}
+    assert gateway.session.get.call_count == 3
+
+    workers = Workers(2)
+    try:
+        assert gateway.builds(["lib - test", "deleted"], workers=workers) == {
+            "lib - test": {12: build_data(2, 12, building=True), 11: build_data(1, 11)}}
+    finally:
+        workers.close()
+
+
+def test_gateway_build(gateway):
+    build = GatewayBuild(gateway, "lib - test", build_data(1, 11, building=True))
+
+    assert (str(build), build.queue_id, build.get_number(), build.is_running()) == ("lib - test #1", 11, 1, True)
+    assert build.get_duration() == timedelta(seconds=1.5)
+
+    gateway.session.get.return_value.json.return_value = build_data(1, 11, result="SUCCESS")
+    build.poll()
+    assert build._data["result"] == "SUCCESS"
+    assert gateway.session.get.call_args[0] == ("http://jenkins/job/lib - test/1/api/json",)
+
+    build.stop()
+    gateway.session.post.assert_called_once_with("http://jenkins/job/lib - test/1/stop", data="")
+
+
+def test_shared_clients(mocker):
+    mocker.patch("requests.Session")
+    python_jenkins = mocker.patch("jenkins.Jenkins")
+
+    assert jenkins_gateway("http://shared", "user", "password") is jenkins_gateway("http://shared", "user", "password")
+    assert jenkins_gateway("http://shared", "user", "password") is not jenkins_gateway("http://other")
+    client = downstream_client("http://shared", "user", "password")
+    assert downstream_client("http://shared", "user", "password") is client
+    python_jenkins.assert_called_once_with("http://shared", "user", "password")
@@ -0,0 +1,109 @@
+from conftest import random_dag
+import networkx as nx
+import pytest
+
+from loktar.dependency import gen_dependencies_level
+from loktar.dependency import reachable_nodes
+from loktar.exceptions import GraphCycle
+from loktar.graph import CompactGraph
+
+
+@pytest.fixture
+def graph():
+    return CompactGraph(["F"], [("A", "B"), ("B", "C"), ("A", "C"), ("D", "E"), ("A", "B")])
+
+
+def reference_output_levels(graph):
+    # Former quadratic implementation of loktar.dependency.output_levels, kept as a reference for the regression test
+    top_sort = list(nx.topological_sort_recursive(graph))
+
+    levels = [[] for _ in xrange(len(top_sort))]
+
+    for level, node in enumerate(top_sort):
+        potential_level = level
+        while all((level_node, node) not in graph.edges() for level_node in levels[potential_level]) \
+                and potential_level >= 0:
+            potential_level -= 1
+
+        potential_level += 1
+        levels[potential_level].append(node)
+    levels = filter(None, levels)
+    return levels
+
+
+@pytest.mark.parametrize("seed", range(20))
+@pytest.mark.parametrize("nb_nodes,edge_probability", [(1, 0.), (10, 0.3), (40, 0.05), (40, 0.5)])
+def test_compact_graph_levels_match_reference(seed, nb_nodes, edge_probability):
+    nx_graph = random_dag(seed, nb_nodes, edge_probability)
+
+    levels = CompactGraph.from_networkx(nx_graph).levels()
+
+    assert map(set, levels) == map(set, reference_output_levels(nx_graph))
+    assert sorted(node for level in levels for node in level) == sorted(nx_graph.nodes())
+
+
+def test_compact_graph(graph):
+    assert graph.nodes() == ["F", "A", "B", "C", "D", "E"]
+    assert len(graph) == 6
+    assert sorted(graph.edges()) == [("A", "B"), ("A", "C"), ("B", "C"), ("D", "E")]
+    assert graph.successors("A") == ["B", "C"]
+    assert graph.predecessors("C") == ["A", "B"]
+    assert "A" in graph
+    assert "unknown" not in graph
+
+
+def test_compact_graph_views(graph):
+    view = graph.without(["B", "unknown"])
+
+    assert view.nodes() == ["F", "A", "C", "D", "E"]
+    assert view.edges() == [("A", "C"), ("D", "E")]
+    assert "B" not in view
+    # The graph itself is untouched
+    assert "B" in graph
+    assert graph.subgraph(["A", "B"]).edges() == [("A", "B")]
+    assert view.subgraph(["A", "B"]).nodes() == ["A"]
+
+
+def test_compact_graph_components(graph):
+    components = graph.components()
+
+    assert [component.nodes() for component in components] == [["F"], ["A", "B", "C"], ["D", "E"]]
+    assert [component.levels() for component in components] == [[["F"]], [["A"], ["B"], ["C"]], [["D"], ["E"]]]
+    components = graph.without(["B"]).components()
+    assert [component.nodes() for component in components] == [["F"], ["A", "C"], ["D", "E"]]
+
+
+def test_compact_graph_cycle(graph):
+    cyclic_graph = CompactGraph(edges=[("A", "B"), ("B", "C"), ("C", "A"), ("D", "A")])
+
+    assert graph.is_acyclic()
+    assert not cyclic_graph.is_acyclic()
+    assert cyclic_graph.without(["C"]).is_acyclic()
+    with pytest.raises(GraphCycle):
+        cyclic_graph.levels()
+
+
+def test_compact_graph_reachable(graph):
+    assert graph.reachable(["A"]) == {"B", "C"}
+    assert graph.reachable(["B", "D", "unknown"]) == {"C", "E"}
+    assert graph.without(["B"]).reachable(["B"]) == set()
+    assert reachable_nodes(graph, {"A"}) == {"B", "C"}
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_compact_graph_matches_networkx(seed):
+    nx_graph = random_dag(seed, 30, 0.1)
+    graph = CompactGraph.from_networkx(nx_graph)
+
+    assert sorted(graph.to_networkx().edges()) == sorted(nx_graph.edges())
+    assert sorted(graph.to_networkx().nodes()) == sorted(nx_graph.nodes())
+    assert sorted(map(sorted, (component.nodes() for component in graph.components()))) == \
+        sorted(map(sorted, nx.weakly_connected_components(nx_graph)))
+    assert map(set, graph.levels()) == map(set, reference_output_levels(nx_graph))
+    assert graph.reachable(["artifact0"]) == nx.descendants(nx_graph, "artifact0")
+
+
+def test_gen_dependencies_level(graph):
+    assert gen_dependencies_level(graph) == (True, [[["F"]], [["A"], ["B"], ["C"]], [["D"], ["E"]]], None)
+    assert sorted(gen_dependencies_level(graph.to_networkx())[1]) == [[["A"], ["B"], ["C"]], [["D"], ["E"]], [["F"]]]
+    assert gen_dependencies_level(nx.DiGraph([("A", "B"), ("B", "A")])) == (False, None, None)
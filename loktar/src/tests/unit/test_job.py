@@ -1,13 +1,27 @@
+from datetime import timedelta
+
+from conftest import FakeElasticSearch
+from mock import call
 from mock import MagicMock
 import pytest
 
+from loktar.db import ActiveRuns
 from loktar.exceptions import CIJobFail
 from loktar.job import build_params_to_context
+from loktar.job import build_units
 from loktar.job import ci_downstream
 from loktar.job import context_to_build_params
+from loktar.job import critical_path_priorities
+from loktar.job import get_job_params
 from loktar.job import job_manager
 from loktar.job import launch_jobs
 from loktar.job import launch_queue
+from loktar.job import level_units
+from loktar.job import ready_units
+from loktar.job import schedule_jobs
+from loktar.job import Speculation
+from loktar.resources import Capacity
+from loktar.resources import resource_request
 
 
 @pytest.fixture(autouse=True)
@@ -23,7 +37,7 @@ def jenkins_obj(mocker):
 
 @pytest.fixture
 def jenkinsapi_obj(mocker):
-    jenkins_mock = mocker.patch('loktar.job.Jenkins').return_value
+    jenkins_mock = mocker.patch('loktar.job.jenkins_gateway').return_value
     return jenkins_mock
 
 
@@ -109,7 +123,9 @@ def test_launch_jobs(mocker, jenkins_fail, new_pr, type_build):
                         lvl,
                         type_build,
                         test_env_path)
-        assert mock_queue.delete_item.call_args_list != []
+        # A new commit is seen before polling the queue, both items are still queued
+        if new_pr:
+            assert mock_queue.delete_item.call_count == 2
     else:
         launch_jobs(jenkins_instance,
                     commit_id,
@@ -120,6 +136,402 @@ def test_launch_jobs(mocker, jenkins_fail, new_pr, type_build):
                     test_env_path)
 
 
+class FakeJenkins(object):
+    """Builds last a given number of polling loops, the clock moves forward at each sleep"""
+
+    def __init__(self, mocker, durations, failing=()):
+        self.clock = 0
+        self.launched = []
+        # Packages and parameters of their jobs
+        self.params = []
+        self.durations = durations
+        self.failing = failing
+        self.queue = MagicMock()
+        mocker.patch('time.sleep', side_effect=self.sleep)
+        mocker.patch('loktar.monitor.BuildMonitor.wait', side_effect=lambda: self.sleep(None))
+        mocker.patch('loktar.job.launch_queue', side_effect=self.launch_queue)
+        mocker.patch('loktar.job.is_good', side_effect=lambda build: build.package not in self.failing)
+        self.scm = mocker.patch('loktar.job.Github').return_value
+        self.scm.get_pull_request.return_value.head.sha = 'commit_id'
+
+    def sleep(self, _):
+        self.clock += 1
+
+    def get_queue(self):
+        return self.queue
+
+    def launch_queue(self, jenkins_instance, commit_id, committer, package, git_branch, type_build, test_env_path,
+                     sparse=None):
+        self.launched.append((self.clock, package, type_build))
+        self.params.append((package, get_job_params(commit_id, committer, package, git_branch, type_build,
+                                                    test_env_path, sparse=sparse)))
+        end = self.clock + self.durations.get(package, 1)
+        build = MagicMock(package=package)
+        build.is_running.side_effect = lambda: self.clock < end
+        build.get_duration.return_value = timedelta(seconds=self.durations.get(package, 1))
+        queue_item = MagicMock()
+        queue_item.get_build.return_value = build
+        return queue_item
+
+    def rounds(self):
+        """Packages launched together, the builds of a round are launched at the same time in no given order"""
+        clocks = sorted({clock for clock, _, _ in self.launched})
+        return [sorted(package for launch_clock, package, _ in self.launched if launch_clock == clock)
+                for clock in clocks]
+
+
+def test_build_units():
+    component = [['lib'], ['service', 'other_lib'], ['other_service']]
+    dependencies = [('lib', 'service'), ('other_lib', 'other_service'), ('service', 'other_service'),
+                    ('lib', 'not_in_component')]
+
+    units = build_units(component, ['test', 'artifact'], dependencies)
+
+    assert units == {('lib', 'test'): set(), ('lib', 'artifact'): {('lib', 'test')},
+                     ('service', 'test'): {('lib', 'artifact')}, ('service', 'artifact'): {('service', 'test')},
+                     ('other_lib', 'test'): set(), ('other_lib', 'artifact'): {('other_lib', 'test')},
+                     ('other_service', 'test'): {('service', 'artifact'), ('other_lib', 'artifact')},
+                     ('other_service', 'artifact'): {('other_service', 'test')}}
+    assert build_units(component, ['artifactmaster'], dependencies)[('service', 'artifactmaster')] == \
+        {('lib', 'artifactmaster')}
+
+
+def test_level_units():
+    units = level_units([['lib', 'other_lib'], ['service']], ['test', 'artifact'])
+
+    assert units == {('lib', 'test'): set(), ('other_lib', 'test'): set(),
+                     ('lib', 'artifact'): {('lib', 'test'), ('other_lib', 'test')},
+                     ('other_lib', 'artifact'): {('lib', 'test'), ('other_lib', 'test')},
+                     ('service', 'test'): {('lib', 'artifact'), ('other_lib', 'artifact')},
+                     ('service', 'artifact'): {('service', 'test')}}
+
+
+def test_job_manager_executor(mocker):
+    mocker.patch('loktar.job.define_job_status_on_github_commit')
+    gateway = mocker.patch('loktar.job.jenkins_gateway')
+    executor = MagicMock()
+    component = [['lib'], ['service']]
+
+    job_manager({}, component, 'component_id', 'master', 'commit_id', 'committer', '/tmp', executor=executor)
+    job_manager({}, component, 'component_id', 'master', 'commit_id', 'committer', '/tmp',
+                dependencies=[('lib', 'service')], executor=executor)
+
+    assert [run[0][0] for run in executor.run.call_args_list] == [
+        level_units(component, ['artifactmaster']),
+        build_units(component, ['artifactmaster'], [('lib', 'service')])]
+    assert not gateway.called
+
+
+def test_job_manager_executor_active_runs(mocker):
+    mocker.patch('loktar.job.define_job_status_on_github_commit')
+    mocker.patch('loktar.db.Elasticsearch', return_value=FakeElasticSearch())
+    active_runs = ActiveRuns()
+    durations_db = MagicMock()
+    durations_db.estimates.return_value = {}
+    executor = MagicMock()
+
+    def run(units, **kwargs):
+        # The run is registered while the executor builds
+        assert active_runs.active('branch')['commit_id'] == 'commit_id'
+        assert kwargs['superseded']() is None
+        active_runs.start('branch', 'new_commit')
+        assert kwargs['superseded']() == 'new_commit'
+    executor.run.side_effect = run
+
+    job_manager({}, [['lib']], 'component_id', 'branch', 'commit_id', 'committer', '/tmp', executor=executor,
+                active_runs=active_runs, durations_db=durations_db)
+
+    assert executor.run.call_args[1]['durations_db'] is durations_db
+    assert executor.run.call_args[1]['commit_id'] == 'commit_id'
+    assert active_runs.active('branch')['commit_id'] == 'new_commit'
+
+
+def test_job_manager_dag_is_faster(mocker, jenkinsapi_obj):
+    mocker.patch('loktar.job.define_job_status_on_github_commit')
+    # The slow library does not hold back the slow service of the fast library
+    component = [['slow_lib', 'fast_lib'], ['slow_service', 'fast_service']]
+    dependencies = [('slow_lib', 'slow_service'), ('fast_lib', 'fast_service')]
+    elapsed = {}
+    for mode_dependencies in (None, dependencies):
+        fake_jenkins = FakeJenkins(mocker, {'slow_lib': 10, 'fast_service': 10})
+        mocker.patch('loktar.job.jenkins_gateway', return_value=fake_jenkins)
+        job_manager({'host': '', 'user': '', 'password': ''}, component, 'component_id', 'master', 'commit_id',
+                    'committer', '/tmp', dependencies=mode_dependencies)
+        elapsed[mode_dependencies is None] = fake_jenkins.clock
+        assert sorted(package for _, package, _ in fake_jenkins.launched) == sorted(sum(component, []))
+
+    launches = {package: clock for clock, package, _ in fake_jenkins.launched}
+    assert launches['fast_service'] < launches['slow_service']
+    assert elapsed[False] < elapsed[True]
+
+
+def test_schedule_jobs_order(mocker):
+    fake_jenkins = FakeJenkins(mocker, {})
+    units = build_units([['lib'], ['service']], ['test', 'artifact'], [('lib', 'service')])
+
+    schedule_jobs(fake_jenkins, 'commit_id', 'committer', 'branch', units, '/tmp')
+
+    assert [(package, type_build) for _, package, type_build in fake_jenkins.launched] == [
+        ('lib', 'test'), ('lib', 'artifact'), ('service', 'test'), ('service', 'artifact')]
+
+
+def test_schedule_jobs_fail_fast(mocker):
+    fake_jenkins = FakeJenkins(mocker, {'slow_lib': 10}, failing={'fast_lib'})
+    units = build_units([['slow_lib', 'fast_lib'], ['service']], ['artifactmaster'], [('fast_lib', 'service')])
+
+    with pytest.raises(CIJobFail):
+        schedule_jobs(fake_jenkins, 'commit_id', 'committer', 'branch', units, '/tmp')
+
+    # The slow build is stopped and the service is never launched
+    assert fake_jenkins.rounds() == [['fast_lib', 'slow_lib']]
+    assert fake_jenkins.clock == 1
+
+
+def test_schedule_jobs_new_commit(mocker):
+    fake_jenkins = FakeJenkins(mocker, {})
+    fake_jenkins.scm.get_pull_request.return_value.head.sha = 'new_commit'
+    units = build_units([['lib']], ['test'], [])
+
+    with pytest.raises(CIJobFail):
+        schedule_jobs(fake_jenkins, 'commit_id', 'committer', 'branch', units, '/tmp')
+    assert fake_jenkins.queue.delete_item.call_count == 1
+
+
+def test_schedule_jobs_cycle(mocker):
+    fake_jenkins = FakeJenkins(mocker, {})
+    units = build_units([['lib', 'service']], ['test'], [('lib', 'service'), ('service', 'lib')])
+
+    with pytest.raises(CIJobFail):
+        schedule_jobs(fake_jenkins, 'commit_id', 'committer', 'branch', units, '/tmp')
+    assert fake_jenkins.launched == []
+
+
+def test_critical_path_priorities():
+    units = build_units([['lib', 'other_lib'], ['service']], ['artifactmaster'], [('lib', 'service')])
+
+    priorities = critical_path_priorities(units, {('lib', 'artifactmaster'): 5, ('service', 'artifactmaster'): 20},
+                                          default_duration=1)
+
+    assert priorities == {('lib', 'artifactmaster'): 25, ('service', 'artifactmaster'): 20,
+                          ('other_lib', 'artifactmaster'): 1}
+
+
+def test_ready_units_priority_classes():
+    waiting = {('lib', 'test'): set(), ('service', 'artifactmaster'): set(), ('other_lib', 'test'): set(),
+               ('app', 'test'): {('lib', 'artifact')}}
+
+    # The master builds come first, whatever the priority of the other ones
+    assert ready_units(waiting, {('lib', 'test'): 50, ('service', 'artifactmaster'): 1}) == \
+        [('service', 'artifactmaster'), ('lib', 'test'), ('other_lib', 'test')]
+
+
+def test_schedule_jobs_critical_path_first(mocker):
+    # With a single slot, the library of the long service is built before the quicker libraries
+    fake_jenkins = FakeJenkins(mocker, {'service': 10})
+    units = build_units([['a_lib', 'b_lib', 'lib'], ['service']], ['artifactmaster'], [('lib', 'service')])
+    durations = {('service', 'artifactmaster'): 10}
+    durations_db = MagicMock()
+
+    schedule_jobs(fake_jenkins, 'commit_id', 'committer', 'branch', units, '/tmp',
+                  priorities=critical_path_priorities(units, durations, default_duration=1), slots=2,
+                  durations_db=durations_db)
+
+    assert fake_jenkins.rounds() == [['a_lib', 'lib'], ['b_lib', 'service']]
+    assert call('service', 'artifactmaster', 10, commit_id='commit_id') in durations_db.record.call_args_list
+    assert durations_db.record.call_count == 4
+
+
+def test_schedule_jobs_slots(mocker):
+    fake_jenkins = FakeJenkins(mocker, {})
+    units = build_units([['a_lib', 'b_lib', 'c_lib']], ['artifactmaster'], [])
+
+    schedule_jobs(fake_jenkins, 'commit_id', 'committer', 'branch', units, '/tmp', slots=1)
+
+    # Each build is launched once the previous one is over
+    clocks = [clock for clock, _, _ in fake_jenkins.launched]
+    assert [package for _, package, _ in fake_jenkins.launched] == ['a_lib', 'b_lib', 'c_lib']
+    assert clocks == sorted(set(clocks))
+
+
+def test_schedule_jobs_resources(mocker):
+    fake_jenkins = FakeJenkins(mocker, {'jvm': 2})
+    units = build_units([['jvm', 'docker', 'other_docker', 'tiny']], ['artifactmaster'], [])
+    resources = {'jvm': resource_request({'resources': {'cpu': 6, 'memory': 8192}}),
+                 'docker': resource_request({'resources': {'cpu': 1, 'exclusive': 'docker'}}),
+                 'other_docker': resource_request({'resources': {'cpu': 1, 'exclusive': 'docker'}})}
+    capacity = Capacity(cpu=8, memory=16384)
+
+    schedule_jobs(fake_jenkins, 'commit_id', 'committer', 'branch', units, '/tmp',
+                  priorities={('jvm', 'artifactmaster'): 1}, resources=resources, capacity=capacity)
+
+    # The small builds fill what the JVM build leaves, a single docker build at a time
+    assert fake_jenkins.rounds() == [['docker', 'jvm', 'tiny'], ['other_docker']]
+    assert capacity.running == 0 and capacity.used == {'cpu': 0, 'memory': 0}
+
+
+def test_schedule_jobs_speculation(mocker):
+    fake_jenkins = FakeJenkins(mocker, {'lib': 3, 'service': 2})
+    units = build_units([['lib'], ['service']], ['test', 'artifact'], [('lib', 'service')])
+    speculation = Speculation(clock=lambda: fake_jenkins.clock)
+
+    schedule_jobs(fake_jenkins, 'commit_id', 'committer', 'branch', units, '/tmp', speculation=speculation)
+
+    launches = {(package, type_build): clock for clock, package, type_build in fake_jenkins.launched}
+    # The service is tested while the library artifact is built, and its artifact waits for the library
+    assert launches[('service', 'test')] < launches[('lib', 'artifact')] + 3
+    assert launches[('service', 'artifact')] >= launches[('lib', 'artifact')] + 3
+    assert speculation.accepted == [('service', 'test')]
+    assert speculation.saved == 2 and speculation.wasted == 0
+    assert len(fake_jenkins.launched) == 4
+
+
+def test_schedule_jobs_speculation_failed(mocker):
+    fake_jenkins = FakeJenkins(mocker, {'lib': 3}, failing=('service',))
+    units = {('lib', 'artifact'): set(), ('service', 'test'): {('lib', 'artifact')}}
+    speculation = Speculation(clock=lambda: fake_jenkins.clock)
+
+    with pytest.raises(CIJobFail):
+        schedule_jobs(fake_jenkins, 'commit_id', 'committer', 'branch', units, '/tmp', speculation=speculation)
+
+    # The speculative failure is not trusted, the test fails again once the library is built
+    assert [package for _, package, _ in fake_jenkins.launched] == ['lib', 'service', 'service']
+    assert speculation.discarded == [('service', 'test')]
+    assert speculation.wasted == 1
+
+
+def test_schedule_jobs_speculation_failed_after_upstream(mocker):
+    fake_jenkins = FakeJenkins(mocker, {'lib': 1, 'service': 5}, failing=('service',))
+    units = {('lib', 'artifact'): set(), ('service', 'test'): {('lib', 'artifact')}}
+    speculation = Speculation(clock=lambda: fake_jenkins.clock)
+
+    with pytest.raises(CIJobFail):
+        schedule_jobs(fake_jenkins, 'commit_id', 'committer', 'branch', units, '/tmp', speculation=speculation)
+
+    # The library was built when the test failed, the failure is a real one
+    assert [package for _, package, _ in fake_jenkins.launched] == ['lib', 'service']
+    assert not speculation.launched
+
+
+def test_speculation_retry():
+    speculation = Speculation(clock=lambda: 10)
+    failed_build = MagicMock(**{'get_duration.return_value': timedelta(seconds=5)})
+    speculation.launch(('service', 'test'))
+    speculation.launch(('other_service', 'test'))
+    assert not speculation.ready(('service', 'test'))
+
+    retried, failed = speculation.retry([(failed_build, ('service', 'test')), (failed_build, ('other_service', 'test')),
+                                         (failed_build, ('lib', 'artifact'))])
+
+    assert retried == [('other_service', 'test')]
+    assert failed == [(failed_build, ('service', 'test')), (failed_build, ('lib', 'artifact'))]
+    assert not speculation.launched
+
+
+def test_schedule_jobs_speculation_upstream_failed(mocker):
+    fake_jenkins = FakeJenkins(mocker, {'lib': 3, 'service': 10}, failing=('lib',))
+    units = {('lib', 'artifact'): set(), ('service', 'test'): {('lib', 'artifact')}}
+    speculation = Speculation(clock=lambda: fake_jenkins.clock)
+
+    with pytest.raises(CIJobFail):
+        schedule_jobs(fake_jenkins, 'commit_id', 'committer', 'branch', units, '/tmp', slots=2,
+                      speculation=speculation)
+
+    assert fake_jenkins.rounds() == [['lib'], ['service']]
+    assert speculation.discarded == [('service', 'test')]
+    assert speculation.wasted > 0 and speculation.minutes()['saved'] == 0
+    assert not speculation.launched
+
+
+def test_schedule_jobs_speculation_slots(mocker):
+    # Without idle slot, nothing is launched before its time
+    fake_jenkins = FakeJenkins(mocker, {'lib': 3})
+    units = {('lib', 'artifact'): set(), ('service', 'test'): {('lib', 'artifact')}}
+    speculation = Speculation(clock=lambda: fake_jenkins.clock)
+
+    schedule_jobs(fake_jenkins, 'commit_id', 'committer', 'branch', units, '/tmp', slots=1, speculation=speculation)
+
+    assert fake_jenkins.launched[1][0] >= 3
+    assert speculation.launched == {} and speculation.accepted == []
+
+
+def test_schedule_jobs_durations_db_down(mocker):
+    fake_jenkins = FakeJenkins(mocker, {})
+    durations_db = MagicMock()
+    durations_db.record.side_effect = Exception('connection refused')
+
+    schedule_jobs(fake_jenkins, 'commit_id', 'committer', 'branch', build_units([['lib']], ['test'], []), '/tmp',
+                  durations_db=durations_db)
+
+    assert durations_db.record.call_count == 1
+
+
+def test_job_manager_durations(mocker, jenkinsapi_obj):
+    mocker.patch('loktar.job.define_job_status_on_github_commit')
+    mocker.patch.dict('loktar.job.SCHEDULER', {'slots': 1})
+    fake_jenkins = FakeJenkins(mocker, {})
+    mocker.patch('loktar.job.jenkins_gateway', return_value=fake_jenkins)
+    durations_db = MagicMock()
+    durations_db.estimates.return_value = {('b_lib', 'artifactmaster'): 600}
+
+    job_manager({'host': '', 'user': '', 'password': ''}, [['a_lib', 'b_lib']], 'component_id', 'master',
+                'commit_id', 'committer', '/tmp', dependencies=[], durations_db=durations_db)
+
+    assert sorted(durations_db.estimates.call_args[0][0]) == ['a_lib', 'b_lib']
+    assert fake_jenkins.rounds() == [['b_lib'], ['a_lib']]
+
+
+def test_job_manager_speculative(mocker, jenkinsapi_obj):
+    mocker.patch('loktar.job.define_job_status_on_github_commit')
+    fake_jenkins = FakeJenkins(mocker, {'lib': 3})
+    mocker.patch('loktar.job.jenkins_gateway', return_value=fake_jenkins)
+    log = mocker.patch('loktar.job.log')
+
+    job_manager({'host': '', 'user': '', 'password': ''}, [['lib'], ['service']], 'component_id', 'branch',
+                'commit_id', 'committer', '/tmp', dependencies=[('lib', 'service')], speculative=True)
+
+    assert 'Speculative builds of component component_id: 1 accepted, 0 discarded' in log.info.call_args[0][0]
+
+
+def test_job_manager_active_runs(mocker, jenkinsapi_obj):
+    mocker.patch('loktar.job.define_job_status_on_github_commit')
+    mocker.patch('loktar.db.Elasticsearch', return_value=FakeElasticSearch())
+    fake_jenkins = FakeJenkins(mocker, {'lib': 5})
+    mocker.patch('loktar.job.jenkins_gateway', return_value=fake_jenkins)
+    active_runs = ActiveRuns()
+    sleep = fake_jenkins.sleep
+
+    def sleep_and_start_newer_run(seconds):
+        # A newer run of the branch starts while the library is built
+        sleep(seconds)
+        if fake_jenkins.clock == 2:
+            active_runs.start('branch', 'new_commit')
+    fake_jenkins.sleep = sleep_and_start_newer_run
+
+    with pytest.raises(CIJobFail) as excinfo:
+        job_manager({'host': '', 'user': '', 'password': ''}, [['lib'], ['service']], 'component_id', 'branch',
+                    'commit_id', 'committer', '/tmp', dependencies=[('lib', 'service')], active_runs=active_runs)
+
+    assert 'new_commit' in str(excinfo.value)
+    assert fake_jenkins.rounds() == [['lib']]
+    assert fake_jenkins.clock < 5
+    # The record of the newer run is kept, the pull request is not watched
+    assert active_runs.active('branch')['commit_id'] == 'new_commit'
+    assert not fake_jenkins.scm.search_pull_request_id.called
+
+
+def test_schedule_jobs_launch_fail(mocker):
+    fake_jenkins = FakeJenkins(mocker, {})
+    mocker.patch('loktar.job.launch_queue',
+                 side_effect=lambda *args, **kwargs: (fake_jenkins.launch_queue(*args, **kwargs) if args[3] != 'broken'
+                                                      else 1 / 0))
+    units = build_units([['lib', 'broken']], ['test'], [])
+
+    with pytest.raises(CIJobFail):
+        schedule_jobs(fake_jenkins, 'commit_id', 'committer', 'branch', units, '/tmp')
+    # The build launched next to the broken one is cancelled
+    assert fake_jenkins.queue.delete_item.call_count == 1
+
+
 @pytest.mark.parametrize('type_build', ['test', 'artifact', 'artifactmaster'])
 def test_launch_queue(jenkinsapi_obj, type_build):
     jenkins_instance = jenkinsapi_obj
@@ -138,6 +550,36 @@ def test_launch_queue(jenkinsapi_obj, type_build):
                  test_env_path)
 
 
+def test_get_job_params_sparse():
+    sparse = {'service': ['config.json', 'service']}
+
+    params = get_job_params('commit_id', 'committer', 'service', 'branch', 'test', '/tmp/ci/env.tar.gz', sparse=sparse)
+    other_params = get_job_params('commit_id', 'committer', 'lib', 'branch', 'test', '/tmp/ci/env.tar.gz',
+                                  sparse=sparse)
+
+    assert params['branch'] == 'branch:@:/tmp/ci/env.service.tar.gz:@:commit_id'
+    # Without paths, the job receives the whole test environment
+    assert other_params['branch'] == 'branch:@:/tmp/ci/env.tar.gz:@:commit_id'
+
+
+def test_job_manager_sparse(mocker):
+    mocker.patch('loktar.job.define_job_status_on_github_commit')
+    fake_jenkins = FakeJenkins(mocker, {})
+    mocker.patch('loktar.job.jenkins_gateway', return_value=fake_jenkins)
+    executor = MagicMock()
+    sparse = {'lib': ['config.json', 'lib']}
+
+    job_manager({'host': '', 'user': '', 'password': ''}, [['lib', 'other_lib']], 'component_id', 'branch',
+                'commit_id', 'committer', '/tmp/ci/env.tar.gz', sparse=sparse)
+    job_manager({}, [['lib']], 'component_id', 'branch', 'commit_id', 'committer', '/tmp/ci/env.tar.gz',
+                executor=executor, sparse=sparse)
+
+    assert {package: params['branch'] for package, params in fake_jenkins.params} == {
+        'lib': 'branch:@:/tmp/ci/env.lib.tar.gz:@:commit_id',
+        'other_lib': 'branch:@:/tmp/ci/env.tar.gz:@:commit_id'}
+    assert executor.run.call_args[1]['sparse'] == sparse
+
+
 @pytest.mark.parametrize('package,type_build', [('The Package', 'Is a Test'),
                                                 ('swagger-rest-microservice', 'Is-a-Test'),
                                                 ('swagger-rest-microservice', 'Is a Test'),
@@ -0,0 +1,55 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+from loktar.lazy import lazy_attribute
+from loktar.lazy import LazyModule
+
+HEAVY_MODULES = ["boto", "docker", "elasticsearch", "etcd", "fabric", "github", "jenkins", "jenkinsapi", "joblib",
+                 "matplotlib", "networkx", "numpy", "paramiko", "pymongo", "redis", "requests", "slacker"]
+
+
+def test_lazy_module(mocker):
+    setup = mocker.MagicMock()
+    module = LazyModule("json", setup=setup)
+
+    assert repr(module) == "<lazy module 'json'>"
+    assert not setup.called
+    assert module.dumps([1]) == "[1]"
+    assert module.dumps([2]) == "[2]"
+    setup.assert_called_once_with(json)
+    assert repr(module) == "<lazy module 'json' (loaded)>"
+
+
+def test_lazy_module_patch(mocker):
+    module = LazyModule("json")
+    mocker.patch.object(module, "dumps", return_value="patched")
+
+    assert json.dumps([1]) == "patched"
+    mocker.stopall()
+    assert module.dumps([1]) == "[1]"
+
+
+def test_lazy_attribute():
+    loads = lazy_attribute("json", "loads")
+
+    assert loads.__name__ == "loads"
+    assert loads("[1]") == [1]
+    assert lazy_attribute(LazyModule("collections"), "OrderedDict")(a=1) == {"a": 1}
+
+
+@pytest.mark.parametrize("module", ["loktar.check", "loktar.db", "loktar.dependency", "loktar.distributed",
+                                    "loktar.environment", "loktar.executor", "loktar.exit", "loktar.gateway",
+                                    "loktar.job", "loktar.merge_queue", "loktar.monitor", "loktar.notifications",
+                                    "loktar.resources", "loktar.scm", "loktar.store", "loktar.strategy_run",
+                                    "loktar.workspace"])
+def test_import_budget(module):
+    # A fresh interpreter is needed, the tests already imported everything
+    imported = subprocess.check_output([sys.executable, "-c",
+                                        "import json, sys; import {}; print(json.dumps(sys.modules.keys()))"
+                                        .format(module)])
+    imported = {name.split(".")[0] for name in json.loads(imported.splitlines()[-1])}
+
+    assert imported & set(HEAVY_MODULES) == set()
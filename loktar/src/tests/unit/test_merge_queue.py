@@ -0,0 +1,194 @@
+from datetime import datetime
+
+from mock import call
+from mock import MagicMock
+import networkx
+import pytest
+
+from loktar.exceptions import CIJobFail
+from loktar.exceptions import PrepareEnvFail
+from loktar.merge_queue import batch_graph
+from loktar.merge_queue import BatchBuild
+from loktar.merge_queue import merge_branches
+from loktar.merge_queue import mergeable_pull_requests
+from loktar.merge_queue import MergeQueue
+from loktar.merge_queue import run_merge_queue
+
+
+def failing_build(culprits, batches):
+    def build(batch):
+        batches.append(list(batch))
+        if set(batch) & set(culprits):
+            raise CIJobFail("broken")
+    return build
+
+
+@pytest.mark.parametrize("culprits,nb_builds", [
+    ([], 1),
+    ([6], 5),
+    ([7], 5),
+    ([1, 6], 10)
+])
+def test_merge_queue(culprits, nb_builds):
+    batches = []
+    queue = MergeQueue(failing_build(culprits, batches), max_batch=8)
+
+    passed, failed = queue.run(range(8))
+
+    assert failed == culprits
+    assert passed == [pull_request for pull_request in range(8) if pull_request not in culprits]
+    assert queue.builds == len(batches) == nb_builds
+    assert batches[0] == range(8)
+
+
+def test_merge_queue_combination():
+    batches = []
+
+    def build(batch):
+        batches.append(list(batch))
+        # 0 and 1 only fail together
+        if {0, 1} <= set(batch):
+            raise CIJobFail("broken")
+
+    queue = MergeQueue(build, max_batch=2)
+
+    # The second pull request is built alone before being blamed, it is not
+    assert queue.run(range(2)) == ([0, 1], [])
+    assert batches == [[0, 1], [0], [1]]
+
+
+def test_merge_queue_conflicts():
+    batches = []
+
+    def build(batch):
+        batches.append(list(batch))
+        # 2 conflicts with 1 when they are merged together
+        return [pull_request for pull_request in batch if pull_request != 2 or 1 not in batch]
+
+    queue = MergeQueue(build, max_batch=4)
+
+    assert queue.run(range(4)) == ([0, 1, 3], [2])
+    assert batches == [[0, 1, 2, 3]]
+
+
+def test_merge_queue_batches():
+    batches = []
+    queue = MergeQueue(failing_build([], batches), max_batch=3)
+
+    assert queue.run(range(7)) == (range(7), [])
+    assert batches == [[0, 1, 2], [3, 4, 5], [6]]
+    with pytest.raises(ValueError):
+        MergeQueue(None, max_batch=0)
+
+
+def test_mergeable_pull_requests():
+    scm = MagicMock()
+    scm.get_pull_requests.return_value = [MagicMock(number=number, mergeable=mergeable,
+                                                    created_at=datetime(2017, 1, day))
+                                          for number, mergeable, day in ((1, True, 3), (2, False, 1), (3, True, 2),
+                                                                         (4, True, 4))]
+
+    assert [pull_request.number for pull_request in mergeable_pull_requests(scm, max_batch=2)] == [3, 1]
+    assert len(mergeable_pull_requests(scm)) == 3
+
+
+def test_merge_branches(mocker):
+    mocker.patch("loktar.merge_queue.lcd")
+    exe = mocker.patch("loktar.merge_queue.exe", side_effect=lambda cmd, remote: "conflicting" not in cmd)
+
+    assert merge_branches("/workspace", ["feature", "conflicting", "fix"], batch_branch="batch") == ["feature", "fix"]
+    assert exe.call_args_list == [call("git fetch origin", remote=False),
+                                  call("git checkout -B batch origin/master", remote=False),
+                                  call("git merge --no-edit origin/feature", remote=False),
+                                  call("git merge --no-edit origin/conflicting", remote=False),
+                                  call("git merge --abort", remote=False),
+                                  call("git merge --no-edit origin/fix", remote=False),
+                                  call("git push --force origin batch", remote=False)]
+
+
+@pytest.mark.parametrize("failing_cmd", ["fetch", "checkout", "abort", "push"])
+def test_merge_branches_fail(mocker, failing_cmd):
+    mocker.patch("loktar.merge_queue.lcd")
+    mocker.patch("loktar.merge_queue.exe",
+                 side_effect=lambda cmd, remote: "conflicting" not in cmd and failing_cmd not in cmd)
+
+    with pytest.raises(PrepareEnvFail):
+        merge_branches("/workspace", ["feature", "conflicting"], batch_branch="batch")
+
+
+def pull_request(number, branch, day=1):
+    return MagicMock(number=number, mergeable=True, created_at=datetime(2017, 1, day),
+                     head=MagicMock(ref=branch, sha="sha_{0}".format(branch)))
+
+
+def test_batch_graph(mocker):
+    dependency_graph = mocker.patch("loktar.merge_queue.dependency_graph_from_modified_artifacts")
+    scm = MagicMock()
+    scm.get_modified_files_from_pull_request.side_effect = {1: ["libs/lib/setup.py"],
+                                                            2: ["libs/lib/lib.py", "service/main.py", "readme.md"]}.get
+    artifacts = {"lib": {"artifact_dir": "libs"}, "service": {}}
+
+    batch_graph(scm, "/workspace", artifacts, [pull_request(1, "feature"), pull_request(2, "fix")], compact=True)
+
+    dependency_graph.assert_called_once_with("/workspace", artifacts, {"lib", "service"}, compact=True)
+
+
+def modified_graph(requirements, modified_artifacts):
+    graph = networkx.DiGraph()
+    graph.add_nodes_from(modified_artifacts)
+    graph.add_edges_from(edge for edge in requirements if edge[0] in modified_artifacts)
+    return graph
+
+
+def build_component(ci_config, component, *args, **kwargs):
+    if "broken" in sum(component, []):
+        raise CIJobFail("broken")
+
+
+def test_run_merge_queue(mocker):
+    mocker.patch("loktar.merge_queue.lcd")
+    mocker.patch("loktar.merge_queue.local", return_value="batch_sha")
+    # The conflicting branch never merges
+    exe = mocker.patch("loktar.merge_queue.exe", side_effect=lambda cmd, remote: "conflicting" not in cmd)
+    mocker.patch("loktar.merge_queue.dependency_graph_from_modified_artifacts",
+                 side_effect=lambda repo_path, artifacts, modified_artifacts: modified_graph([("lib", "service")],
+                                                                                             modified_artifacts))
+    job_manager = mocker.patch("loktar.merge_queue.job_manager", side_effect=build_component)
+    define_status = mocker.patch("loktar.merge_queue.define_job_status_on_github_commit")
+    scm = MagicMock()
+    pull_requests = [pull_request(1, "feature", 1), pull_request(2, "conflicting", 2), pull_request(3, "broken", 3),
+                     pull_request(4, "fix", 4)]
+    scm.get_pull_requests.return_value = pull_requests
+    scm.get_modified_files_from_pull_request.side_effect = {1: ["lib/lib.py"], 2: ["service/main.py"],
+                                                            3: ["broken/main.py"], 4: ["service/main.py"]}.get
+    build = BatchBuild(scm, "/workspace", {"lib": {}, "service": {}, "broken": {}}, {"host": ""},
+                       batch_branch="batch")
+
+    passed, culprits = run_merge_queue(scm, build, max_batch=4)
+
+    assert passed == [pull_requests[0], pull_requests[3]]
+    assert culprits == [pull_requests[1], pull_requests[2]]
+    # The service depending on the library is built once, after it, in the component of the library
+    components = [job_call[0][1] for job_call in job_manager.call_args_list]
+    assert [["lib"], ["service"]] in components
+    assert all(job_call[0][3:7] == ("batch", "batch_sha", "merge-queue", "/workspace")
+               for job_call in job_manager.call_args_list)
+    assert call("git push --force origin batch", remote=False) in exe.call_args_list
+    assert define_status.call_args_list == [
+        call("sha_feature", "success", "", context="Merge Queue",
+             description="Passed with the other pull requests of its batch"),
+        call("sha_fix", "success", "", context="Merge Queue",
+             description="Passed with the other pull requests of its batch"),
+        call("sha_conflicting", "failure", "", context="Merge Queue",
+             description="Breaks the build or conflicts with other pull requests"),
+        call("sha_broken", "failure", "", context="Merge Queue",
+             description="Breaks the build or conflicts with other pull requests")]
+
+
+def test_batch_build_conflicts(mocker):
+    mocker.patch("loktar.merge_queue.lcd")
+    mocker.patch("loktar.merge_queue.exe", side_effect=lambda cmd, remote: "conflicting" not in cmd)
+    job_manager = mocker.patch("loktar.merge_queue.job_manager")
+
+    assert BatchBuild(MagicMock(), "/workspace", {}, {}, batch_branch="batch")([pull_request(1, "conflicting")]) == []
+    assert not job_manager.called
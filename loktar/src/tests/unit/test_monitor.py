@@ -0,0 +1,239 @@
+from functools import partial
+import threading
+import time
+
+from jenkinsapi.build import Build
+from jenkinsapi.custom_exceptions import NotBuiltYet
+from mock import MagicMock
+import pytest
+
+from loktar.exceptions import CIJobFail
+from loktar.gateway import GatewayBuild
+from loktar.monitor import BuildMonitor
+from loktar.monitor import Workers
+
+
+def slow_build(running, delay=0.1):
+    build = MagicMock()
+    # time.sleep is patched by the unit tests
+    build.is_running.side_effect = lambda: threading.Event().wait(delay) or running
+    return build
+
+
+def test_workers():
+    workers = Workers(4)
+
+    assert workers.run([lambda: 1, lambda: 2]) == [1, 2]
+    with pytest.raises(ZeroDivisionError):
+        workers.run([lambda: 1, lambda: 1 / 0])
+    [(result, error), (no_result, division_error)] = workers.settle([lambda: 1, lambda: 1 / 0])
+    assert (result, error, no_result) == (1, None, None)
+    assert isinstance(division_error, ZeroDivisionError)
+    workers.close()
+
+
+def test_poll_is_concurrent():
+    with BuildMonitor("commit_id", lambda build: build.good, workers=8) as monitor:
+        for i in xrange(8):
+            queue_item = MagicMock()
+            queue_item.get_build.return_value = slow_build(running=i % 2 == 0)
+            queue_item.get_build.return_value.good = i != 1
+            monitor.add(queue_item, i)
+
+        start = time.time()
+        succeeded, failed = monitor.poll()
+
+        assert time.time() - start < 0.5
+        assert [unit for _, unit in succeeded] == [3, 5, 7]
+        assert [unit for _, unit in failed] == [1]
+        assert [unit for _, unit in monitor.running] == [0, 2, 4, 6]
+
+
+def test_poll_not_built_yet():
+    queue_item = MagicMock()
+    queue_item.get_build.side_effect = NotBuiltYet()
+
+    with BuildMonitor("commit_id", lambda build: True) as monitor:
+        monitor.add(queue_item, "lib")
+
+        assert monitor.poll() == ([], [])
+        assert monitor.queued == [(queue_item, "lib")]
+
+
+def test_adaptive_interval():
+    build = MagicMock()
+    build.is_running.return_value = True
+    queue_item = MagicMock()
+    queue_item.get_build.return_value = build
+
+    with BuildMonitor("commit_id", lambda build: True, min_interval=1, max_interval=5) as monitor:
+        monitor.add(queue_item, "lib")
+        intervals = []
+        for _ in xrange(5):
+            monitor.poll()
+            intervals.append(monitor.interval)
+        build.is_running.return_value = False
+        monitor.poll()
+
+        # The build started at the first poll, and stopped at the last one
+        assert intervals == [1, 2, 4, 5, 5]
+        assert monitor.interval == 1
+        assert not monitor.pending()
+
+
+def test_new_commit_before_poll():
+    scm = MagicMock()
+    scm.get_pull_request.return_value.head.sha = "new_commit"
+    queue_item = MagicMock()
+
+    with BuildMonitor("commit_id", lambda build: True, scm=scm, pr_id=42) as monitor:
+        monitor.add(queue_item, "lib")
+
+        assert monitor.poll() == ([], [])
+        assert monitor.new_commit == "new_commit"
+        assert not queue_item.poll.called
+
+
+def test_new_commit_ends_the_wait():
+    scm = MagicMock()
+    scm.get_pull_request.return_value.head.sha = "commit_id"
+
+    with BuildMonitor("commit_id", lambda build: True, scm=scm, pr_id=42, min_interval=30,
+                      commit_interval=0.01) as monitor:
+        monitor.add(slow_build(running=True, delay=0), "lib")
+        monitor.running, monitor.queued = monitor.queued, []
+        monitor.poll()
+        scm.get_pull_request.return_value.head.sha = "new_commit"
+
+        start = time.time()
+        monitor.wait()
+
+        assert time.time() - start < 5
+        assert monitor.new_commit == "new_commit"
+
+
+def test_superseded_run():
+    newer_commit = []
+    superseded = MagicMock(side_effect=lambda: newer_commit[0] if newer_commit else None)
+    scm = MagicMock()
+
+    with BuildMonitor("commit_id", lambda build: True, scm=scm, superseded=superseded, min_interval=30,
+                      commit_interval=0.01) as monitor:
+        monitor.add(slow_build(running=True, delay=0), "lib")
+        monitor.running, monitor.queued = monitor.queued, []
+        monitor.poll()
+        assert monitor.new_commit is None
+        newer_commit.append("new_commit")
+
+        start = time.time()
+        monitor.wait()
+
+        assert time.time() - start < 5
+        assert monitor.new_commit == "new_commit"
+    # The active run is watched instead of the pull request
+    assert not scm.get_pull_request.called
+
+
+def test_stop():
+    queue_instance = MagicMock()
+    queue_item, build = MagicMock(), MagicMock()
+    # A cancellation failing does not keep the other ones from being sent
+    queue_instance.delete_item.side_effect = ValueError("already started")
+
+    with BuildMonitor("commit_id", lambda build: True) as monitor:
+        monitor.queued, monitor.running = [(queue_item, "lib")], [(build, "service")]
+        monitor.stop(queue_instance)
+
+        queue_instance.delete_item.assert_called_once_with(queue_item)
+        build.stop.assert_called_once_with()
+        assert not monitor.pending()
+
+
+def queue_item(name, queue_id):
+    item = MagicMock(queue_id=queue_id)
+    item.name = name
+    item.get_build.side_effect = NotBuiltYet()
+    return item
+
+
+def test_batched_poll():
+    gateway = MagicMock()
+    items = [queue_item("lib - test", 11), queue_item("service - test", 12), queue_item("old - test", 3)]
+    gateway.builds.return_value = {
+        "lib - test": {11: {"queueId": 11, "number": 1, "building": True, "result": None}},
+        "old - test": {5: {"queueId": 5, "number": 2, "building": True, "result": None}}
+    }
+
+    with BuildMonitor("commit_id", lambda build: build._data["result"] == "SUCCESS", gateway=gateway) as monitor:
+        for item in items:
+            monitor.add(item, item.name)
+
+        assert monitor.poll() == ([], [])
+        assert sorted(gateway.builds.call_args[0][0]) == ["lib - test", "old - test", "service - test"]
+        # The items older than the recent builds of their job, or of a job never built, are polled on their own
+        assert [item.poll.called for item in items] == [False, True, True]
+        assert [unit for _, unit in monitor.queued] == ["service - test", "old - test"]
+        [(build, _)] = monitor.running
+        assert isinstance(build, GatewayBuild) and build.get_number() == 1
+
+        gateway.builds.return_value = {
+            "lib - test": {11: {"queueId": 11, "number": 1, "building": False, "result": "SUCCESS"}},
+            "service - test": {12: {"queueId": 12, "number": 7, "building": False, "result": "FAILURE"}}
+        }
+        succeeded, failed = monitor.poll()
+
+        assert [(build.get_number(), unit) for build, unit in succeeded] == [(1, "lib - test")]
+        assert [(build.get_number(), unit) for build, unit in failed] == [(7, "service - test")]
+        assert gateway.builds.call_count == 2
+
+
+def test_batched_poll_without_recent_builds(mocker):
+    data = {"number": 1, "queueId": 11, "building": True, "result": None, "duration": 0,
+            "url": "http://jenkins/job/new/1/"}
+    mocker.patch.object(Build, "_poll", return_value=dict(data))
+    item = queue_item("new", 11)
+    item.get_build.side_effect = None
+    item.get_build.return_value = Build("http://jenkins/job/new/1/", 1, job=MagicMock())
+    gateway = MagicMock()
+    # The first build of the job, or a job which cannot be read
+    gateway.builds.return_value = {}
+    gateway.get_json.return_value = dict(data, building=False, result="SUCCESS", duration=1500)
+
+    with BuildMonitor("commit_id", lambda build: build._data["result"] == "SUCCESS", gateway=gateway) as monitor:
+        monitor.add(item, "new")
+
+        assert monitor.poll() == ([], [])
+        [(build, _)] = monitor.running
+        assert isinstance(build, GatewayBuild) and build.job_name == "new"
+
+        # Missing from the recent builds, the build is polled on its own
+        succeeded, failed = monitor.poll()
+
+        assert [(build.get_number(), unit) for build, unit in succeeded] == [(1, "new")]
+        assert failed == []
+        gateway.get_json.assert_called_once_with("http://jenkins/job/new/1/",
+                                                 tree="number,queueId,building,result,duration,url")
+
+
+def test_dispatch():
+    def launch(name, delay=0.1):
+        threading.Event().wait(delay)
+        if name == "broken":
+            raise ValueError("no such job")
+        return "queue item of " + name
+
+    with BuildMonitor("commit_id", lambda build: True, workers=8) as monitor:
+        start = time.time()
+        latencies = monitor.dispatch([(partial(launch, name), name) for name in ("a", "b", "c", "d")])
+
+        assert time.time() - start < 0.3
+        assert sorted(latencies) == ["a", "b", "c", "d"]
+        assert all(0.1 <= latency < 0.3 for latency in latencies.values())
+        assert monitor.queued == [("queue item of a", "a"), ("queue item of b", "b"), ("queue item of c", "c"),
+                                  ("queue item of d", "d")]
+
+        with pytest.raises(CIJobFail):
+            monitor.dispatch([(partial(launch, "broken", 0), "broken"), (partial(launch, "e", 0), "e")])
+        # The builds which were launched are followed, so they can be stopped
+        assert monitor.queued[-1] == ("queue item of e", "e")
+        assert sorted(monitor.dispatch_latencies) == ["a", "b", "c", "d", "e"]
@@ -1,6 +1,7 @@
 import pytest
 
 from loktar.plugins.dependency.docker_compose import docker_compose_deps
+from loktar.plugins.dependency.docker_compose import docker_compose_deps_from_files
 
 
 def test_docker_compose(mocker, monkeypatch):
@@ -23,3 +24,10 @@ def test_docker_compose(mocker, monkeypatch):
     mocker.patch("__builtin__.open", return_value=fake_open())
     monkeypatch.setattr("os.listdir", lambda _: ["docker-compose.yaml", "docker-compose.dev.yaml"])
     assert docker_compose_deps("/toto/") == {"api", "front", "elasticsearch", "worker", "redis"}
+
+
+def test_docker_compose_from_files():
+    assert docker_compose_deps_from_files({
+        "docker-compose.yaml": 'version: "2"\n\nservices:\n  redis:\n    image: redis\n\n  api:\n    image: api\n',
+        "docker-compose.dev.yaml": 'version: "2"\n\nservices:\n  front:\n    build: .\n'
+    }) == {"api", "front", "redis"}
@@ -1,6 +1,7 @@
 import pytest
 
 from loktar.plugins.dependency.dockerfile import docker_deps
+from loktar.plugins.dependency.dockerfile import docker_deps_from_files
 
 
 def test_docker_deps(mocker, monkeypatch):
@@ -50,3 +51,10 @@ def test_docker_deps_empty(mocker, monkeypatch):
 def test_docker_deps_file_absent(monkeypatch):
     monkeypatch.setattr("os.path.exists", lambda _: False)
     assert docker_deps("/toto/") == set()
+
+
+def test_docker_deps_from_files():
+    assert docker_deps_from_files({"Dockerfile": "FROM quay.io/org/my_awesome_base_image:42\nRUN sleep 1"}) == {
+        "my_awesome_base_image"}
+    assert docker_deps_from_files({"Dockerfile": ""}) == set()
+    assert docker_deps_from_files({}) == set()
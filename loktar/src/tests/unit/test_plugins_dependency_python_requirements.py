@@ -1,6 +1,7 @@
 import pytest
 
 from loktar.plugins.dependency.python_requirements import python_deps
+from loktar.plugins.dependency.python_requirements import python_deps_from_files
 
 
 def test_python_deps(mocker, monkeypatch):
@@ -57,3 +58,9 @@ def test_python_deps_empty(mocker, monkeypatch):
 def test_python_deps_file_absent(mocker, monkeypatch):
     monkeypatch.setattr("os.path.exists", lambda _: False)
     assert python_deps("/toto/") == set()
+
+
+def test_python_deps_from_files():
+    assert python_deps_from_files({"requirements.txt": "q==0\nw>=1\n\ne>2\n",
+                                   "app/test_requirements.txt": "r<=3\nt<4\ny"}) == {"q", "w", "e", "r", "t", "y"}
+    assert python_deps_from_files({}) == set()
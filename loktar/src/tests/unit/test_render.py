@@ -0,0 +1,128 @@
+import subprocess
+import sys
+import xml.etree.ElementTree as ElementTree
+
+from mock import call
+import networkx as nx
+import pytest
+
+from loktar.dependency import gen_dependencies_level
+from loktar.dependency import gplot
+from loktar.exceptions import FailDrawDepGraph
+from loktar.graph import CompactGraph
+from loktar.render import dot_source
+from loktar.render import GraphRenderer
+from loktar.render import publish_graph
+from loktar.render import render_graph
+from loktar.render import svg_source
+
+NODES = ["A", "B", "C", "D", "E"]
+EDGES = [("A", "B"), ("B", "C"), ("A", "C"), ("A", "E")]
+LEVELS = [[["A"], ["B", "E"], ["C"]], [["D"]]]
+
+
+def rendered(name_file, final_path):
+    with open(final_path + ".done", "w") as fd:
+        fd.write(name_file)
+
+
+def test_dot_source():
+    source = dot_source(NODES, EDGES, LEVELS)
+
+    assert source.startswith("digraph dependencies {\n")
+    assert '    {rank=same; "B"; "E";}\n' in source
+    assert '    "A" -> "C";\n' in source
+    assert dot_source(NODES, EDGES) == source
+    assert '"my \\"artifact\\""' in dot_source(['my "artifact"'], [])
+
+
+def test_svg_source():
+    svg = ElementTree.fromstring(svg_source(NODES, EDGES, LEVELS))
+
+    assert sorted(text.text for text in svg.iter("{http://www.w3.org/2000/svg}text")) == NODES
+    assert len(list(svg.iter("{http://www.w3.org/2000/svg}line"))) == len(EDGES)
+    assert ElementTree.fromstring(svg_source(["<artifact>"], []))
+
+
+@pytest.mark.parametrize("output_type", ["dot", "svg"])
+def test_render_graph_text(tmpdir, output_type):
+    final_path = render_graph(NODES, EDGES, LEVELS, str(tmpdir), "graph", output_type)
+
+    assert final_path == str(tmpdir.join("graph.{}".format(output_type)))
+    assert tmpdir.join("graph.{}".format(output_type)).read() == (dot_source if output_type == "dot"
+                                                                  else svg_source)(NODES, EDGES, LEVELS)
+
+
+def test_render_graph_png(mocker, tmpdir):
+    gplot_mock = mocker.patch("loktar.dependency.gplot")
+
+    render_graph(NODES, EDGES, LEVELS, str(tmpdir), "graph", "png")
+
+    assert sorted(gplot_mock.call_args[0][0].edges()) == sorted(EDGES)
+    assert gplot_mock.call_args[1] == {"save_path": str(tmpdir), "output_type": "png", "name_file": "graph"}
+
+
+def test_render_graph_unknown(tmpdir):
+    with pytest.raises(FailDrawDepGraph):
+        render_graph(NODES, EDGES, LEVELS, str(tmpdir), "graph", "gif")
+
+
+def test_text_rendering_does_not_import_matplotlib():
+    imported = subprocess.check_output([sys.executable, "-c",
+                                        "import sys; from loktar.render import render_graph; "
+                                        "render_graph(['A', 'B'], [('A', 'B')], None, '/tmp', 'graph', 'svg'); "
+                                        "print('matplotlib' in sys.modules or 'networkx' in sys.modules)"])
+    assert imported.splitlines()[-1] == "False"
+
+
+@pytest.mark.parametrize("output_type", ["dot", "svg"])
+def test_gplot_text(tmpdir, output_type):
+    name_file = gplot(nx.DiGraph(EDGES), LEVELS[:1], save_path=str(tmpdir), output_type=output_type,
+                      name_file="graph")
+
+    assert name_file == "graph"
+    assert tmpdir.join("graph.{}".format(output_type)).check()
+
+
+def test_publish_graph(mocker):
+    local = mocker.patch("loktar.render.local")
+    mocker.patch("loktar.render.lcd")
+
+    publish_graph("/repo", "graph")
+
+    assert local.call_args_list[-2:] == [call("git commit -m 'Add graph'"), call("git push origin")]
+
+
+def test_graph_renderer_render(mocker, tmpdir):
+    publish = mocker.patch("loktar.render.publish_graph")
+    callback = mocker.MagicMock()
+
+    GraphRenderer(repo=str(tmpdir), output_type="dot").render("graph", NODES, EDGES, LEVELS, callback)
+
+    publish.assert_called_once_with(str(tmpdir), "graph")
+    callback.assert_called_once_with("graph", str(tmpdir.join("graph.dot")))
+
+
+def test_graph_renderer_background(tmpdir):
+    renderer = GraphRenderer(repo=str(tmpdir), output_type="svg", publish=False)
+
+    name_files = [renderer.submit(CompactGraph(NODES, EDGES), LEVELS, callback=rendered),
+                  renderer.submit(CompactGraph(edges=[("A", "unknown")]), LEVELS, callback=rendered),
+                  renderer.submit(nx.DiGraph(EDGES), None, callback=rendered)]
+    renderer.stop()
+
+    # The second graph does not match its levels, it is skipped without stopping the renderer
+    assert tmpdir.join("{}.svg.done".format(name_files[0])).read() == name_files[0]
+    assert not tmpdir.join("{}.svg.done".format(name_files[1])).check()
+    assert tmpdir.join("{}.svg.done".format(name_files[2])).check()
+
+
+def test_gen_dependencies_level_draw(mocker):
+    renderer = mocker.patch("loktar.dependency.default_renderer").return_value
+    renderer.submit.return_value = "graph"
+    graph = CompactGraph(NODES, EDGES)
+
+    success, dependencies_levels, name_file = gen_dependencies_level(graph, draw=True)
+
+    assert (success, name_file) == (True, "graph")
+    renderer.submit.assert_called_once_with(graph, dependencies_levels)
@@ -0,0 +1,84 @@
+import pytest
+
+from loktar.resources import Capacity
+from loktar.resources import machine_capacity
+from loktar.resources import package_request
+from loktar.resources import resource_request
+
+
+def test_resource_request(mocker):
+    mocker.patch.dict("loktar.resources.RESOURCES", {"default_cpu": 1, "default_memory": 512})
+
+    assert resource_request({"resources": {"cpu": 4, "memory": 8192, "exclusive": "docker"}}) == \
+        {"cpu": 4, "memory": 8192, "exclusive": "docker"}
+    assert resource_request({"pkg_name": "lib"}) == {"cpu": 1, "memory": 512, "exclusive": None}
+    assert resource_request(None) == {"cpu": 1, "memory": 512, "exclusive": None}
+    with pytest.raises(ValueError):
+        resource_request({"resources": {"cpu": -1}})
+
+
+def test_capacity_pack():
+    capacity = Capacity(cpu=8, memory=4096)
+    requests = {"jvm": resource_request({"resources": {"cpu": 6, "memory": 3072}}),
+                "other_jvm": resource_request({"resources": {"cpu": 6, "memory": 3072}}),
+                "docker": resource_request({"resources": {"cpu": 1, "memory": 512, "exclusive": "docker"}}),
+                "other_docker": resource_request({"resources": {"cpu": 1, "memory": 512, "exclusive": "docker"}}),
+                "tiny": resource_request({"resources": {"cpu": 0.5, "memory": 128}})}
+    units = [("jvm", "test"), ("other_jvm", "test"), ("docker", "test"), ("other_docker", "test"), ("tiny", "test")]
+
+    assert capacity.pack(units, requests) == [("jvm", "test"), ("docker", "test"), ("tiny", "test")]
+    assert capacity.used == {"cpu": 7.5, "memory": 3712}
+
+    capacity.release(requests["docker"])
+    assert capacity.pack([("other_docker", "test")], requests) == [("other_docker", "test")]
+
+
+def test_capacity_oversized():
+    capacity = Capacity(cpu=2, memory=1024)
+    huge = resource_request({"resources": {"cpu": 16, "memory": 65536}})
+
+    # A build larger than the capacity runs alone
+    assert capacity.fits(huge)
+    capacity.take(resource_request(None))
+    assert not capacity.fits(huge)
+
+
+def test_capacity_unlimited(mocker):
+    mocker.patch.dict("loktar.resources.RESOURCES", {"cpu": None, "memory": None})
+    capacity = Capacity()
+
+    units = [("lib", str(index)) for index in range(100)]
+    assert capacity.pack(units, {}) == units
+
+
+def test_machine_capacity(mocker):
+    cpu, memory = machine_capacity()
+    assert cpu >= 1 and memory > 0
+
+    mocker.patch("multiprocessing.cpu_count", return_value=4)
+    mocker.patch("os.sysconf", side_effect=ValueError)
+    assert machine_capacity() == (4, None)
+
+
+def test_capacity_pack_raw_requests(mocker):
+    mocker.patch.dict("loktar.resources.RESOURCES", {"default_cpu": 1, "default_memory": 512})
+    capacity = Capacity(cpu=4, memory=4096)
+
+    assert capacity.pack([("jvm", "test"), ("lib", "test")], {"jvm": {"cpu": 2}}) == [("jvm", "test"), ("lib", "test")]
+    assert capacity.used == {"cpu": 3, "memory": 1024}
+
+
+def test_capacity_pack_starvation():
+    capacity = Capacity(cpu=4, memory=4096, max_skips=2)
+    requests = {"jvm": {"cpu": 4, "memory": 2048}, "tiny": {"cpu": 1, "memory": 128}}
+    capacity.take(package_request(requests, "tiny"))
+
+    # The tiny units pass the jvm one twice, then wait with it for the running ones to stop
+    assert capacity.pack([("jvm", "test"), ("tiny", "1")], requests) == [("tiny", "1")]
+    assert capacity.pack([("jvm", "test"), ("tiny", "2")], requests) == [("tiny", "2")]
+    assert capacity.pack([("jvm", "test"), ("tiny", "3")], requests) == []
+
+    for _ in range(3):
+        capacity.release(package_request(requests, "tiny"))
+    assert capacity.pack([("jvm", "test"), ("tiny", "3")], requests) == [("jvm", "test")]
+    assert ("jvm", "test") not in capacity.skipped
@@ -0,0 +1,104 @@
+import pytest
+
+from loktar.scanner import dependency_patterns
+from loktar.scanner import pattern_directories
+from loktar.scanner import scandir
+from loktar.scanner import scan_repository
+from loktar.scanner import select_files
+from loktar.strategy_run import strategy_runner
+
+
+@pytest.fixture
+def repo(tmpdir):
+    api = tmpdir.mkdir("services").mkdir("api")
+    api.join("requirements.txt").write("my_lib==1.0\n")
+    api.join("Dockerfile").write("FROM quay.io/org/my_base_image:42\n")
+    api.join("docker-compose.yml").write("services:\n  redis:\n    image: redis\n")
+    api.join("README.md").write("")
+    api.mkdir("app").join("test_requirements.txt").write("my_test_lib\n")
+    api.mkdir("node_modules").mkdir("requests").join("requirements.txt").write("ignored\n")
+
+    lib = tmpdir.mkdir("my_lib")
+    lib.join("requirements.txt").write("requests\n")
+    lib.mkdir("src").join("requirements.txt").write("six\n")
+
+    tmpdir.mkdir("docs").join("requirements.txt").write("sphinx\n")
+    return tmpdir
+
+
+@pytest.fixture
+def artifacts():
+    return {
+        "api": {"artifact_name": "api", "artifact_dir": "services",
+                "dependencies_type": ["python_requirements", "dockerfile", "docker_compose"]},
+        "my_lib": {"artifact_name": "my_lib", "dependencies_type": ["python_requirements"]},
+        "my_base_image": {"artifact_name": "my_base_image", "dependencies_type": ["dockerfile"]},
+        "no_dependency": {"artifact_name": "no_dependency"}
+    }
+
+
+def test_dependency_patterns(artifacts):
+    assert dependency_patterns(artifacts["api"]) == {"requirements.txt", "test_requirements.txt",
+                                                     "app/requirements.txt", "app/test_requirements.txt",
+                                                     "src/requirements.txt", "src/test_requirements.txt",
+                                                     "Dockerfile", "*docker-compose*"}
+    assert dependency_patterns(artifacts["no_dependency"]) == set()
+
+
+def test_select_files():
+    files = {"requirements.txt": "a", "app/requirements.txt": "b", "docker-compose.yml": "c",
+             "app/docker-compose.yml": "d"}
+
+    assert select_files(files, ["requirements.txt", "*docker-compose*"]) == {"requirements.txt": "a",
+                                                                             "docker-compose.yml": "c"}
+    assert select_files(files, []) == {}
+
+
+def test_pattern_directories(artifacts):
+    wanted, crossed = pattern_directories("/repo", {"my_lib": artifacts["my_lib"]})
+
+    assert sorted(wanted) == ["/repo/my_lib", "/repo/my_lib/app", "/repo/my_lib/src"]
+    assert sorted(wanted["/repo/my_lib/src"]) == [("my_lib", "src", "requirements.txt"),
+                                                  ("my_lib", "src", "test_requirements.txt")]
+    assert crossed == {"/repo/my_lib", "/repo/my_lib/app", "/repo/my_lib/src"}
+
+
+def test_scan_repository(mocker, repo, artifacts):
+    listed = []
+    mocker.patch("loktar.scanner.scandir", side_effect=lambda path: listed.append(path) or scandir(path))
+
+    files = scan_repository(str(repo), artifacts)
+
+    assert files == {
+        "api": {"requirements.txt": "my_lib==1.0\n",
+                "Dockerfile": "FROM quay.io/org/my_base_image:42\n",
+                "docker-compose.yml": "services:\n  redis:\n    image: redis\n",
+                "app/test_requirements.txt": "my_test_lib\n"},
+        "my_lib": {"requirements.txt": "requests\n",
+                   "src/requirements.txt": "six\n"},
+        "my_base_image": {},
+        "no_dependency": {}
+    }
+    # Each useful directory is listed once, the others are never looked at
+    assert sorted(listed) == sorted(str(path) for path in [repo,
+                                                           repo.join("services"),
+                                                           repo.join("services", "api"),
+                                                           repo.join("services", "api", "app"),
+                                                           repo.join("my_lib"),
+                                                           repo.join("my_lib", "src")])
+
+
+def test_scan_repository_missing_repo(artifacts):
+    assert scan_repository("/this/repo/does/not/exist", artifacts)["api"] == {}
+
+
+def test_strategy_runner_with_collected_files(repo, artifacts):
+    files = scan_repository(str(repo), artifacts)
+
+    assert strategy_runner(artifacts["api"], "dependency",
+                           basepath=str(repo.join("services", "api")),
+                           files=files["api"]) == {"my_lib", "my_test_lib", "my_base_image", "redis"}
+    # The plugins read the files themselves when they are not collected beforehand
+    assert strategy_runner(artifacts["api"], "dependency",
+                           basepath=str(repo.join("services", "api"))) == {"my_lib", "my_test_lib",
+                                                                           "my_base_image", "redis"}
@@ -0,0 +1,50 @@
+import pytest
+
+from loktar.job import build_units
+from loktar.simulator import compare_policies
+from loktar.simulator import replay
+from loktar.simulator import simulate
+
+
+@pytest.fixture()
+def units():
+    # A long chain next to short independent builds
+    return build_units([['lib', 'a_tool', 'b_tool', 'c_tool'], ['service'], ['front']], ['artifactmaster'],
+                       [('lib', 'service'), ('service', 'front')])
+
+
+@pytest.fixture()
+def durations():
+    return {('lib', 'artifactmaster'): 10, ('service', 'artifactmaster'): 10, ('front', 'artifactmaster'): 10,
+            ('a_tool', 'artifactmaster'): 10, ('b_tool', 'artifactmaster'): 10, ('c_tool', 'artifactmaster'): 10}
+
+
+def test_simulate(units, durations):
+    assert simulate(units, durations) == 30
+    assert simulate(units, durations, slots=1) == 60
+    assert simulate({('lib', 'test'): set()}, {}, default_duration=42) == 42
+
+
+def test_simulate_cycle():
+    with pytest.raises(ValueError):
+        simulate({('lib', 'test'): {('service', 'test')}, ('service', 'test'): {('lib', 'test')}}, {})
+
+
+def test_compare_policies(units, durations):
+    makespans = compare_policies(units, durations, slots=2)
+
+    # In name order the tools hold back the chain: a_tool and b_tool, then c_tool and lib, then service and front
+    assert makespans == {"name_order": 40, "critical_path": 30}
+    assert compare_policies(units, durations) == {"name_order": 30, "critical_path": 30}
+
+
+def test_replay(mocker, durations):
+    durations_db = mocker.MagicMock()
+    durations_db.estimates.return_value = durations
+    run = {"git_branch": "master",
+           "dep_lvl": [[['lib', 'a_tool', 'b_tool'], ['service'], ['front']], [['c_tool']]],
+           "dep_edges": [('lib', 'service'), ('service', 'front')]}
+
+    assert replay(run, durations_db, slots=2) == {"name_order": 40, "critical_path": 30}
+    estimated = sorted(durations_db.estimates.call_args[0][0])
+    assert estimated == ['a_tool', 'b_tool', 'c_tool', 'front', 'lib', 'service']
@@ -0,0 +1,89 @@
+import os
+
+import pytest
+
+from loktar.dependency import dependency_graph_from_modified_artifacts
+from loktar.snapshot import DependencySnapshot
+from loktar.snapshot import SnapshotStore
+
+
+@pytest.fixture
+def artifacts():
+    return {
+        "api": {"artifact_name": "api", "dependencies_type": ["python_requirements"]},
+        "my_lib": {"artifact_name": "my_lib", "dependencies_type": ["python_requirements"]},
+        "my_other_lib": {"artifact_name": "my_other_lib", "dependencies_type": ["python_requirements"]}
+    }
+
+
+@pytest.fixture
+def runner(mocker):
+    requirements = {"api": {"my_lib", "requests"}, "my_lib": {"my_other_lib", "new_lib"}, "my_other_lib": set(),
+                    "new_lib": {"six"}}
+    return mocker.patch("loktar.dependency.strategy_runner",
+                        side_effect=lambda package, *args, **kwargs: set(requirements[package["artifact_name"]]))
+
+
+def scanned(runner):
+    return sorted(call[0][0]["artifact_name"] for call in runner.call_args_list)
+
+
+def test_dependency_snapshot_build(tmpdir, runner, artifacts):
+    snapshot = DependencySnapshot.build("commit0", str(tmpdir), artifacts)
+
+    assert scanned(runner) == ["api", "my_lib", "my_other_lib"]
+    assert snapshot.artifacts_requirements() == {"api": {"my_lib"}, "my_lib": {"my_other_lib"}}
+    assert snapshot.artifacts_requirements(["api", "my_lib"]) == {"api": {"my_lib"}}
+
+
+def test_dependency_snapshot_update(tmpdir, runner, artifacts):
+    snapshot = DependencySnapshot.build("commit0", str(tmpdir), artifacts)
+    runner.reset_mock()
+
+    artifacts["new_lib"] = {"artifact_name": "new_lib", "dependencies_type": ["python_requirements"]}
+    artifacts["my_other_lib"]["dependencies_type"] = []
+    del artifacts["api"]
+    new_snapshot = snapshot.update("commit1", str(tmpdir), artifacts, {"my_lib"})
+
+    # Unchanged artifacts are not scanned again, new and reconfigured ones are
+    assert scanned(runner) == ["my_lib", "my_other_lib", "new_lib"]
+    assert new_snapshot.commit_id == "commit1"
+    # my_lib already required new_lib before it became an artifact
+    assert new_snapshot.artifacts_requirements() == {"my_lib": {"my_other_lib", "new_lib"}}
+    assert snapshot.artifacts_requirements() == {"api": {"my_lib"}, "my_lib": {"my_other_lib"}}
+
+
+def test_snapshot_store(tmpdir, runner, artifacts):
+    store = SnapshotStore(str(tmpdir.join("snapshots")), keep=2)
+    assert store.load("commit0") is None
+
+    snapshot = store.snapshot("commit0", str(tmpdir), artifacts, set(), base_commit_id="unknown")
+    assert runner.call_count == 3
+    assert store.load("commit0").to_dict() == snapshot.to_dict()
+
+    # The snapshot of a commit is derived from its base commit, then reused as it is
+    for _ in range(2):
+        snapshot = store.snapshot("commit1", str(tmpdir), artifacts, {"api"}, base_commit_id="commit0")
+    assert runner.call_count == 4
+    assert snapshot.commit_id == "commit1"
+
+    os.utime(str(tmpdir.join("snapshots", "commit0.json")), (0, 0))
+    store.snapshot("commit2", str(tmpdir), artifacts, set(), base_commit_id="commit1")
+    assert sorted(os.listdir(store.path)) == ["commit1.json", "commit2.json"]
+
+
+def test_snapshot_store_unreadable(tmpdir):
+    tmpdir.join("commit0.json").write("{not json")
+    assert SnapshotStore(str(tmpdir)).load("commit0") is None
+
+
+def test_dependency_graph_from_snapshot(mocker, tmpdir, runner, artifacts):
+    snapshot = DependencySnapshot.build("commit0", str(tmpdir), artifacts)
+    runner.reset_mock()
+    scan = mocker.patch("loktar.dependency.scan_repository")
+
+    graph = dependency_graph_from_modified_artifacts(str(tmpdir), artifacts, {"my_other_lib"}, snapshot=snapshot)
+
+    assert not scan.called
+    assert not runner.called
+    assert sorted(graph.edges()) == [("my_lib", "api"), ("my_other_lib", "my_lib")]
@@ -0,0 +1,104 @@
+import os
+import subprocess
+
+import pytest
+
+from loktar.exceptions import PrepareEnvFail
+from loktar.workspace import lock_file
+from loktar.workspace import WorkspacePool
+
+
+def git(path, *args):
+    return subprocess.check_output(("git", "-C", path) + args).strip()
+
+
+@pytest.fixture
+def origin(tmpdir):
+    path = str(tmpdir.join("origin"))
+    subprocess.check_call(["git", "init", "-q", "-b", "master", path])
+    git(path, "config", "user.email", "ci@example.com")
+    git(path, "config", "user.name", "CI")
+    tmpdir.join("origin", "config.json").write("{}")
+    git(path, "add", "config.json")
+    git(path, "commit", "-q", "-m", "first")
+    return path
+
+
+def commit(path, name):
+    with open(os.path.join(path, name), "w") as fd:
+        fd.write(name)
+    git(path, "add", name)
+    git(path, "commit", "-q", "-m", name)
+    return git(path, "rev-parse", "HEAD")
+
+
+def test_workspace_pool(tmpdir, origin):
+    pool = WorkspacePool(root=str(tmpdir.join("pool")), organization="org", repository="repo", url=origin)
+
+    with pool.lease() as first, pool.lease() as second:
+        assert first.path != second.path
+        assert os.path.isfile(os.path.join(first.path, "config.json"))
+        assert os.path.isfile(os.path.join(second.path, "config.json"))
+    assert not os.path.exists(first.path)
+    assert os.path.isdir(pool.mirror)
+
+    # The next lease only fetches the new commits
+    git(origin, "checkout", "-q", "-b", "feature")
+    head = commit(origin, "service")
+    with pool.lease("feature", path=str(tmpdir.join("checkout"))) as workspace:
+        assert workspace.path == str(tmpdir.join("checkout"))
+        assert git(workspace.path, "rev-parse", "HEAD") == head
+    assert os.listdir(pool.leases) == []
+    assert git(pool.mirror, "worktree", "list").count("\n") == 0
+
+
+def test_workspace_pool_sparse(tmpdir, origin):
+    tmpdir.join("origin", "lib").ensure(dir=True).join("setup.py").write("lib")
+    tmpdir.join("origin", "service").ensure(dir=True).join("setup.py").write("service")
+    git(origin, "add", "lib", "service")
+    git(origin, "commit", "-q", "-m", "artifacts")
+    pool = WorkspacePool(root=str(tmpdir.join("pool")), organization="org", repository="repo", url=origin)
+
+    with pool.lease(paths=["config.json", "lib/"]) as sparse, pool.lease() as full:
+        assert sorted(os.listdir(sparse.path)) == [".git", "config.json", "lib"]
+        assert git(sparse.path, "status", "--porcelain") == ""
+        # The sparse checkout does not change the other checkouts
+        assert sorted(os.listdir(full.path)) == [".git", "config.json", "lib", "service"]
+
+
+def test_workspace_pool_stale_lease(tmpdir, origin):
+    pool = WorkspacePool(root=str(tmpdir.join("pool")), organization="org", repository="repo", url=origin)
+    leaked = pool.lease()
+    # The process holding the lease died
+    leaked._lock.close()
+
+    with pool.lease():
+        assert not os.path.exists(leaked.path)
+
+    held = pool.lease()
+    with pool.lease():
+        assert os.path.isdir(held.path)
+    held.release()
+    held.release()
+
+
+def test_workspace_pool_fail(tmpdir, origin):
+    pool = WorkspacePool(root=str(tmpdir.join("pool")), organization="org", repository="repo",
+                         url=str(tmpdir.join("missing")))
+    with pytest.raises(PrepareEnvFail):
+        pool.lease()
+    assert not os.path.exists(pool.mirror)
+
+    pool.url = origin
+    with pytest.raises(PrepareEnvFail):
+        pool.lease("missing_branch")
+    assert os.listdir(pool.leases) == []
+
+
+def test_lock_file(tmpdir):
+    path = str(tmpdir.join("lock"))
+    lock = lock_file(path)
+
+    assert lock_file(path, blocking=False) is None
+    lock.close()
+    assert lock_file(path, blocking=False) is not None
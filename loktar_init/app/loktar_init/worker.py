@@ -1,7 +1,4 @@
-import copy
-from fabric.api import hide
-from fabric.api import lcd
-from fabric.api import local
+from functools import partial
 import json
 import os
 import time
@@ -10,25 +7,44 @@ from uuid import uuid4
 import yaml
 
 from loktar.cmd import exec_command_with_retry
+from loktar.cmd import hide
+from loktar.cmd import lcd
+from loktar.cmd import local
+from loktar.cache import RequirementsCache
+from loktar.constants import CONFIG_CI_FILE
+from loktar.constants import DEPENDENCY_CACHE
+from loktar.constants import DEPENDENCY_SNAPSHOT
+from loktar.constants import JENKINS
+from loktar.constants import SPARSE_CHECKOUT
+from loktar.constants import WORKSPACE_POOL
 from loktar.db import Job
+from loktar.dependency import ArtifactPathIndex
+from loktar.dependency import artifacts_required_paths
 from loktar.dependency import dependency_graph_from_modified_packages
 from loktar.dependency import gen_dependencies_level
+from loktar.dependency import get_artifacts_requirements
 from loktar.dependency import get_excluded_deps
 from loktar.dependency import get_do_not_touch_packages
-from loktar.dependency import package_from_path
 from loktar.dependency import pull_request_information
 from loktar.environment import GITHUB_INFO
+from loktar.environment import prepare_test_env
 from loktar.environment import GITHUB_TOKEN
 from loktar.environment import MAX_RETRY_GITHUB
 from loktar.exceptions import JobIdUnknown
 from loktar.exceptions import PrepareEnvFail
 from loktar.exceptions import PullRequestCollision
+from loktar.graph import CompactGraph
 from loktar.job import build_params_to_context
 from loktar.log import Log
+from loktar.merge_queue import BatchBuild
+from loktar.merge_queue import run_merge_queue
+from loktar.render import default_renderer
 from loktar.notifications import define_job_status_on_github_commit
 from loktar.serialize import serialize
+from loktar.snapshot import SnapshotStore
 from loktar.scm import fetch_github_file
 from loktar.scm import Github
+from loktar.workspace import WorkspacePool
 
 
 def worker(logger=os.environ.get("LOGGER", None), rebuild=os.environ.get("REBUILD", False)):
@@ -40,8 +56,6 @@ def worker(logger=os.environ.get("LOGGER", None), rebuild=os.environ.get("REBUIL
         raise JobIdUnknown
 
     job = db.get_job(job_id)
-    commit_id = job["commit_id"]
-    committer = job["committer"]
 
     job["lastAccess"] = time.time()
     job["status"] = 10
@@ -59,26 +73,106 @@ def worker(logger=os.environ.get("LOGGER", None), rebuild=os.environ.get("REBUIL
 
     #define_job_status_on_github_commit()
 
+    if WORKSPACE_POOL["enabled"]:
+        # Checked out from a persistent mirror, only for the planning: the checkout is removed once it is over
+        workspaces = WorkspacePool()
+        with hide('output', 'running', 'warnings'):
+            logger_info('Preparing the test environment')
+            workspace_lease = workspaces.lease()
+        with workspace_lease:
+            result = plan_job(job, workspace_lease.path, rebuild, detect_pr_collision, logger_info, logger_error)
+        if result is not None:
+            # The builds receive an archive of the branch, which outlives the checkout of the planning
+            with hide('output', 'running', 'warnings'):
+                result["test_env_path"] = prepare_test_env(job["git_branch"], workspaces=workspaces,
+                                                           sparse=result["sparse"])
+        return result
+
+    # TODO(Re-implement the line workspace = prepare_test_env(job["git_branch"]) && os.remove("{0}.tar".format(workspace)))
+    # workspace = prepare_test_env(job["git_branch"])
+    # TODO(Implement the file transfer to the CI server)
+    # transfer_file("PUT", remote_path="/tmp", local_path="{0}.tar".format(workspace))
+    # os.remove("{0}.tar".format(workspace))
+    workspace = clone_workspace(logger_info)
+
+    result = plan_job(job, workspace, rebuild, detect_pr_collision, logger_info, logger_error)
+    if result is not None and result["sparse"] is not None:
+        # The archives of the artifacts are created next to the archive of the whole branch
+        with hide('output', 'running', 'warnings'):
+            result["test_env_path"] = prepare_test_env(job["git_branch"], sparse=result["sparse"])
+    return result
+
+
+def clone_workspace(logger_info):
+    """Clone the repository in a new directory
+
+    Returns:
+        str: the clone
+    """
     with hide('output', 'running', 'warnings'):
-        # TODO(Re-implement the line workspace = prepare_test_env(job["git_branch"]) && os.remove("{0}.tar".format(workspace)))
-        # workspace = prepare_test_env(job["git_branch"])
-        # TODO(Implement the file transfer to the CI server)
-        # transfer_file("PUT", remote_path="/tmp", local_path="{0}.tar".format(workspace))
-        # os.remove("{0}.tar".format(workspace))
         logger_info('Preparing the test environment')
         unique_name_dir = str(uuid4())
         workspace = '/mnt/ci/{0}'.format(unique_name_dir)
         os.makedirs(workspace)
         try:
             if not exec_command_with_retry('git clone git@github.com:{0}/{1}.git {2}'
-                                           .format(GITHUB_INFO["organization"], GITHUB_INFO["repository"], workspace),
+                                           .format(GITHUB_INFO["organization"], GITHUB_INFO["repository"],
+                                                   workspace),
                                            0, MAX_RETRY_GITHUB):
                 raise PrepareEnvFail
         except PrepareEnvFail:
             local('rm -rf {0}*'.format(workspace))
             raise
+    return workspace
+
+
+def merge_queue_worker(logger=os.environ.get("LOGGER", None)):
+    """Test the mergeable pull requests by batches, see ``loktar.merge_queue.MergeQueue``
+
+    The branches of each batch are merged together and the artifacts they modify are built once, from a single
+    dependency graph. The heads of the pull requests receive a "Merge Queue" status.
+
+    Returns:
+        tuple of list: the pull requests which passed, and the culprits
+    """
+    logger_info = logger.info if logger is not None else Log().info
+    scm = Github(GITHUB_INFO['login']['user'], GITHUB_INFO['login']['password'])
+    workspace = clone_workspace(logger_info)
+    try:
+        with open(os.path.join(workspace, CONFIG_CI_FILE)) as config_file:
+            config = json.load(config_file)
+        packages = {pkg["pkg_name"]: pkg for pkg in config["packages"]}
+        return run_merge_queue(scm, BatchBuild(scm, workspace, packages, JENKINS))
+    finally:
+        local('rm -rf {0}'.format(workspace))
+
+
+def comment_dependency_levels(id_pr, dep_lvl, name_file, final_path):
+    """Post the dependency levels and the link to their graph on the pull request, called by the graph renderer
+
+    Args:
+        id_pr (int): the pull request
+        dep_lvl (list): the dependency levels
+        name_file (str): the name of the published graph, without extension
+        final_path (str): where the graph was rendered
+    """
+    scm = Github(GITHUB_INFO['login']['user'], GITHUB_INFO['login']['password'])
+    scm.create_pull_request_comment(id_pr,
+                                    comment=u'Hey noobs, here go your dependency levels:\n\n```\n' +
+                                            yaml.safe_dump(dep_lvl) +
+                                            u'\n```\n' +
+                                            u'![](https://raw.githubusercontent.com/{0}/ci_img/master/{1})'
+                                            .format(GITHUB_INFO["organization"], os.path.basename(final_path)),
+                                    check_unique=True)
+
+
+def plan_job(job, workspace, rebuild, detect_pr_collision, logger_info, logger_error):
+    """Compute the dependency levels of a job from the repository checked out in its workspace"""
+    commit_id = job["commit_id"]
+    committer = job["committer"]
 
     id_pr = None
+    snapshot = None
     scm = Github(GITHUB_INFO['login']['user'], GITHUB_INFO['login']['password'])
 
     # For backwards compatibility
@@ -94,15 +188,21 @@ def worker(logger=os.environ.get("LOGGER", None), rebuild=os.environ.get("REBUIL
             git_diff = filter(None, list(set(git_diff.split('\n'))))
             dict_message_files = {}
             packages = {pkg['pkg_name']: pkg for pkg in map_pkg}
-            modified_packages = {package_from_path(path, packages) for path in git_diff} - {None}
+            modified_packages = ArtifactPathIndex(packages).artifacts_from_paths(git_diff)
             exclude_dep = get_excluded_deps(packages, dict_message_files, modified_packages)
             logger_info('The following packages\' dependencies will be ignored if unmodified: {0}'
                         .format(exclude_dep))
 
+            if DEPENDENCY_SNAPSHOT["path"] is not None:
+                # Derived from the snapshot of the previous commit, only the modified packages are scanned
+                snapshot = SnapshotStore().snapshot(commit_id, workspace, packages, modified_packages,
+                                                    base_commit_id=local('git rev-parse HEAD~', capture=True))
+
             dep_graph = dependency_graph_from_modified_packages(workspace,
                                                                 packages,
                                                                 modified_packages,
-                                                                exclude_dep)
+                                                                exclude_dep,
+                                                                snapshot=snapshot)
     else:
         define_job_status_on_github_commit(commit_id,
                                            'pending',
@@ -154,9 +254,8 @@ def worker(logger=os.environ.get("LOGGER", None), rebuild=os.environ.get("REBUIL
 
         do_not_touch_packages = get_do_not_touch_packages(id_pr, packages, scm, dep_graph, rebuild)
 
-        # We can safely delete the nodes from the graph
-        cleaned_dep_graph = copy.deepcopy(dep_graph)
-        cleaned_dep_graph.remove_nodes_from(do_not_touch_packages)
+        # We can safely delete the nodes from a view of the graph
+        cleaned_dep_graph = CompactGraph.from_networkx(dep_graph).without(do_not_touch_packages)
 
         # Replace dep_lvl if we use another dep_graph
         _, dep_lvl_to_use, _ = gen_dependencies_level(cleaned_dep_graph)
@@ -167,19 +266,27 @@ def worker(logger=os.environ.get("LOGGER", None), rebuild=os.environ.get("REBUIL
             define_job_status_on_github_commit(commit_id, 'success', 'http://github.com', context,
                                                'Bro, this package seems damn fine.')
 
-    no_problem, dep_lvl, name_graph_img = gen_dependencies_level(dep_graph, draw=True)
-
-    if id_pr is not None:
-        scm.create_pull_request_comment(id_pr,
-                                        comment=u'Hey noobs, here go your dependency levels:\n\n```\n' +
-                                                yaml.safe_dump(dep_lvl) +
-                                                u'\n```\n' +
-                                                u'![](https://raw.githubusercontent.com/{0}/ci_img/master/{1}.png)'
-                                                .format(GITHUB_INFO["organization"], name_graph_img),
-                                        check_unique=True)
+    no_problem, dep_lvl, _ = gen_dependencies_level(dep_graph)
+    if no_problem:
+        # The graph is rendered and pushed in the background, the pull request is commented once it is published
+        default_renderer().submit(dep_graph, dep_lvl,
+                                  callback=None if id_pr is None else partial(comment_dependency_levels, id_pr,
+                                                                              dep_lvl))
 
     # Replace dep_lvl if we calculated another dep_lvl to use
     dep_lvl = dep_lvl if dep_lvl_to_use is None else dep_lvl_to_use
+    # Edges of the graph the levels come from, to schedule each build as soon as its dependencies are built
+    dep_edges = dep_graph.edges() if dep_lvl_to_use is None else cleaned_dep_graph.edges()
+
+    sparse = None
+    if SPARSE_CHECKOUT:
+        # Every requirement of the built artifacts is checked out, the ones that are not rebuilt too
+        if snapshot is not None:
+            artifacts_requirements = snapshot.artifacts_requirements(packages)
+        else:
+            cache = RequirementsCache() if DEPENDENCY_CACHE["path"] is not None else None
+            artifacts_requirements = get_artifacts_requirements(packages.keys(), packages, workspace, cache=cache)
+        sparse = artifacts_required_paths(dep_graph.nodes(), packages, artifacts_requirements)
 
     logger_info('=' * 20)
     logger_info('Dependency levels used for this build')
@@ -209,7 +316,9 @@ def worker(logger=os.environ.get("LOGGER", None), rebuild=os.environ.get("REBUIL
             "committer": committer,
             "test_env_path": workspace,
             "git_branch": job["git_branch"],
-            "dep_lvl": dep_lvl
+            "dep_lvl": dep_lvl,
+            "dep_edges": dep_edges,
+            "sparse": sparse
         }
 
     else:
@@ -222,4 +331,7 @@ def worker(logger=os.environ.get("LOGGER", None), rebuild=os.environ.get("REBUIL
 
 
 if __name__ == "__main__":
-    worker()
+    if os.environ.get("MERGE_QUEUE", False):
+        merge_queue_worker()
+    else:
+        worker()